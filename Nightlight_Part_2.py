@@ -4,7 +4,11 @@ import uasyncio as asyncio
 from mqtt import MQTTClient
 from machine import I2C, Pin, PWM
 import struct
-from MSA311 import Acceleration
+from msa311_stream import MSA311
+from gesture import TapDetector, TAP
+from fade import Breather
+from edge_events import EdgeButton, PRESS
+from compositor import Compositor, Fade, Solid
 import random, network
 
 # MQTT setup
@@ -15,95 +19,86 @@ topic_sub = 'ME35-24/carlo'
 # NeoPixel and button setup
 led_pin = Pin(28, Pin.OUT)
 button = Pin(12, Pin.IN, Pin.PULL_UP)
+button_events = EdgeButton(button)
 led = neopixel.NeoPixel(led_pin, 1)
+# One task owns the NeoPixel: the button sets the colour, a tap dims over it
+leds = Compositor(led, layers=('color', 'dim'), fps=50)
 
 # LED PWM setup
 blue_led = PWM(Pin(7, machine.Pin.OUT))
 blue_led.freq(50)
+breather = Breather(blue_led, period_ms=5200)  # same pace as the old 2.6 s ramp, but up and down
 
 # Buzzer PWM setup
 buzzer = PWM(Pin('GPIO18', Pin.OUT))
 
-# Set up accelerometer
+# Set up accelerometer: one persistent driver sampling at 500 Hz into blocks
 scl = Pin(27, Pin.OUT)
 sda = Pin(26, Pin.OUT)
-accelerometer = Acceleration(scl, sda)
+accelerometer = MSA311(I2C(1, scl=scl, sda=sda, freq=400000))
+# High-passed peaks, so tilting the light is not a tap. Single and double
+# taps do the same thing here, so don't wait double_ms to tell them apart.
+detector = TapDetector(rate_hz=accelerometer.odr, double_ms=0)
 
 current_color =(255, 0, 0)
 
             
 # Turn off function
 def turnoff():
-    blue_led.duty_u16(0)
+    breather.stop()
     led[0] = (0, 0, 0)
     led.write()
 
 
+def tapped(block):
+    # Taps count, shakes do not
+    for k in range(detector.process(block)):
+        kind, sample = detector.event(k)
+        if kind == TAP:
+            return True
+    return False
+
 # Asynchronous task to control the NeoPixel based on accelerometer input
 async def control_led():
-    global current_color
-    while True:
-
-        t = Acceleration(scl, sda)
-        y = t.read_accel()[1]
-
-        r = current_color[0]
-        g = current_color[1]
-        b = current_color[2]
-
-
-        # Check if the accelerometer indicates a press
-        if y < -17000:
-            # Tap detected - dim the NeoPixel
-            led.write()
-            for i in range(255, 0, -5):
-                led[0] = (r * i // 255, g * i // 255, b * i // 255)  # Example: Red color
-                led.write()
-                await asyncio.sleep(0.02)
+    async for block in accelerometer:
+
+        # Check if the accelerometer saw a tap
+        if tapped(block):
+            # Tap detected - dim the NeoPixel (a black layer fading in over the colour)
+            if not leds.active('color'):
+                leds.set('color', Solid(current_color))
+            leds.set('dim', Fade((0, 0, 0), 0, 255, 1020))
+            await leds.wait('dim')
             buzzer.freq(440)
             buzzer.duty_u16(1000)
             await asyncio.sleep(0.5)
             buzzer.duty_u16(0)
-                
-            # Dim the light back down
-            for i in range(0, 255, 5):
-                led[0] = (r * i // 255, g * i // 255, b * i // 255)
-                led.write()
-                await asyncio.sleep(0.02)
 
-        await asyncio.sleep(0.1)
+            # Bring the light back up
+            leds.set('dim', Fade((0, 0, 0), 255, 0, 1020, hold=False))
+            await leds.wait('dim')
+            detector.reset()  # blocks were skipped while dimming, start the filter over
 
 # Asynchronous task for button control
 
 async def button_control():
     global current_color
-    while True:
-        if not button.value():  # Button pressed
+    async for kind, ticks in button_events:
+        if kind == PRESS:  # Button pressed
             red = random.randint(0,255)
             green = random.randint(0, 255)
             blue = random.randint (0, 255)
 
             current_color = (red, green, blue)
-
-            led[0] = current_color  # Random color selection
-            led.write()
-        await asyncio.sleep(0.1)
-
-# Asynchronous task for breathing LEDs
-async def breathing():
-    while True:
-        for i in range(0,65535,500):
-                blue_led.duty_u16(i)     #  u16 means unsighed 16 bit integer (0-65535)
-                await asyncio.sleep(0.02)
-
-        
+            leds.set('color', Solid(current_color))  # Random color selection
 
 # Main function to run the asynchronous tasks
 async def main():
-    task3 = asyncio.create_task(breathing())
+    breather.start()  # runs off a hardware timer, not a task
+    asyncio.create_task(leds.run())
     task1 = asyncio.create_task(control_led())
     task2 = asyncio.create_task(button_control())
-    await asyncio.gather(task1,task2,task3)
+    await asyncio.gather(task1,task2)
     
     
 
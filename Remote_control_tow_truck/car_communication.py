@@ -13,6 +13,9 @@ import math
 import time
 import network
 from mqtt import MQTTClient
+from publish_pipeline import ChangePublisher
+from apriltag_tracker import TagTracker
+import latency_trace
 
 SSID = "Tufts_Robot"  # Network SSID
 KEY = ""  # Network key
@@ -32,6 +35,13 @@ print("WiFi Connected ", wlan.ifconfig())
 client = MQTTClient("ME35_kachow", "broker.hivemq.com", port=1883)
 client.connect()
 
+# Latency tracing: capture and publish times of every tenth frame's command
+# go to tools/latency_report.py, which also sends the clock probes answered
+# here. Only those commands get a "#id" suffix, the rest go out unchanged
+tracer = latency_trace.Tracer("ME35_kachow", every=10)
+client.set_callback(lambda topic, msg: client.publish(latency_trace.TOPIC, tracer.pong(msg)))
+client.subscribe(latency_trace.PING_TOPIC)
+
 sensor.reset()
 sensor.set_pixformat(sensor.RGB565)
 sensor.set_framesize(sensor.QQVGA)
@@ -45,34 +55,30 @@ clock = time.clock()
 # Please use the TAG36H11 tag family for this script - it's the recommended tag family to use.
 
 
+# Tag id -> command for the car. Only changes (and a keep-alive) are published,
+# so the loop isn't held up by the socket every frame.
+COMMANDS = {0: "forward", 1: "backward", 2: "right", 3: "left"}
+publisher = ChangePublisher(client, "ME35-24/mater", min_interval_ms=100, keepalive_ms=1000, tracer=tracer)
+# Once a tag is found, only search around it (full frame again after 3 misses)
+tracker = TagTracker(margin=20, max_misses=3)
+
 while True:
     clock.tick()
     img = sensor.snapshot()
-    x = ""
-    for tag in img.find_apriltags():
+    trace = tracer.begin()
+    command = None
+    for tag in tracker.find(img):
         img.draw_rectangle(tag.rect, color=(255, 0, 0))
         img.draw_cross(tag.cx, tag.cy, color=(0, 255, 0))
-        x = str(tag.id)
-
-    if x == "0":
-        client.publish("ME35-24/mater", "forward")
-        x = ""
-        print("forward")
-
-    elif x == "1":
-        client.publish("ME35-24/mater", "backward")
-        print("backward")
-        x = ""
-
-    elif x == "2":
-        client.publish("ME35-24/mater", "right")
-        x = ""
-        print("right")
+        command = COMMANDS.get(tag.id)
 
-    elif x == "3":
-        client.publish("ME35-24/mater", "left")
-        x = ""
-        print("left")
+    if publisher.offer(command, trace):
+        print(publisher.last)
 
+    client.check_msg()
+    if tracer.due():
+        client.publish(latency_trace.TOPIC, tracer.message())
 
-#    print(clock.fps())
+    if publisher.report_due():
+        print(publisher.report())
+        print(tracker.report())
@@ -5,18 +5,15 @@ import asyncio
 import struct
 import network
 from machine import Pin, PWM
-from mqtt import MQTTClient
+from async_mqtt import MQTTClient
+import latency_trace
+from latency_trace import RECEIVE, ACTUATE, untag
+from tow_dispatch import TowDispatch
 
 class Car:
     
     def __init__(self):
         self.wlan = network.WLAN(network.STA_IF)
-        self.driveForward = False
-        self.driveBackward = False
-        self.driveRight = False
-        self.driveLeft = False
-        self.motorOn = False
-        self.motorOff = False
         
         # Pico board initializations: neopixel, led, buzzer
         self.neo = neopixel.NeoPixel(Pin(28), 1)
@@ -30,67 +27,40 @@ class Car:
         self.motor1_a.freq(1000)
         self.motor1_b.freq(1000)
 
+        # Commands straight from payload bytes to motor duty, no decoding per message
+        self.dispatch = TowDispatch(self.motor1_a, self.motor1_b)
+
+        # Receive and actuate times of traced commands, for tools/latency_report.py
+        self.tracer = latency_trace.Tracer("rightmotor")
+
         # Call internet connection
         self.internet_connection()
-        self.mqtt_subscribe()
 
 
-    def mqtt_subscribe(self):
+    async def mqtt_subscribe(self):
         # MQTT initialization of client and subscribing to topic 'Mater'
         mqtt_broker = 'broker.hivemq.com'
         port = 1883
         topic_sub = 'ME35-24/mater'
 
         def callback(topic, msg):
-            topic, msg = topic.decode(), msg.decode()
-            print(msg)
-            if msg == "1.00, 0.00":
-                print('Start')
-                self.motorOff = False
-                self.motorOn = True
-                self.motor_control()
-            elif msg == "0.00, 1.00":
-                print('Stop')
-                self.motorOn = False
-                self.motorOff = True
-                self.motor_control()
-            elif msg == "right":
-                self.driveRight = True
-                self.driveForward = False
-                self.driveBackward = False
-                self.driveLeft = False
-                self.turn_Right()
-            elif msg == "left":
-                self.driveRight = False
-                self.driveForward = False
-                self.driveBackward = False
-                self.driveLeft = True
-                self.turn_Left()
-            elif msg == "forward":
-                self.driveRight = False
-                self.driveForward = True
-                self.driveBackward = False
-                self.driveLeft = False
-                self.forward()
-            elif msg == "backward":
-                self.driveRight = False
-                self.driveForward = False
-                self.driveBackward = True
-                self.driveLeft = False
-                self.backward()
-
+            received = time.ticks_us()
+            if topic == latency_trace.PING_TOPIC:
+                return self.client.publish(latency_trace.TOPIC, self.tracer.pong(msg))
+            trace = 0
+            if msg.find(b'#') >= 0:
+                msg, trace = untag(msg)  # car_communication.py appends a trace id
+                self.tracer.mark(trace, RECEIVE, received)
+            if self.dispatch(msg):  # only commands that moved the motor were actuated
+                self.tracer.mark(trace, ACTUATE)
 
         self.client = MQTTClient('ME35_mater', mqtt_broker, port, keepalive=60)
-        self.client.connect()
-        print('Connected to %s MQTT broker' % mqtt_broker)
         self.client.set_callback(callback)  # Set the callback for incoming messages
-        self.client.subscribe(topic_sub.encode())  # Subscribe to a topic
+        await self.client.connect()
+        print('Connected to %s MQTT broker' % mqtt_broker)
+        await self.client.subscribe(topic_sub)  # Subscribe to a topic
         print(f'Subscribed to topic {topic_sub}')  # Debug print
-
-    async def check_mqtt(self):
-        while True:
-            self.client.check_msg()
-            await asyncio.sleep(.01)
+        await self.client.subscribe(latency_trace.PING_TOPIC)  # clock probes for latency tracing
 
     def internet_connection(self):
         try:
@@ -107,43 +77,19 @@ class Car:
             print("Failed Connection: ", e)
             quit()
 
-    def motor_control(self):
-        print("in motor control")
-        if self.motorOn:
-            print("motor on")
-            
-        elif self.motorOff:
-            self.motor1_a.duty_u16(0)
-            self.motor1_b.duty_u16(0)
-            print("motor off")
-            
-    def turn_Right(self):
-        if self.driveRight and self.motorOn:
-            self.motor1_a.duty_u16(0)
-            self.motor1_b.duty_u16(65535)
-            print("Turning right")
-
-    def turn_Left(self):
-        if self.driveLeft and self.motorOn:
-            self.motor1_a.duty_u16(0)
-            self.motor1_b.duty_u16(0)
-            print("Turning left")
-    
-    def forward(self):
-        if self.driveForward and self.motorOn:
-            self.motor1_a.duty_u16(0)
-            self.motor1_b.duty_u16(65535)
-            print("Forward")
-
-    def backward(self):
-        if self.driveBackward and self.motorOn:
-            self.motor1_a.duty_u16(50000)
-            self.motor1_b.duty_u16(0)
-            print("Backward")
+    async def publish_traces(self):
+        while True:
+            await asyncio.sleep_ms(self.tracer.flush_ms)
+            if self.tracer.n:
+                try:
+                    await self.client.publish(latency_trace.TOPIC, self.tracer.message())
+                except OSError:
+                    print("Didn't publish traces")
 
     async def main(self):
-        asyncio.create_task(self.check_mqtt())
-        asyncio.get_event_loop().run_forever()
+        await self.mqtt_subscribe()
+        asyncio.create_task(self.publish_traces())
+        await self.client.run()  # dispatches each message as soon as it arrives
 
 # Create Car instance
 c = Car()
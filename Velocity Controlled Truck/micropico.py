@@ -1,8 +1,13 @@
 import asyncio
 import struct
+import time
 import network
 from machine import Pin, PWM
-from mqtt import MQTTClient
+from async_mqtt import MQTTClient
+from velocity_wire import Decoder, SCALE, MEASUREMENT, SETPOINT, ON, OFF
+from velocity_controller import VelocityController
+import latency_trace
+from latency_trace import RECEIVE
 
 class Car:
     
@@ -28,12 +33,21 @@ class Car:
 
         ratio = 1.5
 
+        # Counts lost and late messages from the camera
+        self.wire = Decoder()
+        # Receive and actuate times of the messages openmv.py traces (same every)
+        self.tracer = latency_trace.Tracer("Fred", every=10)
+        # Drives both motors every 20 ms to hold the tag at z = -3, stops
+        # them when the camera goes quiet for 300 ms
+        self.controller = VelocityController(((self.motor1_b, self.motor1_a), (self.motor2_a, self.motor2_b)),
+                                             target=-3 * SCALE, period_ms=20, stale_ms=300,
+                                             tracer=self.tracer)
+
         # Call internet connection
         self.internet_connection()
-        self.mqtt_subscribe()
 
 
-    def mqtt_subscribe(self):
+    async def mqtt_subscribe(self):
         # MQTT initialization of client and subscribing to topic 'Mater'
         mqtt_broker = 'broker.hivemq.com'
         port = 1883
@@ -41,47 +55,34 @@ class Car:
         topic_sub = 'ME35-24_bhs'
 
         def callback(topic, msg):
-            topic, msg = topic.decode(), msg.decode()
-            print(msg)
-
-            self.motor1_a.duty_u16(0)
-            self.motor2_a.duty_u16(0)
-            self.motor1_b.duty_u16(0)
-            self.motor2_b.duty_u16(0)
-            if msg == "on":
+            received = time.ticks_us()
+            if topic == latency_trace.PING_TOPIC:
+                return self.client.publish(latency_trace.TOPIC, self.tracer.pong(msg))
+            # Binary messages from openmv.py (velocity_wire.py), read in place;
+            # the controller task does the driving
+            kind = self.wire.feed(msg)
+            if kind == MEASUREMENT:
+                self.tracer.mark(self.wire.seq, RECEIVE, received)
+                self.controller.measure(self.wire.value(0), self.wire.ticks, self.wire.seq)
+            elif kind == SETPOINT:
+                self.controller.set_target(self.wire.value(0))
+            elif kind == ON or msg == b"on":
                 print('Start')
                 self.motorOff = False
                 self.motorOn = True
                 self.motor_control()
-            elif msg == "off":
+            elif kind == OFF or msg == b"off":
                 print('Stop')
                 self.motorOn = False
                 self.motorOff = True
                 self.motor_control()
-            
-                
-            if float(msg)<-3:
-                msgnum=int(float(msg)*(-1)*10000)
-                print(msgnum)
-                self.motor1_b.duty_u16(msgnum)
-                self.motor2_a.duty_u16(msgnum)            
-            else: 
-                self.motor1_a.duty_u16(0)
-                self.motor2_a.duty_u16(0)
-                self.motor1_b.duty_u16(0)
-                self.motor2_b.duty_u16(0)
         self.client = MQTTClient("Fred", mqtt_broker, port, keepalive=60) #define topic sub later
-        self.client.connect()
-        print('Connected to %s MQTT broker' % mqtt_broker)
         self.client.set_callback(callback)  # Set the callback for incoming messages
-        self.client.subscribe(topic_sub.encode())  # Subscribe to a topic
+        await self.client.connect()
+        print('Connected to %s MQTT broker' % mqtt_broker)
+        await self.client.subscribe(topic_sub)  # Subscribe to a topic
         print(f'Subscribed to topic {topic_sub}')  # Debug print
-
-
-    async def check_mqtt(self):
-        while True:
-            self.client.check_msg()
-            await asyncio.sleep(.01)
+        await self.client.subscribe(latency_trace.PING_TOPIC)  # clock probes for latency tracing
 
     def internet_connection(self):
         try:
@@ -101,11 +102,11 @@ class Car:
     def motor_control(self):
         print("in motor control")
         if self.motorOn:
+            self.controller.enable(True)
             print("motor on")
             
         elif self.motorOff:
-            self.motor1_a.duty_u16(0)
-            self.motor1_b.duty_u16(0)
+            self.controller.enable(False)
             print("motor off")
             
     def turn_Right(self):
@@ -134,9 +135,30 @@ class Car:
             self.motor1_b.duty_u16(0)
             print("Backward")
 
+    async def publish_stats(self):
+        # Control loop timing and message loss, every 5 s
+        while True:
+            await asyncio.sleep_ms(self.controller.report_ms)
+            try:
+                await self.client.publish('ME35-24_bhs/stats', self.controller.report() + "; " + self.wire.report())
+            except OSError:
+                print("Didn't publish stats")
+
+    async def publish_traces(self):
+        while True:
+            await asyncio.sleep_ms(self.tracer.flush_ms)
+            if self.tracer.n:
+                try:
+                    await self.client.publish(latency_trace.TOPIC, self.tracer.message())
+                except OSError:
+                    print("Didn't publish traces")
+
     async def main(self):
-        asyncio.create_task(self.check_mqtt())
-        asyncio.get_event_loop().run_forever()
+        await self.mqtt_subscribe()
+        asyncio.create_task(self.controller.run())
+        asyncio.create_task(self.publish_stats())
+        asyncio.create_task(self.publish_traces())
+        await self.client.run()  # dispatches each message as soon as it arrives
 
 # Create Car instance
 c = Car()
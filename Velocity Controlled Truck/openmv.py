@@ -12,6 +12,10 @@ import time
 import math
 import network
 from mqtt import MQTTClient
+from apriltag_tracker import TagTracker
+from publish_pipeline import LatestPublisher
+from velocity_wire import Encoder
+import latency_trace
 
 SSID = "Tufts_Robot"  # Network SSID
 KEY = ""  # Network key
@@ -31,6 +35,12 @@ topic = "ME35-24_bhs"
 client = MQTTClient("George", "broker.hivemq.com", port=1883)
 client.connect()
 
+# Latency tracing: every tenth message's capture and publish times go to
+# tools/latency_report.py, which also sends the clock probes answered here
+tracer = latency_trace.Tracer("George", every=10, flush_ms=5000)
+client.set_callback(lambda topic, msg: client.publish(latency_trace.TOPIC, tracer.pong(msg)))
+client.subscribe(latency_trace.PING_TOPIC)
+
 sensor.reset()
 sensor.set_pixformat(sensor.RGB565)
 sensor.set_framesize(sensor.QQVGA)
@@ -72,12 +82,21 @@ def degrees(radians):
     return (180 * radians) / math.pi
 
 
+# Once a tag is found, only search around it (full frame again after 3 misses)
+tracker = TagTracker(margin=20, max_misses=3, fx=f_x, fy=f_y, cx=c_x, cy=c_y)
+# The newest distance goes out at up to 20 Hz when the socket can take it;
+# the camera never waits for the network
+# Distances go out as binary MEASUREMENT messages with a sequence number and
+# the capture time (velocity_wire.py), packed when they are published
+publisher = LatestPublisher(client, topic, rate_hz=20, stale_ms=250, tracer=tracer, encoder=Encoder())
+
+
 while True:
     clock.tick()
     img = sensor.snapshot()
-    for tag in img.find_apriltags(
-        fx=f_x, fy=f_y, cx=c_x, cy=c_y
-    ):  # defaults to TAG36H11
+    captured = time.ticks_ms()
+    captured_us = time.ticks_us()
+    for tag in tracker.find(img):  # defaults to TAG36H11
         img.draw_rectangle(tag.rect, color=(255, 0, 0))
         img.draw_cross(tag.cx, tag.cy, color=(0, 255, 0))
         print_args = (
@@ -90,10 +109,17 @@ while True:
         )
         # Translation units are unknown. Rotation units are in degrees.
         #print("Tx: %f, Ty %f, Tz %f, Rx %f, Ry %f, Rz %f" % print_args)
-        print(tag.z_translation)
-        try:
-            client.publish(topic,str(tag.z_translation))
-        except:
-            print("Didn't publish")
-
-    #print(clock.fps())
+        trace = tracer.begin(ticks=captured_us)
+        publisher.offer(tag.z_translation, trace, captured)
+
+    try:
+        publisher.poll()
+        client.check_msg()
+        if tracer.due() and publisher.writable():  # traces must not stall the camera either
+            client.publish(latency_trace.TOPIC, tracer.message())
+    except OSError:
+        print("Didn't publish")
+
+    if tracker.report_due():
+        print(tracker.report())
+        print(publisher.report())
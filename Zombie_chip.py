@@ -2,7 +2,11 @@ import asyncio
 import time
 import os
 from machine import Pin, PWM
-from Tufts_ble import Sniff, Yell
+from zombie_advert import ZombieBeacon, ZombieScanner
+from proximity import ProximityTracker, EXIT, TAG
+from rssi_filter import RssiFilter
+from tag_journal import TagJournal
+from scan_scheduler import ScanScheduler
 import neopixel
 
 class Zombie:
@@ -12,26 +16,35 @@ class Zombie:
     NEOPIXEL_PIN = 28
     EYE_PIN = 9
 
-    def __init__(self, role='human', zombie_number=8, max_zombie_number=13, rssi_threshold=-60, proximity_duration=3, verbose=True):
+    def __init__(self, role='human', zombie_number=8, max_zombie_number=13, rssi_threshold=-60, rssi_hysteresis=6, proximity_duration=3, verbose=True, trace=None, journal='tag_journal.bin', scan_levels=ScanScheduler.DEFAULT_LEVELS):
         """
         Initializes the Zombie game instance.
 
         :param role: 'human' or 'zombie'
         :param zombie_number: Number assigned to the zombie (1 to max_zombie_number)
         :param max_zombie_number: Maximum valid zombie number (default is 13)
-        :param rssi_threshold: RSSI threshold for proximity
+        :param rssi_threshold: Smoothed RSSI at which a zombie counts as in range
+        :param rssi_hysteresis: dB the smoothed RSSI has to drop below the threshold to leave range again
         :param proximity_duration: Duration in seconds to stay within range to register a tag
         :param verbose: Enable verbose output
+        :param trace: File to record every scanned advertisement to (human only), for replaying on a PC
+        :param journal: File the tag journal is written to (human only)
+        :param scan_levels: Scan intervals in ms to back off through while no zombie is near, (0,) scans continuously
         """
         self.role = role  # 'human' or 'zombie'
         self.zombie_number = zombie_number  # Assigned number if zombie
         self.max_zombie_number = max_zombie_number  # Maximum valid zombie number
         self.rssi_threshold = rssi_threshold
+        # Smoothed RSSI with separate enter/exit levels, so noise doesn't flap us in and out of range
+        self.rssi_filter = RssiFilter(max_zombie_number, enter_dbm=rssi_threshold,
+                                      exit_dbm=rssi_threshold - rssi_hysteresis)
         self.proximity_duration = proximity_duration  # Time required within range to register a tag
         self.verbose = verbose
         self.is_game_over = False
         self.tag_counts = {}  # Tracks the number of times tagged by each zombie
-        self.proximity_states = {}  # Tracks proximity states for each zombie
+        # Per-zombie proximity state in arrays, with a heap of exit/tag deadlines
+        self.proximity = ProximityTracker(max_zombie_number, exit_ms=1000,
+                                          tag_ms=int(proximity_duration * 1000))
         self.humanStartTime = time.time()
         self.buzzer = PWM(Pin(self.BUZZER_PIN))
         self.buzzer.freq(1000)
@@ -60,9 +73,17 @@ class Zombie:
                 raise ValueError(f"Zombie must have a zombie_number between 1 and {self.max_zombie_number}.")
             if not (1 <= self.zombie_number <= self.max_zombie_number):
                 raise ValueError(f"Zombie number must be between 1 and {self.max_zombie_number}.")
-            self.advertiser = Yell()
+            self.advertiser = ZombieBeacon()
         elif self.role == 'human':
-            self.scanner = Sniff(discriminator='!', verbose=False)
+            # Zombie advertisements are picked out on their raw bytes in the scan IRQ
+            # and go into a ring, not just the last one seen
+            self.scanner = ZombieScanner(max_zombie_number, size=32, trace=trace)
+            # Tags are appended to a binary journal and written in the background
+            self.journal = TagJournal(journal)
+            # Scan less while nobody is around. Intervals that would delay the first
+            # sighting by more than half of proximity_duration are left out.
+            levels = tuple(level for level in scan_levels if level <= proximity_duration * 500) or (0,)
+            self.scan_scheduler = ScanScheduler(self.scanner, levels, wake_dbm=rssi_threshold - 15)
         else:
             raise ValueError("Role must be 'human' or 'zombie'.")
 
@@ -75,11 +96,6 @@ class Zombie:
         elif self.role == 'human':
             await self.run_human()
     
-    def write_to_file(self, data):
-        with open('tag_data.txt', 'w') as f:
-            for entry in data:
-                f.write(f"Zombie {entry['zombie_number']} tagged {entry['tag_count']} times.\n")
-                    
     async def beep(self, duration):
         self.buzzer.duty_u16(32768)  # Set duty cycle to 50%
         await asyncio.sleep(duration)
@@ -93,13 +109,13 @@ class Zombie:
         self.np.write()
         self.eyeLed.on()
         self.warningLed.off()
-        zombie_name = f"!{self.zombie_number}"
         if self.verbose:
-            print(f"Zombie {self.zombie_number} started advertising as {zombie_name}")
-        self.advertiser.advertise(name=zombie_name)
+            print(f"Zombie {self.zombie_number} started advertising")
+        self.advertiser.advertise(self.zombie_number)
         try:
             while True:
                 await asyncio.sleep(1)
+                self.advertiser.bump()  # new sequence number, humans can see we're still going
         except asyncio.CancelledError:
             pass
         finally:
@@ -115,126 +131,87 @@ class Zombie:
         self.np.write()
         if self.verbose:
             print("Human started scanning for zombies.")
-        self.scanner.scan(0)  # Start scanning indefinitely
+        asyncio.create_task(self.scan_scheduler.run())  # Switches scanning on and off from now on
+        journal_task = asyncio.create_task(self.journal.run())  # Writes tags out in the background
         try:
             while not self.is_game_over:
-                # Process any new advertisements
-                zombie_name = self.scanner.last_name
-                rssi = self.scanner.last_rssi
-                if zombie_name and rssi is not None:
-                    # Clear the last scanned data
-                    self.scanner.last_name = ''
-                    self.scanner.last_rssi = None
-
-                    # Check if the advertiser is a valid zombie within the RSSI threshold
-                    if self.is_valid_zombie(zombie_name, rssi):
-                        zombie_number = int(zombie_name[1:])
-                        await self.update_proximity(zombie_number)
+                # Process every advertisement that came in since the last tick
+                self.scanner.queue.drain(self.handle_advert)
                 # Periodically check proximity states
                 await self.check_proximity()
                 await asyncio.sleep(0.1)
         except asyncio.CancelledError:
             pass
         finally:
-            self.scanner.stop_scan()
+            self.scan_scheduler.stop()
+            journal_task.cancel()
+            self.journal.flush()  # Whatever the cancelled task hadn't written yet
             if self.verbose:
                 print("Human stopped scanning.")
 
-    def is_valid_zombie(self, name, rssi):
+    def handle_advert(self, zombie_number, rssi, ticks):
         """
-        Checks if the scanned device is a valid zombie within the RSSI threshold.
+        Handles one queued advertisement.
 
-        :param name: Advertised name
+        :param zombie_number: Zombie that sent it
         :param rssi: Received signal strength
-        :return: True if valid zombie, False otherwise
+        :param ticks: time.ticks_ms() when it was received
         """
-        if name.startswith('!') and name[1:].isdigit():
-            zombie_number = int(name[1:])
-            if 1 <= zombie_number <= self.max_zombie_number and rssi >= self.rssi_threshold:
-                if self.verbose:
-                    print(f"Detected zombie {name} with RSSI {rssi}")
-                return True
-        return False
-
-    async def update_proximity(self, zombie_number):
-        current_time = time.time()
-        state = self.proximity_states.get(zombie_number, {
-            'in_range': False,
-            'last_seen_time': None,
-            'proximity_start_time': None,
-            'tagged': False  # Track if this zombie has already tagged us
-        })
+        # Anything close enough keeps the scanner at full duty
+        self.scan_scheduler.heard(rssi)
+        # Check if the advertiser is a valid zombie within the RSSI threshold
+        if self.is_valid_zombie(zombie_number, rssi, ticks):
+            # Use the time it was heard, not the time we got round to it
+            if self.proximity.seen(zombie_number, ticks) and self.verbose:
+                print(f"Entered range of zombie {zombie_number}")
 
-        state['last_seen_time'] = current_time
+    def is_valid_zombie(self, zombie_number, rssi, ticks=None):
+        """
+        Checks if the scanned device is a valid zombie within the RSSI threshold.
+        The reading goes through the zombie's RSSI filter, so this is the
+        smoothed, hysteresis-applied answer rather than a raw comparison.
 
-        if not state['in_range']:
-            # Zombie has just entered the range
-            state['in_range'] = True
-            state['proximity_start_time'] = current_time
-            state['tagged'] = False  # Reset tagged state when zombie re-enters
+        :param zombie_number: Zombie number from the advertisement
+        :param rssi: Received signal strength
+        :param ticks: time.ticks_ms() when it was received
+        :return: True if valid zombie, False otherwise
+        """
+        if 1 <= zombie_number <= self.max_zombie_number and self.rssi_filter.update(zombie_number, rssi, ticks):
             if self.verbose:
-                print(f"Entered range of zombie {zombie_number}")
-        self.proximity_states[zombie_number] = state
+                print(f"Detected zombie {zombie_number} with RSSI {rssi}")
+            return True
+        return False
 
     async def check_proximity(self):
-        current_time = time.time()
-        out_of_range_threshold = 1  # Time in seconds to consider out of range
-        zombies_to_remove = []
-
-        for zombie_number, state in self.proximity_states.items():
-            last_seen = state['last_seen_time']
-            if current_time - last_seen > out_of_range_threshold:
-                # Zombie is out of range
-                if state['in_range']:
-                    state['in_range'] = False
-                    state['proximity_start_time'] = None
-                    # self.warningLed.off()
-                    if self.verbose:
-                        print(f"Exited range of zombie {zombie_number}")
-                    state['tagged'] = False  # Require re-entry for next tag
-                # Remove if not seen for a longer time
-                if current_time - last_seen > out_of_range_threshold * 5:
-                    zombies_to_remove.append(zombie_number)
-            else:
-                # Zombie is in range and has not yet tagged us
-                if state['in_range'] and not state['tagged']:
-                    proximity_time = current_time - state['proximity_start_time']
-                    # self.warningLed.on()
-                    if proximity_time >= self.proximity_duration:
-                        # Time threshold met, register a tag
-                        await self.handle_tagging(zombie_number)
-                        # Mark this zombie as having tagged us
-                        state['tagged'] = True  # Prevent further tags until re-entry
-                        if self.verbose:
-                            print(f"Zombie {zombie_number} tagged after {self.proximity_duration} seconds in range.")
+        # Only zombies whose exit or tag deadline has come up are looked at
+        for k in range(self.proximity.poll()):
+            kind, zombie_number = self.proximity.event(k)
+            if kind == EXIT:
+                if self.verbose:
+                    print(f"Exited range of zombie {zombie_number}")
+            elif kind == TAG:
+                # Time threshold met, register a tag (the tracker won't tag again until re-entry)
+                await self.handle_tagging(zombie_number)
+                if self.verbose:
+                    print(f"Zombie {zombie_number} tagged after {self.proximity_duration} seconds in range.")
 
-        # TO TEST
-        if any(state['in_range'] for state in self.proximity_states.values()):
+        if self.proximity.in_range:
             self.warningLed.on()  # At least one zombie is in range, turn LED on
         else:
             self.warningLed.off()  # No zombies are in range, turn LED off
 
-        # Clean up old entries
-        for zombie_number in zombies_to_remove:
-            del self.proximity_states[zombie_number]
-
-
     async def handle_tagging(self, zombie_number):
         """
         Handles tagging logic when proximity duration is met.
 
         :param zombie_number: The number of the detected zombie
         """
-        self.tag_counts.setdefault(zombie_number, 0)
-        self.tag_counts[zombie_number] += 1
+        self.tag_counts[zombie_number] = self.journal.tag(zombie_number)
 
         if self.verbose:
             asyncio.create_task(self.beep(0.5))
             print(f"Tagged by zombie {zombie_number}: {self.tag_counts[zombie_number]} time(s)")
 
-        tag_data = [{'zombie_number': zn, 'tag_count': count} for zn, count in self.tag_counts.items()]
-        self.write_to_file(tag_data)
-
         if self.tag_counts[zombie_number] >= 3:
             # Human becomes a zombie with the same number
             self.role = 'zombie'
@@ -246,10 +223,11 @@ class Zombie:
             timeTillDeath = time.time() - self.humanStartTime
             print("Lasted: ", timeTillDeath)
 
-            with open('tag_data.txt', 'a') as f:
-                f.write(f"This human lasted {timeTillDeath} seconds before being zombified! /n")
-            
-            self.advertiser = Yell()
+            self.journal.zombified(zombie_number)
+            self.journal.flush()  # don't leave the last tags sitting in RAM
+            self.scan_scheduler.stop()
+
+            self.advertiser = ZombieBeacon()
             await self.run_zombie()
 
     def stop(self):
@@ -260,18 +238,8 @@ class Zombie:
         if self.role == 'zombie':
             self.advertiser.stop_advertising()
         elif self.role == 'human':
-            self.scanner.stop_scan()
-
-zombie = Zombie()
-asyncio.run(zombie.run())
-Collapse
-
-
-
-
-
-
-
-
-
+            self.scan_scheduler.stop()
 
+if __name__ == '__main__':
+    zombie = Zombie()
+    asyncio.run(zombie.run())
@@ -0,0 +1,104 @@
+# Bounded BLE advertisement queue for the Zombie game.
+#
+# Tufts_ble.Sniff keeps only the last advertisement it saw in last_name /
+# last_rssi, so anything that arrives between two polls is overwritten.
+# AdvertQueue keeps every advertisement the scan IRQ push()es, with the
+# ticks_ms it arrived at, in a bounded ring of preallocated slots instead.
+# The game loop drains the whole batch each tick:
+#
+#     queue = AdvertQueue(32)
+#     ...
+#     queue.push(zombie_number, rssi)   # in the scan IRQ
+#     ...
+#     queue.drain(handle)               # handle(zombie_number, rssi, ticks) per advert
+#
+# Like edge_events.EdgeButton, the ring is single-producer (scan IRQ) /
+# single-consumer (task): the producer only writes _head and the consumer
+# only writes _tail. When it is full new advertisements are dropped and
+# counted, never blocked on.
+#
+# zombie_advert.ZombieScanner does the pushing. record() also writes every
+# drained advertisement as a "ms,name,rssi" line, for replaying on a PC with
+# python -m bench.zombie_replay --trace adverts.csv.
+
+import time
+from array import array
+
+
+class AdvertQueue:
+
+    def __init__(self, size=32):
+        """
+        :param size: Ring size, rounded up to a power of two
+        """
+        n = 1
+        while n < size:
+            n <<= 1
+        self._mask = n - 1
+        self._zombies = [0] * n
+        self._rssi = array('h', bytes(2 * n))
+        self._ticks = array('i', bytes(4 * n))
+        self._head = 0
+        self._tail = 0
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self._trace = None
+        self._trace_start = 0
+        self._trace_prefix = ''
+
+    def __len__(self):
+        return (self._head - self._tail) & self._mask
+
+    def push(self, zombie, rssi):
+        """
+        Called from the scan IRQ. Does not allocate.
+        """
+        self.received += 1
+        head = self._head
+        nxt = (head + 1) & self._mask
+        if nxt == self._tail:
+            self.dropped += 1
+            return
+        self._zombies[head] = zombie
+        self._rssi[head] = rssi
+        self._ticks[head] = time.ticks_ms()
+        self._head = nxt
+
+    def record(self, stream, prefix=''):
+        """
+        Writes every advertisement drained from now on to stream as
+        "ms,name,rssi" lines, ms counted from this call. None stops recording.
+
+        :param prefix: Written before each zombie number, '!' gives the names the old game advertised
+        """
+        self._trace = stream
+        self._trace_start = time.ticks_ms()
+        self._trace_prefix = prefix
+        if stream is not None:
+            stream.write('# ms,name,rssi\n')
+
+    def drain(self, handler, limit=0):
+        """
+        Calls handler(zombie, rssi, ticks) for every queued advertisement,
+        oldest first. Returns how many were handled.
+
+        :param limit: Handle at most this many (0 for all of them)
+        """
+        zombies = self._zombies
+        tail = self._tail
+        head = self._head  # adverts arriving while we drain wait for next time
+        count = 0
+        trace = self._trace
+        while tail != head:
+            if trace is not None:
+                trace.write('%d,%s%s,%d\n' % (time.ticks_diff(self._ticks[tail], self._trace_start),
+                                              self._trace_prefix, zombies[tail], self._rssi[tail]))
+            handler(zombies[tail], self._rssi[tail], self._ticks[tail])
+            tail = (tail + 1) & self._mask
+            self._tail = tail
+            count += 1
+            if count == limit:
+                break
+        self.processed += count
+        return count
@@ -0,0 +1,130 @@
+# AprilTag tracking for the OpenMV camera loops.
+#
+# find_apriltags() over the whole QQVGA frame costs about 50 ms, most of
+# the frame time, although a tag that was just found is almost always
+# still about where it was. TagTracker searches only a region of interest:
+# the last tag rectangles grown by margin pixels, clamped to the frame. The
+# margin also grows with the tag, because big, close tags move more pixels
+# per frame. After max_misses frames in a row without a tag it goes back
+# to full-frame searches until a tag turns up again.
+#
+#     tracker = TagTracker(margin=20, max_misses=3)
+#     while True:
+#         img = sensor.snapshot()
+#         for tag in tracker.find(img):
+#             ...
+#         if tracker.report_due():
+#             print(tracker.report())      # fps while searching / tracking
+#
+# Extra keyword arguments (fx, fy, cx, cy, families, ...) are passed on to
+# find_apriltags(). Tag coordinates are always full-frame ones. With roi=,
+# OpenMV estimates the pose on the cropped image, so the principal point
+# (cx, cy, by default the frame's centre) is moved into the roi's
+# coordinates for those searches; otherwise the translations would jump
+# whenever the tracker switches between full frame and roi.
+
+import time
+
+FULL = 0
+ROI = 1
+
+
+class TagTracker:
+
+    def __init__(self, margin=20, max_misses=3, report_ms=5000, **find_args):
+        """
+        :param margin: Pixels added around the last tags on every side
+        :param max_misses: Frames without a tag before searching the whole frame again
+        :param report_ms: How often report_due() says it's time for report()
+        :param find_args: Passed on to find_apriltags()
+        """
+        self.margin = margin
+        self.max_misses = max_misses
+        self.report_ms = report_ms
+        self.find_args = find_args
+        self._roi_args = dict(find_args)  # find_args with cx, cy relative to the roi
+        self.roi = None  # (x, y, w, h) being tracked, None while searching the whole frame
+        self.misses = 0
+        self.fallbacks = 0  # times tracking lost the tag and went back to full frames
+        # Frames and the time until the next find() call, per mode
+        self.frames = [0, 0]
+        self.us = [0, 0]
+        self._mode = FULL
+        self._last = None
+        self._window_start = time.ticks_ms()
+        self._window_frames = [0, 0]
+        self._window_us = [0, 0]
+
+    def find(self, img):
+        """
+        Finds the tags in img, searching only around the last ones if possible.
+        """
+        now = time.ticks_us()
+        if self._last is not None:
+            # The whole frame since the last call, not just the search, counts for its mode
+            self.us[self._mode] += time.ticks_diff(now, self._last)
+        self._last = now
+        roi = self.roi
+        self._mode = FULL if roi is None else ROI
+        self.frames[self._mode] += 1
+        if roi is None:
+            tags = img.find_apriltags(**self.find_args)
+        else:
+            args = self._roi_args
+            args['cx'] = self.find_args.get('cx', img.width() * 0.5) - roi[0]
+            args['cy'] = self.find_args.get('cy', img.height() * 0.5) - roi[1]
+            tags = img.find_apriltags(roi=roi, **args)
+        if tags:
+            self.misses = 0
+            self.roi = self._around(tags, img.width(), img.height())
+        elif roi is not None:
+            self.misses += 1
+            if self.misses >= self.max_misses:
+                self.roi = None
+                self.misses = 0
+                self.fallbacks += 1
+        return tags
+
+    def _around(self, tags, width, height):
+        x0 = width
+        y0 = height
+        x1 = 0
+        y1 = 0
+        size = 0
+        for tag in tags:
+            x, y, w, h = tag.rect
+            x0 = min(x0, x)
+            y0 = min(y0, y)
+            x1 = max(x1, x + w)
+            y1 = max(y1, y + h)
+            size = max(size, w, h)
+        margin = self.margin + size // 2
+        x0 = max(x0 - margin, 0)
+        y0 = max(y0 - margin, 0)
+        x1 = min(x1 + margin, width)
+        y1 = min(y1 + margin, height)
+        return (x0, y0, x1 - x0, y1 - y0)
+
+    def fps(self, mode):
+        """
+        Frames per second while in mode (FULL or ROI), over the whole run.
+        """
+        return self.frames[mode] * 1000000 / self.us[mode] if self.us[mode] else 0.0
+
+    def report_due(self):
+        return time.ticks_diff(time.ticks_ms(), self._window_start) >= self.report_ms
+
+    def report(self):
+        """
+        fps and frame counts per mode since the last report, as a string.
+        """
+        rates = []
+        for mode in (FULL, ROI):
+            frames = self.frames[mode] - self._window_frames[mode]
+            us = self.us[mode] - self._window_us[mode]
+            rates.append((frames * 1000000 / us if us else 0.0, frames))
+            self._window_frames[mode] = self.frames[mode]
+            self._window_us[mode] = self.us[mode]
+        self._window_start = time.ticks_ms()
+        return "full frame %.1f fps (%d frames), tracking %.1f fps (%d frames), %d fallbacks" % (
+            rates[FULL][0], rates[FULL][1], rates[ROI][0], rates[ROI][1], self.fallbacks)
@@ -0,0 +1,215 @@
+# Event-driven MQTT client for uasyncio.
+#
+# Drop-in for the polling pattern
+#
+#     client.check_msg()
+#     await asyncio.sleep(0.1)
+#
+# The client reads the socket through an asyncio stream, so the task that runs
+# it only wakes up when bytes arrive (or when a keepalive ping is due). The
+# callback is called as soon as a PUBLISH has been read. It may be a plain
+# function or an async one; async callbacks are awaited before the next
+# message is read.
+#
+# Usage:
+#
+#     client = MQTTClient('ME35_chris', 'broker.hivemq.com', 1883, keepalive=60)
+#     client.set_callback(callback)
+#     await client.connect()
+#     await client.subscribe('nightlightSA')
+#     asyncio.create_task(client.run())
+#
+# Speaks MQTT 3.1.1 with QoS 0 publishes, which is all the scripts here use.
+
+import errno
+import struct
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+CONNECT = 0x10
+CONNACK = 0x20
+PUBLISH = 0x30
+PUBACK = 0x40
+SUBSCRIBE = 0x82
+SUBACK = 0x90
+PINGREQ = 0xC0
+PINGRESP = 0xD0
+DISCONNECT = 0xE0
+
+
+class MQTTException(Exception):
+    pass
+
+
+def _to_bytes(value):
+    if isinstance(value, str):
+        return value.encode()
+    return value
+
+
+def _encode_length(n):
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return out
+
+
+def _packet(first_byte, body):
+    return bytes([first_byte]) + _encode_length(len(body)) + body
+
+
+def _string(value):
+    return struct.pack('!H', len(value)) + value
+
+
+class MQTTClient:
+
+    def __init__(self, client_id, server, port=1883, keepalive=60, reconnect_delay=2):
+        """
+        :param client_id: MQTT client id
+        :param server: Broker host name
+        :param port: Broker port
+        :param keepalive: Keepalive in seconds, 0 disables pings
+        :param reconnect_delay: Seconds to wait before reconnecting after a dropped connection
+        """
+        self.client_id = _to_bytes(client_id)
+        self.server = server
+        self.port = port
+        self.keepalive = keepalive
+        self.reconnect_delay = reconnect_delay
+        self.cb = None
+        self.subscriptions = []
+        self._reader = None
+        self._writer = None
+        self._pid = 0
+        self.received = 0
+        self.published = 0
+
+    def set_callback(self, f):
+        self.cb = f
+
+    async def _send(self, data):
+        if self._writer is None:
+            # Not connected yet, or run() is between connections
+            raise OSError(errno.ENOTCONN)
+        self._writer.write(data)
+        await self._writer.drain()
+
+    async def _read_packet(self):
+        # Returns (first_byte, body). Suspends until the broker sends something.
+        first = (await self._reader.readexactly(1))[0]
+        n = 0
+        shift = 0
+        while True:
+            byte = (await self._reader.readexactly(1))[0]
+            n |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                break
+            shift += 7
+        body = await self._reader.readexactly(n) if n else b''
+        return first, body
+
+    async def connect(self, clean_session=True):
+        self._reader, self._writer = await asyncio.open_connection(self.server, self.port)
+        flags = 0x02 if clean_session else 0x00
+        body = _string(b'MQTT') + struct.pack('!BBH', 4, flags, self.keepalive) + _string(self.client_id)
+        await self._send(_packet(CONNECT, body))
+        first, body = await self._read_packet()
+        if first != CONNACK or body[1] != 0:
+            raise MQTTException(f"connect refused: {body[1] if len(body) > 1 else first}")
+        for topic in self.subscriptions:
+            await self._subscribe(topic)
+
+    async def _subscribe(self, topic):
+        self._pid = (self._pid % 0xFFFF) + 1
+        await self._send(_packet(SUBSCRIBE, struct.pack('!H', self._pid) + _string(topic) + b'\x00'))
+
+    async def subscribe(self, topic):
+        """
+        Subscribes and remembers the topic so it is renewed after a reconnect.
+        The SUBACK is consumed by run().
+        """
+        topic = _to_bytes(topic)
+        if topic not in self.subscriptions:
+            self.subscriptions.append(topic)
+        await self._subscribe(topic)
+
+    async def publish(self, topic, msg, retain=False):
+        topic, msg = _to_bytes(topic), _to_bytes(msg)
+        await self._send(_packet(PUBLISH | (0x01 if retain else 0), _string(topic) + msg))
+        self.published += 1
+
+    async def ping(self):
+        await self._send(_packet(PINGREQ, b''))
+
+    async def disconnect(self):
+        if self._writer is not None:
+            try:
+                await self._send(_packet(DISCONNECT, b''))
+                self._writer.close()
+            except OSError:
+                pass
+        self._reader = self._writer = None
+
+    async def _dispatch(self, first, body):
+        topic_len = struct.unpack_from('!H', body)[0]
+        topic = body[2:2 + topic_len]
+        start = 2 + topic_len
+        qos = (first >> 1) & 0x03
+        if qos:
+            pid = body[start:start + 2]
+            start += 2
+            await self._send(_packet(PUBACK, pid))
+        self.received += 1
+        if self.cb is not None:
+            result = self.cb(topic, body[start:])
+            if result is not None:
+                await result
+
+    async def _keepalive(self):
+        while True:
+            await asyncio.sleep(self.keepalive / 2)
+            try:
+                await self.ping()
+            except OSError:
+                return
+
+    async def _serve(self):
+        pinger = asyncio.create_task(self._keepalive()) if self.keepalive else None
+        try:
+            while True:
+                first, body = await self._read_packet()
+                kind = first & 0xF0
+                if kind == PUBLISH:
+                    await self._dispatch(first, body)
+                # SUBACK, PUBACK and PINGRESP need no action
+        finally:
+            if pinger is not None:
+                pinger.cancel()
+
+    async def run(self):
+        """
+        Reads and dispatches messages forever, reconnecting if the connection drops.
+        Call connect() first.
+        """
+        while True:
+            try:
+                await self._serve()
+            except (OSError, EOFError) as e:
+                print("MQTT connection lost:", e)
+            await self.disconnect()
+            while True:
+                await asyncio.sleep(self.reconnect_delay)
+                try:
+                    await self.connect()
+                    break
+                except (OSError, EOFError, MQTTException) as e:
+                    print("MQTT reconnect failed:", e)
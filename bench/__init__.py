@@ -0,0 +1,3 @@
+"""
+Host-side benchmarks. Run from the repo root, e.g. python -m bench.button_latency
+"""
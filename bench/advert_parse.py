@@ -0,0 +1,84 @@
+# Per-advertisement cost of recognising a zombie in the scan IRQ.
+#
+# Compares the name path (decode_name() from MicroPython's
+# ble_advertising.py, which Tufts_ble uses, then the startswith / isdigit /
+# int checks the Zombie game did) with zombie_advert.match() on the raw
+# bytes, for zombie advertisements and for typical foreign traffic. Reports
+# host ns per packet and the most memory one packet allocates at once; the
+# allocations are what the board pays for in the IRQ and in GC pauses.
+#
+#   python -m bench.advert_parse
+
+import argparse
+import time
+import tracemalloc
+
+import hostsim
+
+hostsim.install()
+
+import zombie_advert  # noqa: E402
+from bluetooth import name_payload  # noqa: E402
+
+_ADV_TYPE_NAME = 0x09
+
+
+def decode_field(payload, adv_type):
+    i = 0
+    result = []
+    while i + 1 < len(payload):
+        if payload[i + 1] == adv_type:
+            result.append(payload[i + 2:i + payload[i] + 1])
+        i += 1 + payload[i]
+    return result
+
+
+def decode_name(payload):
+    n = decode_field(payload, _ADV_TYPE_NAME)
+    return str(n[0], 'utf-8') if n else ''
+
+
+def by_name(adv_data):
+    name = decode_name(adv_data)
+    if name.startswith('!') and name[1:].isdigit():
+        return int(name[1:])
+    return 0
+
+
+PACKETS = {
+    'zombie': (name_payload('!13'), zombie_advert.encode(13, 7)),
+    'phone': (bytes.fromhex('02011a0aff4c0010050b1c2d3e4f') + b'\x0a\x09Pixel 7 P',) * 2,
+    'ibeacon': (bytes.fromhex('0201061aff4c000215' + '11' * 16 + '0001000ac5'),) * 2,
+    'other pico': (name_payload('Pico'),) * 2,
+}
+
+
+def cost(parse, data, repeat):
+    buf = memoryview(data)  # what the IRQ hands over
+    start = time.perf_counter_ns()
+    for _ in range(repeat):
+        parse(buf)
+    ns = (time.perf_counter_ns() - start) / repeat
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    parse(buf)
+    allocated = tracemalloc.get_traced_memory()[1] - before  # peak within one call
+    tracemalloc.stop()
+    return ns, allocated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time zombie recognition on raw advertisements.")
+    parser.add_argument('--repeat', type=int, default=200000)
+    args = parser.parse_args()
+
+    print(f"{'packet':>10} {'name path ns':>13} {'bytes':>6} {'match() ns':>11} {'bytes':>6}")
+    for label, (as_name, as_payload) in PACKETS.items():
+        name_ns, name_bytes = cost(by_name, as_name, args.repeat)
+        raw_ns, raw_bytes = cost(zombie_advert.match, as_payload, args.repeat)
+        print(f"{label:>10} {name_ns:>13.0f} {name_bytes:>6.0f} {raw_ns:>11.0f} {raw_bytes:>6.0f}")
+
+
+if __name__ == '__main__':
+    main()
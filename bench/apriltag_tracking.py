@@ -0,0 +1,127 @@
+# Detection rate of the OpenMV AprilTag loops with and without ROI tracking.
+#
+# Runs the camera scripts under hostsim on the virtual clock, with frame and
+# find_apriltags costs from hostsim's sensor model. The camera sees one tag
+# that drifts across the frame and changes size, jumps somewhere else every
+# 1-6 s (the car turning, a different tag) and is sometimes out of view.
+#
+# Reports per script:
+#   frames/s      camera loop rate
+#   detect/s      frames in which the tag was found
+#   hit %         of the frames where the tag was in view
+#   px/frame      pixels searched per frame
+#   reacquire     time from a jump to the first detection after it (p50/p99)
+#   pp off        searches whose principal point was not the frame's centre;
+#                 their pose (z_translation, the car's distance) is skewed
+#
+#   python -m bench.apriltag_tracking
+#   git show HEAD~1:"Velocity Controlled Truck/openmv.py" > /tmp/old.py
+#   python -m bench.apriltag_tracking --script /tmp/old.py "Velocity Controlled Truck/openmv.py"
+
+import argparse
+import bisect
+import math
+import random
+
+import hostsim
+from bench.stats import fmt_ms, percentile
+
+hostsim.install()
+
+from hostsim import clock, recorder  # noqa: E402
+from hostsim.runner import run_script_virtual  # noqa: E402
+import sensor  # noqa: E402
+
+SCRIPTS = ['Velocity Controlled Truck/openmv.py', 'Remote_control_tow_truck/car_communication.py']
+WIDTH = 160
+HEIGHT = 120
+
+
+def make_segments(seed, seconds, speed, hidden):
+    """
+    [(start_us, visible, x, y, vx, vy, size)], one entry per jump.
+    """
+    rng = random.Random(seed)
+    segments = []
+    t = 0.0
+    while t < seconds:
+        size = rng.randint(16, 40)
+        angle = rng.uniform(0, 2 * math.pi)
+        v = rng.uniform(0, speed)
+        segments.append((int(t * 1000000), rng.random() >= hidden,
+                         rng.uniform(size / 2, WIDTH - size / 2), rng.uniform(size / 2, HEIGHT - size / 2),
+                         v * math.cos(angle), v * math.sin(angle), size))
+        t += rng.uniform(1.0, 6.0)
+    return segments
+
+
+def _bounce(p, lo, hi):
+    # Reflects p into [lo, hi], so the tag bounces off the frame edges
+    span = hi - lo
+    p = (p - lo) % (2 * span)
+    return lo + (p if p <= span else 2 * span - p)
+
+
+def run(script, segments, seconds):
+    starts = [segment[0] for segment in segments]
+    visible = []  # per frame
+
+    def scene(frame):
+        now = clock.now_us()
+        start, shown, x, y, vx, vy, size = segments[bisect.bisect_right(starts, now) - 1]
+        if not shown:
+            visible.append(False)
+            return []
+        dt = (now - start) / 1000000
+        cx = int(_bounce(x + vx * dt, size / 2, WIDTH - size / 2))
+        cy = int(_bounce(y + vy * dt, size / 2, HEIGHT - size / 2))
+        visible.append(True)
+        return [sensor.Tag(0, cx, cy, size, size)]
+
+    sensor.set_scene(scene)
+    run_script_virtual(script, seconds)
+    finds = recorder.select('find_apriltags')
+    frames = min(len(finds), len(visible))
+    hits = sum(1 for k in range(frames) if finds[k].value[1])
+    in_view = sum(1 for k in range(frames) if visible[k])
+    reacquire = []
+    found_at = [e.t_us for e in finds if e.value[1]]
+    for k, (start, shown, *_) in enumerate(segments):
+        end = segments[k + 1][0] if k + 1 < len(segments) else int(seconds * 1000000)
+        if not shown or start >= seconds * 1000000:
+            continue
+        i = bisect.bisect_left(found_at, start)
+        if i < len(found_at) and found_at[i] < end:
+            reacquire.append(found_at[i] - start)
+    return {
+        'fps': frames / seconds,
+        'detect': hits / seconds,
+        'hit': hits / in_view if in_view else 0.0,
+        'pixels': sum(e.value[0] for e in finds[:frames]) / max(frames, 1),
+        'reacquire': reacquire,
+        'pp_off': sum(1 for e in finds if e.value[2] != (WIDTH * 0.5, HEIGHT * 0.5)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AprilTag detection rate with and without ROI tracking.")
+    parser.add_argument('--script', nargs='+', default=SCRIPTS)
+    parser.add_argument('--seconds', type=float, default=300.0, help="virtual time per run")
+    parser.add_argument('--speed', type=float, default=60.0, help="fastest tag drift in px/s")
+    parser.add_argument('--hidden', type=float, default=0.15, help="share of stretches with no tag in view")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    segments = make_segments(args.seed, args.seconds, args.speed, args.hidden)
+    print(f"{len(segments)} jumps over {args.seconds:.0f} s, drift up to {args.speed:.0f} px/s")
+    print(f"{'script':<48} {'frames/s':>8} {'detect/s':>8} {'hit %':>6} {'px/frame':>8} "
+          f"{'reacquire p50/p99 ms':>21} {'pp off':>7}")
+    for script in args.script:
+        r = run(script, segments, args.seconds)
+        reacquire = r['reacquire']
+        print(f"{script:<48} {r['fps']:>8.1f} {r['detect']:>8.1f} {100 * r['hit']:>6.1f} {r['pixels']:>8.0f} "
+              f"{fmt_ms(percentile(reacquire, 50)) + '/' + fmt_ms(percentile(reacquire, 99)):>21} {r['pp_off']:>7}")
+
+
+if __name__ == '__main__':
+    main()
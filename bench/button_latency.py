@@ -0,0 +1,174 @@
+# Button/MQTT-to-effect latency for the two nightlight scripts.
+#
+# Runs each script under hostsim, injects button edges, accelerometer taps
+# and MQTT 'start'/'stop' messages at jittered times, and measures how long it
+# takes until the first NeoPixel write, buzzer duty change and LED duty change.
+#
+#   python -m bench.button_latency
+#   python -m bench.button_latency --json after.json --compare before.json
+
+import argparse
+import asyncio
+import json
+import random
+
+import hostsim
+from bench.stats import fmt_ms, percentile
+from hostsim import clock, devices, recorder
+from hostsim.runner import run_script
+
+SCRIPTS = {
+    'SA_Nightlight_Part_1.py': {
+        'button': 'GPIO20', 'topic': 'nightlightSA', 'tap': False,
+        'effects': {'neopixel': 'NeoPixel(GPIO28)', 'buzzer': 'PWM(GPIO18)', 'led': 'PWM(GPIO0)'},
+        'expect': {'button': ('neopixel', 'buzzer'), 'mqtt start': ('led',), 'mqtt stop': ('buzzer', 'led')},
+    },
+    'Nightlight_Part_2.py': {
+        'button': 'GPIO12', 'topic': None, 'tap': True,
+        'effects': {'neopixel': 'NeoPixel(GPIO28)', 'buzzer': 'PWM(GPIO18)', 'led': 'PWM(GPIO7)'},
+        'expect': {'button': ('neopixel',), 'tap': ('neopixel', 'buzzer')},
+    },
+}
+
+SETTLE_S = 0.1  # lets the script's tasks start (and Part 1 act on 'start') before the first press
+PRESS_HOLD_S = 0.15
+TAP_HOLD_S = 0.006  # a knock: a few samples of impact, not a held tilt
+TAP_Y = -20000
+
+
+def make_stimulus(config, args, marks):
+    """
+    Builds the coroutine that pokes the script. Every stimulus is appended to
+    marks as (name, t_us) so latencies can be matched up afterwards.
+    """
+    import machine
+    from hostsim import broker
+
+    rng = random.Random(args.seed)
+    tapping = [False]
+
+    def accel_sample():
+        return (0, TAP_Y if tapping[0] else 0, 8192)
+
+    devices.i2c_devices[devices.MSA311Device.ADDRESS].sample_source = accel_sample
+
+    async def stimulus():
+        if config['topic']:
+            while not recorder.first('subscribe'):
+                await asyncio.sleep(0.01)
+            marks.append(('mqtt start', clock.now_us()))
+            broker.default.publish(config['topic'], 'start')
+        await asyncio.sleep(SETTLE_S)
+
+        for _ in range(args.presses):
+            marks.append(('button', clock.now_us()))
+            machine.sim_drive(config['button'], 0)
+            await asyncio.sleep(PRESS_HOLD_S)
+            machine.sim_drive(config['button'], 1)
+            await asyncio.sleep(args.gap + rng.random() * args.gap)
+
+        if config['tap']:
+            for _ in range(args.taps):
+                marks.append(('tap', clock.now_us()))
+                tapping[0] = True
+                await asyncio.sleep(TAP_HOLD_S)
+                tapping[0] = False
+                await asyncio.sleep(3.0 + rng.random() * 0.2)  # fade + beep + fade back
+
+        if config['topic']:
+            for _ in range(args.mqtt_rounds):
+                for command in ('stop', 'start'):
+                    marks.append((f"mqtt {command}", clock.now_us()))
+                    broker.default.publish(config['topic'], command)
+                    await asyncio.sleep(args.mqtt_gap + rng.random() * args.gap)
+        marks.append(('end', clock.now_us()))
+
+    return stimulus
+
+
+def effect_times(source):
+    """
+    Timestamps of every NeoPixel write or PWM duty call on source.
+    """
+    return [event.t_us for event in recorder.events
+            if event.source == source and event.kind in ('write', 'duty_u16')]
+
+
+def latencies(marks, times):
+    # For each stimulus, the first effect before the next stimulus (or a miss)
+    result = {}
+    j = 0
+    for (name, t0), (_, t1) in zip(marks, marks[1:]):
+        while j < len(times) and times[j] < t0:
+            j += 1
+        hit = times[j] - t0 if j < len(times) and times[j] < t1 else None
+        result.setdefault(name, []).append(hit)
+    return result
+
+
+def bench_script(script, args):
+    config = SCRIPTS[script]
+    marks = []
+    hostsim.install()
+    report = run_script(script, seconds=args.timeout,
+                        stimulus=lambda: make_stimulus(config, args, marks)())
+    rows = []
+    for effect, source in config['effects'].items():
+        for stimulus, samples in latencies(marks, effect_times(source)).items():
+            if effect not in config['expect'].get(stimulus, ()):
+                continue
+            hits = [s for s in samples if s is not None]
+            rows.append({
+                'script': script, 'stimulus': stimulus, 'effect': effect,
+                'n': len(samples), 'misses': len(samples) - len(hits),
+                'p50_us': percentile(hits, 50), 'p99_us': percentile(hits, 99),
+            })
+    return rows, report
+
+
+def key(row):
+    return (row['script'], row['stimulus'], row['effect'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Button/MQTT-to-effect latency for the nightlight scripts.")
+    parser.add_argument('scripts', nargs='*', default=list(SCRIPTS))
+    parser.add_argument('--presses', type=int, default=40)
+    parser.add_argument('--taps', type=int, default=5)
+    parser.add_argument('--mqtt-rounds', type=int, default=20)
+    parser.add_argument('--gap', type=float, default=0.25, help="base gap between stimuli in seconds")
+    parser.add_argument('--mqtt-gap', type=float, default=0.3,
+                        help="base gap between MQTT commands in seconds")
+    parser.add_argument('--seed', type=int, default=35)
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--json', help="write the results to this file")
+    parser.add_argument('--compare', help="results file from an earlier run to diff against")
+    args = parser.parse_args()
+
+    rows = []
+    for script in args.scripts:
+        script_rows, report = bench_script(script, args)
+        rows += script_rows
+        print(report.format().splitlines()[0])
+
+    before = {}
+    if args.compare:
+        with open(args.compare) as f:
+            before = {key(row): row for row in json.load(f)}
+
+    print(f"{'script':<26} {'stimulus':<11} {'effect':<9} {'n':>4} {'miss':>4} {'p50 ms':>8} {'p99 ms':>8}")
+    for row in rows:
+        line = (f"{row['script']:<26} {row['stimulus']:<11} {row['effect']:<9} {row['n']:>4} "
+                f"{row['misses']:>4} {fmt_ms(row['p50_us']):>8} {fmt_ms(row['p99_us']):>8}")
+        old = before.get(key(row))
+        if old:
+            line += (f"   was {fmt_ms(old['p50_us'])} / {fmt_ms(old['p99_us'])}")
+        print(line)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+# Per-message cost of the tow-truck cars' command dispatch.
+#
+# Runs the same command stream (bench.car_load's: mostly "forward", "left",
+# "right", "backward", now and then start/stop) through two versions of what
+# leftmotor.py / rightmotor.py do with a payload, on hostsim PWMs:
+#
+#   chain      the old callback: decode topic and payload, print the
+#              payload, if/elif string compares, set four drive flags and
+#              call a method that checks them again and prints
+#   table      tow_dispatch.TowDispatch: one dict lookup on the raw bytes
+#              to a preallocated duty pair, duty_u16() only on change
+#
+# and again with every payload carrying a trace id ("forward#12"), which
+# both have to strip first. Reports host ns per message, the most memory
+# one message allocates at once (on motors that don't record, so hostsim's
+# event log isn't counted), and duty_u16() calls per message. print() goes
+# to a writer that drops it; on the board it also goes out over USB. Both
+# leave the motor at the same duties after every message.
+#
+# On the host the table still shows a few bytes: CPython boxes every int
+# above 256, so TowDispatch's message counters allocate once they get
+# there. On the Pico they don't, and a plain command allocates nothing; a
+# traced one allocates the stripped command and its id.
+#
+#   python -m bench.car_dispatch
+
+import argparse
+import contextlib
+import io
+import time
+import tracemalloc
+
+import hostsim
+
+hostsim.install()
+
+from bench.car_load import tow_stream  # noqa: E402
+from hostsim import recorder  # noqa: E402
+from latency_trace import untag  # noqa: E402
+from machine import PWM, Pin  # noqa: E402
+from tow_dispatch import TowDispatch  # noqa: E402
+
+
+class Chain:
+    # The callback body leftmotor.py and rightmotor.py had
+
+    def __init__(self, motor1_a, motor1_b):
+        self.motor1_a = motor1_a
+        self.motor1_b = motor1_b
+        self.driveForward = False
+        self.driveBackward = False
+        self.driveRight = False
+        self.driveLeft = False
+        self.motorOn = False
+        self.motorOff = False
+
+    def __call__(self, topic, msg):
+        msg, trace = untag(msg)
+        topic, msg = topic.decode(), msg.decode()
+        print(msg)
+        if msg == "1.00, 0.00":
+            print('Start')
+            self.motorOff = False
+            self.motorOn = True
+            self.motor_control()
+        elif msg == "0.00, 1.00":
+            print('Stop')
+            self.motorOn = False
+            self.motorOff = True
+            self.motor_control()
+        elif msg == "right":
+            self.driveRight = True
+            self.driveForward = False
+            self.driveBackward = False
+            self.driveLeft = False
+            self.turn_Right()
+        elif msg == "left":
+            self.driveRight = False
+            self.driveForward = False
+            self.driveBackward = False
+            self.driveLeft = True
+            self.turn_Left()
+        elif msg == "forward":
+            self.driveRight = False
+            self.driveForward = True
+            self.driveBackward = False
+            self.driveLeft = False
+            self.forward()
+        elif msg == "backward":
+            self.driveRight = False
+            self.driveForward = False
+            self.driveBackward = True
+            self.driveLeft = False
+            self.backward()
+
+    def motor_control(self):
+        print("in motor control")
+        if self.motorOn:
+            print("motor on")
+        elif self.motorOff:
+            self.motor1_a.duty_u16(0)
+            self.motor1_b.duty_u16(0)
+            print("motor off")
+
+    def turn_Right(self):
+        if self.driveRight and self.motorOn:
+            self.motor1_a.duty_u16(0)
+            self.motor1_b.duty_u16(65535)
+            print("Turning right")
+
+    def turn_Left(self):
+        if self.driveLeft and self.motorOn:
+            self.motor1_a.duty_u16(0)
+            self.motor1_b.duty_u16(0)
+            print("Turning left")
+
+    def forward(self):
+        if self.driveForward and self.motorOn:
+            self.motor1_a.duty_u16(0)
+            self.motor1_b.duty_u16(65535)
+            print("Forward")
+
+    def backward(self):
+        if self.driveBackward and self.motorOn:
+            self.motor1_a.duty_u16(50000)
+            self.motor1_b.duty_u16(0)
+            print("Backward")
+
+
+def make_table(motor1_a, motor1_b):
+    dispatch = TowDispatch(motor1_a, motor1_b)
+
+    def table(topic, msg):
+        # as in the scripts' callback
+        if msg.find(b'#') >= 0:
+            msg, trace = untag(msg)
+        dispatch(msg)
+
+    return table
+
+
+class _Motor:
+    # PWM that only keeps its duty
+
+    def __init__(self):
+        self.duty = 0
+
+    def duty_u16(self, value=None):
+        if value is None:
+            return self.duty
+        self.duty = value
+
+
+def motors():
+    hostsim.reset()
+    return PWM(Pin(0, Pin.OUT)), PWM(Pin(1, Pin.OUT))
+
+
+def duties(make, topic, stream):
+    motor1_a, motor1_b = _Motor(), _Motor()
+    handle = make(motor1_a, motor1_b)
+    after = []
+    with contextlib.redirect_stdout(_Drop()):
+        for msg in stream:
+            handle(topic, msg)
+            after.append((motor1_a.duty, motor1_b.duty))
+    return after
+
+
+class _Drop(io.TextIOBase):
+    # stdout that keeps nothing
+
+    def write(self, s):
+        return len(s)
+
+
+def _noop(topic, msg):
+    pass
+
+
+def peak_bytes(handle, topic, stream):
+    # Most memory in use at once over the stream, above where it started;
+    # nothing is kept between messages, so that is the worst single message
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    for msg in stream:
+        handle(topic, msg)
+    peak = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return peak
+
+
+def cost(make, topic, stream, repeat):
+    """
+    (ns per message, most bytes one message allocated, duty_u16() calls per
+    message).
+    """
+    motor1_a, motor1_b = motors()
+    handle = make(motor1_a, motor1_b)
+    n = len(stream)
+    with contextlib.redirect_stdout(_Drop()):
+        start = time.perf_counter_ns()
+        for k in range(repeat):
+            handle(topic, stream[k % n])
+        ns = (time.perf_counter_ns() - start) / repeat
+        writes = len(recorder.select('duty_u16'))
+        handle = make(_Motor(), _Motor())
+        peak_bytes(handle, topic, stream)  # warm up first
+        peak = max(peak_bytes(handle, topic, stream) - peak_bytes(_noop, topic, stream), 0)
+    return ns, peak, writes / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the tow-truck command dispatch, if/elif chain against table.")
+    parser.add_argument('--repeat', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    topic = b'ME35-24/mater'
+    plain = tow_stream(args.seed)
+    tagged = [msg + b'#' + str(k + 1).encode() for k, msg in enumerate(plain)]
+    print(f"{'stream':>8} {'dispatch':>9} {'ns/msg':>8} {'bytes':>6} {'duty writes/msg':>16}")
+    for label, stream in (('plain', plain), ('traced', tagged)):
+        for name, make in (('chain', Chain), ('table', make_table)):
+            ns, peak, writes = cost(make, topic, stream, args.repeat)
+            print(f"{label:>8} {name:>9} {ns:>8.0f} {peak:>6} {writes:>16.2f}")
+        same = duties(Chain, topic, stream) == duties(make_table, topic, stream)
+        print(f"{'':>8} motor duties after every message {'match' if same else 'DIFFER'}")
+
+
+if __name__ == '__main__':
+    main()
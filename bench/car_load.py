@@ -0,0 +1,201 @@
+# Command throughput of the Car scripts under load.
+#
+# Runs a Car script under hostsim (simulated pins, PWM and WiFi, the local
+# broker in hostsim.broker standing in for broker.hivemq.com) and replays a
+# command stream into its topic at a fixed rate, one run per rate. The
+# tow-truck cars get their text commands ("1.00, 0.00", "forward", "left",
+# ...), micropico.py velocity_wire distance measurements with an
+# occasional ON. The callback the script registers with async_mqtt is
+# wrapped to time it. Reports per rate:
+#
+#   handled     messages/s that made it through the callback
+#   callback    host time per callback, p50/p99 us
+#   backlog     messages sent but not handled yet: max, and at the end
+#   growth      how fast the backlog grew over the second half, msgs/s;
+#               a car that keeps up stays near 0
+#
+# The rate where growth turns positive is where the car falls behind. Host
+# times are not board times, but show where the callback spends its time
+# and how it scales. print() is free here and slow over USB on the board;
+# --print-us makes every write to stdout take that long.
+#
+#   python -m bench.car_load
+#   python -m bench.car_load --script Remote_control_tow_truck/rightmotor.py --rates 100 300 1000 --print-us 300
+
+import argparse
+import asyncio
+import contextlib
+import io
+import random
+import time
+
+import hostsim
+from bench.stats import percentile
+
+hostsim.install()
+
+import async_mqtt  # noqa: E402
+from hostsim import broker, clock  # noqa: E402
+from hostsim.runner import run_script  # noqa: E402
+from velocity_wire import Encoder  # noqa: E402
+
+TOW_COMMANDS = [b'forward', b'left', b'right', b'backward']
+
+
+def tow_stream(seed, n=1000):
+    rng = random.Random(seed)
+    stream = [b'1.00, 0.00']
+    while len(stream) < n:
+        stream.append(b'0.00, 1.00' if rng.random() < 0.02 else b'1.00, 0.00' if rng.random() < 0.02
+                      else rng.choice(TOW_COMMANDS))
+    return stream
+
+
+def velocity_stream(seed, n=1000):
+    rng = random.Random(seed)
+    encoder = Encoder()
+    stream = [encoder.control(True)]
+    while len(stream) < n:
+        stream.append(encoder.measurement(rng.uniform(-8.0, -2.0)))
+    return stream
+
+
+SCRIPTS = {
+    'Remote_control_tow_truck/rightmotor.py': (b'ME35-24/mater', tow_stream),
+    'Remote_control_tow_truck/leftmotor.py': (b'ME35-24/lighting', tow_stream),
+    'Velocity Controlled Truck/micropico.py': (b'ME35-24_bhs', velocity_stream),
+}
+
+
+class Probe:
+    """
+    Wraps the callbacks scripts register, counting and timing the ones for topic.
+    """
+
+    def __init__(self, topic):
+        self.topic = topic
+        self.handled = 0
+        self.callback_ns = []
+        self._set_callback = async_mqtt.MQTTClient.set_callback
+
+    def __enter__(self):
+        probe = self
+        set_callback = self._set_callback
+
+        def timed_set_callback(client, f):
+            def timed(topic, msg):
+                start = time.perf_counter_ns()
+                result = f(topic, msg)
+                if topic == probe.topic:
+                    probe.callback_ns.append(time.perf_counter_ns() - start)
+                    probe.handled += 1
+                return result
+
+            set_callback(client, timed)
+
+        async_mqtt.MQTTClient.set_callback = timed_set_callback
+        return self
+
+    def __exit__(self, *exc):
+        async_mqtt.MQTTClient.set_callback = self._set_callback
+
+
+class _SlowWriter(io.TextIOBase):
+    # stdout that costs us per write, like print() over USB
+
+    def __init__(self, us):
+        self.us = us
+
+    def write(self, s):
+        clock.spend(self.us)
+        return len(s)
+
+
+def subscribed(topic):
+    return any(broker.topic_matches(f, topic) for f, _ in broker.default.subscriptions)
+
+
+def load(probe, topic, stream, rate, seconds):
+    async def generate():
+        waited = 0
+        while not subscribed(topic) and waited < 200:  # the car connecting
+            await asyncio.sleep(0.01)
+            waited += 1
+        await asyncio.sleep(0.1)
+        base = probe.handled
+        sent = 0
+        samples = []  # (s, backlog)
+        start = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < seconds:
+            due = int(elapsed * rate)
+            while sent < due:
+                broker.default.publish(topic, stream[sent % len(stream)])
+                sent += 1
+            samples.append((elapsed, sent - (probe.handled - base)))
+            await asyncio.sleep(0.005)
+            elapsed = time.perf_counter() - start
+        handled = probe.handled - base
+        return {'sent': sent, 'handled': handled, 'seconds': elapsed, 'samples': samples}
+
+    return generate
+
+
+def growth(samples):
+    # Least-squares slope of the backlog over the second half of the run
+    half = samples[len(samples) // 2:]
+    if len(half) < 2:
+        return 0.0
+    n = len(half)
+    mt = sum(t for t, _ in half) / n
+    mb = sum(b for _, b in half) / n
+    var = sum((t - mt) ** 2 for t, _ in half)
+    return sum((t - mt) * (b - mb) for t, b in half) / var if var else 0.0
+
+
+def run(script, rate, seconds, seed, print_us):
+    topic, make_stream = SCRIPTS[script]
+    stream = make_stream(seed)
+    with Probe(topic) as probe:
+        if print_us:
+            with contextlib.redirect_stdout(_SlowWriter(print_us)):
+                report = run_script(script, seconds + 3, stimulus=load(probe, topic, stream, rate, seconds),
+                                    quiet=False)
+        else:
+            report = run_script(script, seconds + 3, stimulus=load(probe, topic, stream, rate, seconds))
+    r = report.result
+    if r is None:
+        raise RuntimeError(f"{script} never took the load: {report.error}")
+    backlog = [b for _, b in r['samples']]
+    return {
+        'handled': r['handled'] / r['seconds'],
+        'callback_us': [ns / 1000 for ns in probe.callback_ns],
+        'backlog_max': max(backlog, default=0),
+        'backlog_end': r['sent'] - r['handled'],
+        'growth': growth(r['samples']),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay command streams into the Car scripts at rising rates.")
+    parser.add_argument('--script', nargs='+', default=list(SCRIPTS), choices=list(SCRIPTS))
+    parser.add_argument('--rates', type=int, nargs='+', default=[100, 1000, 10000, 30000, 100000],
+                        help="messages per second to try")
+    parser.add_argument('--seconds', type=float, default=2.0, help="load time per rate")
+    parser.add_argument('--print-us', type=float, default=0.0, help="time one write to stdout takes")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    for script in args.script:
+        print(script)
+        print(f"  {'rate/s':>7} {'handled/s':>9} {'callback p50/p99 us':>20} {'backlog max/end':>16} {'growth/s':>9}")
+        for rate in args.rates:
+            r = run(script, rate, args.seconds, args.seed, args.print_us)
+            cb = r['callback_us']
+            cb_text = f"{percentile(cb, 50):.1f}/{percentile(cb, 99):.1f}" if cb else '-'
+            print(f"  {rate:>7} {r['handled']:>9.0f} {cb_text:>20} "
+                  f"{str(r['backlog_max']) + '/' + str(r['backlog_end']):>16} {r['growth']:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# Camera frame rate and MQTT traffic of the AprilTag command loop.
+#
+# Runs Remote_control_tow_truck/car_communication.py under hostsim on the
+# virtual clock. The camera sees a seeded sequence of tags: each one is held
+# for 0.3-3 s, sometimes with no tag in between, and the detector misses the
+# tag in a few frames. Frames cost what hostsim's sensor models (60 fps sensor,
+# find_apriltags per pixel) and every publish blocks the loop for
+# --publish-ms, the socket write over WiFi.
+#
+# Reports camera frames/s, published msgs/s and the delay from a tag showing
+# up to its command being published (p50/p99), plus tags whose command was
+# never published while they were shown.
+#
+#   python -m bench.command_publish
+#   git show HEAD~1:Remote_control_tow_truck/car_communication.py > /tmp/old.py
+#   python -m bench.command_publish --script /tmp/old.py Remote_control_tow_truck/car_communication.py
+
+import argparse
+import bisect
+import random
+
+import hostsim
+from bench.stats import fmt_ms, percentile
+
+hostsim.install()
+
+from hostsim import clock, recorder  # noqa: E402
+from hostsim.runner import run_script_virtual  # noqa: E402
+import mqtt  # noqa: E402
+import sensor  # noqa: E402
+from latency_trace import untag  # noqa: E402
+
+SCRIPT = 'Remote_control_tow_truck/car_communication.py'
+COMMANDS = {0: b'forward', 1: b'backward', 2: b'right', 3: b'left'}
+TOPIC = b'ME35-24/mater'
+
+
+def make_segments(seed, seconds):
+    """
+    [(start_us, tag id or None)], one entry per change of what the camera sees.
+    """
+    rng = random.Random(seed)
+    segments = []
+    t = 0.0
+    while t < seconds:
+        tag = None if rng.random() < 0.2 else rng.choice(list(COMMANDS))
+        if not segments or segments[-1][1] != tag:
+            segments.append((int(t * 1000000), tag))
+        t += rng.uniform(0.3, 3.0)
+    return segments
+
+
+def run(script, segments, seconds, seed, dropout, publish_ms):
+    starts = [start for start, _ in segments]
+
+    def scene(frame):
+        tag = segments[bisect.bisect_right(starts, clock.now_us()) - 1][1]
+        if tag is None or random.Random(seed * 1000003 + frame).random() < dropout:
+            return []
+        return [sensor.Tag(tag, 80, 60)]
+
+    end_us = int(seconds * 1000000)
+    mqtt.PUBLISH_US = int(publish_ms * 1000)
+    try:
+        sensor.set_scene(scene)
+        run_script_virtual(script, seconds)
+        frames = len(recorder.select('snapshot'))
+        # Commands only, without their trace ids
+        publishes = [(e.t_us, untag(e.value[1])[0]) for e in recorder.select('publish') if e.value[0] == TOPIC]
+    finally:
+        mqtt.PUBLISH_US = 0
+
+    delays = []
+    missed = 0
+    for k, (start, tag) in enumerate(segments):
+        if tag is None or start >= end_us:
+            continue
+        end = segments[k + 1][0] if k + 1 < len(segments) else end_us
+        sent = [t for t, msg in publishes if start <= t < end and msg == COMMANDS[tag]]
+        if sent:
+            delays.append(sent[0] - start)
+        else:
+            missed += 1
+    return frames / seconds, len(publishes) / seconds, delays, missed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frame rate and MQTT traffic of the AprilTag command loop.")
+    parser.add_argument('--script', nargs='+', default=[SCRIPT])
+    parser.add_argument('--seconds', type=float, default=300.0, help="virtual time per run")
+    parser.add_argument('--publish-ms', type=float, default=4.0, help="time one blocking publish takes")
+    parser.add_argument('--dropout', type=float, default=0.05, help="chance the detector misses the tag in a frame")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    segments = make_segments(args.seed, args.seconds)
+    changes = sum(1 for _, tag in segments if tag is not None)
+    print(f"{changes} tag changes over {args.seconds:.0f} s, publish blocks for {args.publish_ms} ms")
+    print(f"{'script':<48} {'frames/s':>8} {'msgs/s':>7} {'delay p50':>10} {'delay p99':>10} {'missed':>6}")
+    for script in args.script:
+        fps, mps, delays, missed = run(script, segments, args.seconds, args.seed, args.dropout,
+                                       args.publish_ms)
+        print(f"{script:<48} {fps:>8.1f} {mps:>7.1f} {fmt_ms(percentile(delays, 50)):>10} "
+              f"{fmt_ms(percentile(delays, 99)):>10} {missed:>6}")
+
+
+if __name__ == '__main__':
+    main()
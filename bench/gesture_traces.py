@@ -0,0 +1,188 @@
+# Offline benchmark for gesture.TapDetector.
+#
+# Runs the detector over accelerometer traces and reports detection accuracy
+# per gesture and processing cost per block. Traces are CSV files:
+#
+#     # rate 500
+#     # event 1234 tap          <- optional labels: sample index and kind
+#     x,y,z
+#     -120,310,16420
+#     ...
+#
+# Without --trace a set of labelled synthetic traces is generated (noise,
+# gravity, slow tilts, taps, double taps and shakes). The old Part 2 rule,
+# y < -17000, is scored next to it for comparison.
+#
+#   python -m bench.gesture_traces
+#   python -m bench.gesture_traces --trace desk_taps.csv --rate 500
+
+import argparse
+import math
+import random
+import time
+from array import array
+
+from gesture import DOUBLE_TAP, NAMES, SHAKE, TAP, TapDetector
+
+KINDS = {name: kind for kind, name in NAMES.items()}
+GRAVITY = 16384  # 1 g at the default +-2 g range
+
+
+def load_trace(path, rate_hz):
+    samples = array('h')
+    labels = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('#'):
+                words = line[1:].split()
+                if words[0] == 'rate':
+                    rate_hz = int(words[1])
+                elif words[0] == 'event':
+                    labels.append((KINDS[' '.join(words[2:])], int(words[1])))
+                continue
+            if line[0].isalpha():
+                continue  # header row
+            samples.extend(int(v) for v in line.split(','))
+    return path, rate_hz, samples, labels
+
+
+def synthetic_trace(seed, rate_hz, seconds=60):
+    """
+    Gravity on z plus noise, with taps, double taps, shakes and slow tilts
+    (picking the light up) at random times. Returns the trace and its labels.
+    """
+    rng = random.Random(seed)
+    n = rate_hz * seconds
+    x = [rng.gauss(0, 150) for _ in range(n)]
+    y = [rng.gauss(0, 150) for _ in range(n)]
+    z = [GRAVITY + rng.gauss(0, 150) for _ in range(n)]
+    labels = []
+
+    def impulse(at, amplitude):
+        axis = rng.choice((x, y, z))
+        sign = rng.choice((-1, 1))
+        for k in range(rate_hz // 50):  # ~20 ms of damped ringing at ~150 Hz
+            if at + k < n:
+                axis[at + k] += sign * amplitude * math.exp(-k / (rate_hz / 250)) * math.cos(
+                    2 * math.pi * 150 * k / rate_hz)
+
+    t = rate_hz
+    while t < n - 3 * rate_hz:
+        event = rng.choice(('tap', 'double tap', 'shake', 'tilt', 'none'))
+        if event == 'tap':
+            impulse(t, rng.uniform(9000, 20000))
+            labels.append((TAP, t))
+        elif event == 'double tap':
+            gap = int(rng.uniform(0.12, 0.25) * rate_hz)
+            impulse(t, rng.uniform(9000, 20000))
+            impulse(t + gap, rng.uniform(9000, 20000))
+            labels.append((DOUBLE_TAP, t + gap))
+        elif event == 'shake':
+            hz = rng.uniform(3, 6)
+            for k in range(rate_hz):
+                envelope = min(1.0, k / (rate_hz / 10), (rate_hz - k) / (rate_hz / 10))  # 0.1 s ramps
+                x[t + k] += 20000 * envelope * math.sin(2 * math.pi * hz * k / rate_hz)
+            labels.append((SHAKE, t))
+        elif event == 'tilt':
+            # Tip the light on its side over half a second and back
+            for k in range(rate_hz):
+                angle = math.pi / 2 * math.sin(math.pi * k / rate_hz)
+                y[t + k] -= GRAVITY * 1.1 * math.sin(angle)
+                z[t + k] -= GRAVITY * (1 - math.cos(angle))
+        t += int(rng.uniform(1.5, 2.5) * rate_hz)
+
+    samples = array('h')
+    for i in range(n):
+        for v in (x[i], y[i], z[i]):
+            samples.append(max(-32768, min(32767, int(v))))
+    return f"synthetic-{seed}", rate_hz, samples, labels
+
+
+def score(detected, labels, rate_hz):
+    """
+    Matches detections to labels of the same kind. Taps must be within 0.3 s
+    of the label; a shake is labelled where it starts, so it may be found up
+    to 1 s later. Returns {kind: [true positives, false positives, false negatives]}.
+    """
+    result = {kind: [0, 0, 0] for kind in NAMES}
+    unmatched = list(labels)
+    tolerance = rate_hz * 3 // 10
+    for kind, sample in detected:
+        for label in unmatched:
+            late = sample - label[1]
+            if label[0] == kind and (-tolerance <= late <= (rate_hz if kind == SHAKE else tolerance)):
+                unmatched.remove(label)
+                result[kind][0] += 1
+                break
+        else:
+            result[kind][1] += 1
+    for kind, _ in unmatched:
+        result[kind][2] += 1
+    return result
+
+
+def run_detector(samples, rate_hz, block):
+    detector = TapDetector(rate_hz=rate_hz)
+    detected = []
+    view = memoryview(samples)
+    step = 3 * block
+    start = time.perf_counter()
+    for i in range(0, len(samples) - step + 1, step):
+        for k in range(detector.process(view[i:i + step])):
+            detected.append(detector.event(k))
+    elapsed = time.perf_counter() - start
+    return detected, elapsed, len(samples) // step
+
+
+def run_threshold(samples, rate_hz):
+    # The old rule: y below -17000, then busy with the fade for ~2.6 s
+    detected = []
+    quiet_until = 0
+    for i in range(1, len(samples), 3):
+        n = i // 3
+        if n >= quiet_until and samples[i] < -17000:
+            detected.append((TAP, n))
+            quiet_until = n + int(2.6 * rate_hz)
+    return detected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark for gesture.TapDetector.")
+    parser.add_argument('--trace', action='append', help="CSV trace, may be given several times")
+    parser.add_argument('--rate', type=int, default=500, help="sample rate if the trace has no '# rate' line")
+    parser.add_argument('--block', type=int, default=50, help="samples per block")
+    parser.add_argument('--synthetic', type=int, default=5, help="synthetic traces to generate without --trace")
+    args = parser.parse_args()
+
+    if args.trace:
+        traces = [load_trace(path, args.rate) for path in args.trace]
+    else:
+        traces = [synthetic_trace(seed, args.rate) for seed in range(args.synthetic)]
+
+    totals = {'detector': {kind: [0, 0, 0] for kind in NAMES}, 'y < -17000': {kind: [0, 0, 0] for kind in NAMES}}
+    cost_s = 0.0
+    blocks = 0
+    for name, rate_hz, samples, labels in traces:
+        detected, elapsed, n_blocks = run_detector(samples, rate_hz, args.block)
+        cost_s += elapsed
+        blocks += n_blocks
+        for method, found in (('detector', detected), ('y < -17000', run_threshold(samples, rate_hz))):
+            for kind, counts in score(found, labels, rate_hz).items():
+                for j in range(3):
+                    totals[method][kind][j] += counts[j]
+
+    print(f"{len(traces)} traces, {blocks} blocks of {args.block} samples: "
+          f"{1e6 * cost_s / max(blocks, 1):.1f} us/block, "
+          f"{blocks * args.block / max(cost_s, 1e-9):,.0f} samples/s on this host")
+    print(f"{'method':<12} {'gesture':<11} {'hits':>5} {'false':>6} {'missed':>7}")
+    for method, per_kind in totals.items():
+        for kind, (tp, fp, fn) in per_kind.items():
+            if tp or fp or fn:
+                print(f"{method:<12} {NAMES[kind]:<11} {tp:>5} {fp:>6} {fn:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+# Camera loop timing under network stalls, for Velocity Controlled Truck/openmv.py.
+#
+# Runs the script under hostsim on the virtual clock with a tag always in
+# view. Every publish takes --publish-ms, and now and then the network
+# stalls for 100-800 ms (hostsim mqtt.sim_stall): a publish during a stall
+# blocks until it is over, and the socket doesn't poll writable.
+#
+# The tag's z_translation carries the time its frame was captured, so each
+# published value's age can be worked out, from velocity_wire messages or
+# the older text ones. Reports:
+#   frames/s         camera loop rate
+#   frame gap        time between snapshots, p50/p99/max: the control period
+#   msgs/s           values published
+#   age              capture to publish, p50/p99
+#   seq gaps         sequence numbers a velocity_wire Decoder fed every
+#                    published message counts as lost; the network here
+#                    loses nothing, so anything above 0 is the camera
+#                    numbering messages it never sent
+#
+#   python -m bench.publish_stalls
+#   git show HEAD~1:"Velocity Controlled Truck/openmv.py" > /tmp/old.py
+#   python -m bench.publish_stalls --script /tmp/old.py "Velocity Controlled Truck/openmv.py"
+
+import argparse
+import random
+import struct
+
+import hostsim
+from bench.stats import fmt_ms, percentile
+
+hostsim.install()
+
+from hostsim import clock, recorder  # noqa: E402
+from hostsim.runner import run_script_virtual  # noqa: E402
+import mqtt  # noqa: E402
+import sensor  # noqa: E402
+import velocity_wire  # noqa: E402
+
+SCRIPT = 'Velocity Controlled Truck/openmv.py'
+TOPIC = b'ME35-24_bhs'
+
+
+def make_stalls(seed, seconds, every_s):
+    """
+    [(start_us, duration_us)]
+    """
+    rng = random.Random(seed)
+    stalls = []
+    t = rng.expovariate(1 / every_s)
+    while t < seconds:
+        stalls.append((int(t * 1000000), int(rng.uniform(0.1, 0.8) * 1000000)))
+        t += rng.expovariate(1 / every_s)
+    return stalls
+
+
+def captured_s(msg):
+    # Capture time the scene put in z_translation, in (negative) seconds
+    if msg[:1] == bytes([velocity_wire.MEASUREMENT]):
+        return struct.unpack_from('<i', msg, velocity_wire.HEADER_SIZE)[0] / velocity_wire.SCALE
+    return float(msg)
+
+
+def run(script, stalls, seconds, publish_ms):
+    pending = list(reversed(stalls))
+
+    def scene(frame):
+        now = clock.now_us()
+        while pending and pending[-1][0] <= now:
+            mqtt.sim_stall(pending.pop()[1])
+        tag = sensor.Tag(0, 80, 60)
+        tag.z_translation = -now / 1000000  # when this frame was captured
+        return [tag]
+
+    sensor.set_scene(scene)
+    mqtt.PUBLISH_US = int(publish_ms * 1000)
+    try:
+        run_script_virtual(script, seconds)
+    finally:
+        mqtt.PUBLISH_US = 0
+    shots = [e.t_us for e in recorder.select('snapshot')]
+    gaps = [b - a for a, b in zip(shots, shots[1:])]
+    publishes = [e for e in recorder.select('publish') if e.value[0] == TOPIC]
+    ages = [e.t_us + captured_s(e.value[1]) * 1000000 for e in publishes]
+    decoder = velocity_wire.Decoder()
+    for e in publishes:
+        decoder.feed(e.value[1])
+    return {
+        'fps': len(shots) / seconds,
+        'gaps': gaps,
+        'mps': len(publishes) / seconds,
+        'ages': ages,
+        'seq_gaps': decoder.lost if decoder.received else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="openmv.py frame timing under network stalls.")
+    parser.add_argument('--script', nargs='+', default=[SCRIPT])
+    parser.add_argument('--seconds', type=float, default=120.0, help="virtual time per run")
+    parser.add_argument('--publish-ms', type=float, default=4.0, help="time one publish takes")
+    parser.add_argument('--stall-every', type=float, default=3.0, help="mean seconds between stalls")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    stalls = make_stalls(args.seed, args.seconds, args.stall_every)
+    print(f"{len(stalls)} stalls over {args.seconds:.0f} s, {sum(d for _, d in stalls) / 1000000:.1f} s stalled")
+    print(f"{'script':<40} {'frames/s':>8} {'frame gap p50/p99/max ms':>25} {'msgs/s':>7} {'age p50/p99 ms':>15} {'seq gaps':>8}")
+    for script in args.script:
+        r = run(script, stalls, args.seconds, args.publish_ms)
+        gaps = r['gaps']
+        gap_text = '/'.join(fmt_ms(v) for v in (percentile(gaps, 50), percentile(gaps, 99), max(gaps, default=None)))
+        age_text = fmt_ms(percentile(r['ages'], 50)) + '/' + fmt_ms(percentile(r['ages'], 99))
+        gaps_text = '-' if r['seq_gaps'] is None else str(r['seq_gaps'])
+        print(f"{script:<40} {r['fps']:>8.1f} {gap_text:>25} {r['mps']:>7.1f} {age_text:>15} {gaps_text:>8}")
+
+
+if __name__ == '__main__':
+    main()
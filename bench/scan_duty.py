@@ -0,0 +1,173 @@
+# Detection latency versus scan duty cycle for the Zombie human.
+#
+# One human stands still while zombies come and go: each visit a zombie walks
+# in from 30 m at walking speed, stands next to the human for a while, walks
+# off and is gone for 10-60 s. Zombie.run_human runs unmodified over
+# hostsim.radio on the virtual clock, once per scan configuration, on the same
+# visits. Tags are counted but don't turn the human into a zombie.
+#
+# For each configuration it reports:
+#   duty      fraction of the game the radio was scanning
+#   detect    time from the zombie getting within tag range (mean RSSI at
+#             rssi_threshold) to the human seeing it in range
+#   tag       same start, to the tag; continuous scanning gives about
+#             detect + proximity_duration
+#   missed    visits that ended without a tag
+#   wakeups   times an advert cut a back-off short
+#
+#   python -m bench.scan_duty
+#   python -m bench.scan_duty --visits 100 --levels 0 --levels 0,250,500,1000 --levels 500
+
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import tempfile
+
+import hostsim
+from bench.stats import percentile
+
+hostsim.install()
+
+from hostsim import clock  # noqa: E402
+from hostsim.radio import Channel, Node  # noqa: E402
+from hostsim.virtual_loop import VirtualEventLoop  # noqa: E402
+from zombie_advert import ZombieBeacon  # noqa: E402
+
+STEP_S = 0.1
+START_M = 30.0
+STAND_M = 1.0
+
+
+def make_visits(seed, visits, zombies=13):
+    rng = random.Random(seed)
+    return [(rng.uniform(10, 60), rng.uniform(5, 15), rng.randint(1, zombies)) for _ in range(visits)]
+
+
+def simulate(levels, visits, seed, speed, rssi_threshold, proximity_duration):
+    """
+    Runs every visit against one human scanning with levels. Returns a dict of
+    results.
+    """
+    hostsim.reset()
+    clock.use_virtual(0)
+    loop = VirtualEventLoop()
+    channel = Channel(random.Random(seed))
+    tag_range = channel.distance_for(rssi_threshold)
+    close_since = [None]  # us the visiting zombie got within tag range
+    visit = [None, None]  # us the human first saw the zombie in range, and was first tagged
+    detects = []
+    tags = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='scan_duty_') as workdir:
+        os.chdir(workdir)  # tag journal lands here
+        try:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                import Zombie_chip
+
+                human = Zombie_chip.Zombie(role='human', rssi_threshold=rssi_threshold,
+                                           proximity_duration=proximity_duration, verbose=False,
+                                           scan_levels=levels)
+                seen = human.proximity.seen
+
+                def timed_seen(zombie_number, ticks):
+                    entered = seen(zombie_number, ticks)
+                    if entered and visit[0] is None:
+                        visit[0] = clock.now_us()
+                    return entered
+
+                human.proximity.seen = timed_seen
+
+                async def record_tag(zombie_number):
+                    if visit[1] is None:
+                        visit[1] = clock.now_us()
+
+                human.handle_tagging = record_tag  # counted only, the human stays human
+                me = channel.add(Node(0.0, 0.0, scanner=human.scanner.ble))
+                beacon = ZombieBeacon()
+                visitor = channel.add(Node(START_M, 0.0, advertiser=beacon.ble))
+
+                async def walk(to):
+                    while abs(visitor.x - to) > speed * STEP_S:
+                        visitor.x += speed * STEP_S if to > visitor.x else -speed * STEP_S
+                        if visitor.x <= tag_range and close_since[0] is None:
+                            close_since[0] = clock.now_us()
+                        await asyncio.sleep(STEP_S)
+                    visitor.x = to
+
+                async def world():
+                    for away_s, stay_s, zombie_number in visits:
+                        await asyncio.sleep(away_s)
+                        close_since[0] = None
+                        visit[:] = [None, None]
+                        beacon.advertise(zombie_number)
+                        visitor.x = START_M
+                        await walk(STAND_M)
+                        await asyncio.sleep(stay_s)
+                        await walk(START_M)
+                        beacon.stop_advertising()
+                        for when, results in zip(visit, (detects, tags)):
+                            # Noise can put the zombie in range a little before it really is: that counts as 0
+                            results.append(None if when is None else max(when - close_since[0], 0) / 1000)
+
+                loop.create_task(human.run_human())
+                loop.create_task(channel.run_node(me))
+                loop.create_task(channel.run_node(visitor))
+                loop.run_until_complete(world())
+                seconds = clock.now_us() / 1000000
+                duty = human.scan_scheduler.duty()
+                scheduler = human.scan_scheduler
+                human.stop()
+                for task in asyncio.all_tasks(loop):
+                    task.cancel()
+                loop.run_until_complete(asyncio.gather(*asyncio.all_tasks(loop), return_exceptions=True))
+        finally:
+            loop.close()
+            clock.use_real()
+            os.chdir(cwd)
+    return {
+        'levels': scheduler.levels,
+        'seconds': seconds,
+        'duty': duty,
+        'detect_ms': [d for d in detects if d is not None],
+        'tag_ms': [t for t in tags if t is not None],
+        'missed': sum(1 for t in tags if t is None),
+        'wakeups': scheduler.wakeups,
+    }
+
+
+def _levels(text):
+    return tuple(int(level) for level in text.split(','))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Zombie scan duty cycles against detection latency.")
+    parser.add_argument('--levels', type=_levels, action='append',
+                        help="comma separated scan intervals in ms, 0 = continuous; repeat to compare")
+    parser.add_argument('--visits', type=int, default=40)
+    parser.add_argument('--speed', type=float, default=1.0, help="zombie walking speed in m/s")
+    parser.add_argument('--rssi-threshold', type=int, default=-60)
+    parser.add_argument('--proximity-duration', type=float, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    configs = args.levels or [(0,), (250,), (1000,), (0, 250, 500, 1000), (0, 500, 1500)]
+
+    visits = make_visits(args.seed, args.visits)
+    print(f"{'levels ms':>18} {'duty %':>7} {'detect p50/p90/max s':>21} {'tag p50/p90/max s':>19} "
+          f"{'missed':>6} {'wakeups':>7}")
+    for levels in configs:
+        r = simulate(levels, visits, args.seed, args.speed, args.rssi_threshold, args.proximity_duration)
+
+        def spread(values):
+            if not values:
+                return '-'
+            return '/'.join(f"{v / 1000:.1f}" for v in (percentile(values, 50), percentile(values, 90), max(values)))
+
+        print(f"{','.join(map(str, r['levels'])):>18} {100 * r['duty']:>7.1f} {spread(r['detect_ms']):>21} "
+              f"{spread(r['tag_ms']):>19} {r['missed']:>6} {r['wakeups']:>7}")
+    print(f"{len(visits)} visits, {r['seconds']:.0f} s each run")
+
+
+if __name__ == '__main__':
+    main()
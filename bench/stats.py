@@ -0,0 +1,16 @@
+# Small helpers shared by the benchmarks.
+
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile, p in 0..100. Returns None for an empty list.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))  # ceil without floats
+    return ordered[min(len(ordered), int(rank)) - 1]
+
+
+def fmt_ms(us):
+    return '-' if us is None else f"{us / 1000:.1f}"
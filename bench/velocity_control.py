@@ -0,0 +1,189 @@
+# Distance keeping of the Velocity Controlled Truck, old callback against PID.
+#
+# A simulated car follows a tag that drives off, stops and starts again. The
+# car's speed follows its duty with a first-order lag. The camera sees the
+# tag at 20 Hz, and its messages arrive some ms later, now and then not at
+# all for a second or two (a WiFi dropout). Both controllers get the same
+# tag motion and dropouts on the virtual clock:
+#
+#   direct   what micropico.py did: on each message, duty = -z * 10000 when
+#            z < -3, else 0, and nothing in between messages
+#   pid      velocity_controller.VelocityController at 50 Hz
+#
+# Reports:
+#   error     |distance - 3|, mean and p99: how well the gap is held
+#   closest   smallest distance; below 1 counts as a bump
+#   blind     seconds driven on a measurement older than 300 ms
+#   changes   duty writes per second
+#   late      pid steps' lateness against their deadlines, mean/max ms
+#
+#   python -m bench.velocity_control
+
+import argparse
+import asyncio
+import random
+
+import hostsim
+from bench.stats import percentile
+
+hostsim.install()
+
+from hostsim import clock  # noqa: E402
+from hostsim.virtual_loop import VirtualEventLoop  # noqa: E402
+from machine import PWM, Pin  # noqa: E402
+from velocity_controller import VelocityController  # noqa: E402
+from velocity_wire import SCALE  # noqa: E402
+
+TARGET = 3.0
+PHYSICS_MS = 5
+CAMERA_MS = 50
+STALE_MS = 300
+
+
+def make_world(seed, seconds, dropouts):
+    """
+    Tag speed segments [(start_s, speed)] and dropouts [(start_s, length_s)].
+    """
+    rng = random.Random(seed)
+    segments = []
+    t = 0.0
+    while t < seconds:
+        segments.append((t, rng.choice((0.0, 0.0, rng.uniform(0.3, 1.5)))))
+        t += rng.uniform(2.0, 8.0)
+    gaps = []
+    t = rng.expovariate(1 / dropouts)
+    while t < seconds:
+        gaps.append((t, rng.uniform(0.5, 2.0)))
+        t += rng.expovariate(1 / dropouts)
+    return segments, gaps
+
+
+class Car:
+
+    def __init__(self, vmax, tau):
+        self.vmax = vmax
+        self.tau = tau
+        self.position = -5.0  # tag starts at 0
+        self.speed = 0.0
+        self.forward = PWM(Pin(1, Pin.OUT))
+        self.backward = PWM(Pin(0, Pin.OUT))
+
+    def drive(self, dt):
+        duty = (self.forward.duty_u16() - self.backward.duty_u16()) / 65535
+        self.speed += (duty * self.vmax - self.speed) * dt / self.tau
+        self.position += self.speed * dt
+
+
+def simulate(mode, segments, gaps, seconds, latency_ms, noise, seed):
+    hostsim.reset()
+    clock.use_virtual(0)
+    loop = VirtualEventLoop()
+    rng = random.Random(seed)
+    car = Car(vmax=2.0, tau=0.3)
+    tag = [0.0]
+    errors = []
+    closest = [1e9]
+    blind = [0.0]
+    writes = [0]
+    received = [None]  # ms the newest measurement arrived
+    controller = VelocityController(((car.forward, car.backward),), target=-TARGET * SCALE, stale_ms=STALE_MS)
+    write = controller._write
+
+    def counted_write(duty):
+        if duty != controller.duty:
+            writes[0] += 1
+        return write(duty)
+
+    controller._write = counted_write
+
+    def direct(z):
+        msgnum = 0
+        if z < -3 * SCALE:
+            msgnum = min(-z, 65535)
+        if msgnum != car.forward.duty_u16():
+            writes[0] += 1
+        car.forward.duty_u16(msgnum)
+
+    def deliver(z, ticks):
+        received[0] = clock.now_us() // 1000
+        if mode == 'direct':
+            direct(z)
+        else:
+            controller.measure(z, ticks)
+
+    async def physics():
+        dt = PHYSICS_MS / 1000
+        k = 0
+        while True:
+            now_s = clock.now_us() / 1000000
+            while k + 1 < len(segments) and segments[k + 1][0] <= now_s:
+                k += 1
+            tag[0] += segments[k][1] * dt
+            car.drive(dt)
+            distance = tag[0] - car.position
+            errors.append(abs(distance - TARGET))
+            closest[0] = min(closest[0], distance)
+            driving = car.forward.duty_u16() or car.backward.duty_u16()
+            if driving and (received[0] is None or clock.now_us() // 1000 - received[0] > STALE_MS):
+                blind[0] += dt
+            await asyncio.sleep(dt)
+
+    async def camera():
+        while True:
+            now_s = clock.now_us() / 1000000
+            if not any(start <= now_s < start + length for start, length in gaps):
+                z = -(tag[0] - car.position) + rng.gauss(0, noise)
+                ticks = clock.now_us() // 1000
+                loop.call_later(rng.uniform(0.5, 1.5) * latency_ms / 1000, deliver, int(z * SCALE), ticks)
+            await asyncio.sleep(CAMERA_MS / 1000)
+
+    try:
+        loop.create_task(physics())
+        loop.create_task(camera())
+        if mode == 'pid':
+            loop.create_task(controller.run())
+        loop.run_until_complete(asyncio.sleep(seconds))
+        for task in asyncio.all_tasks(loop):
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*asyncio.all_tasks(loop), return_exceptions=True))
+    finally:
+        loop.close()
+        clock.use_real()
+    steps = max(controller.steps, 1)
+    return {
+        'errors': errors,
+        'closest': closest[0],
+        'blind': blind[0],
+        'changes': writes[0] / seconds,
+        'late': (controller._late_sum / steps, controller.late_max_ms) if mode == 'pid' else None,
+        'overruns': controller.overruns,
+        'stale_stops': controller.stale_stops,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distance keeping, direct duty against the PID controller.")
+    parser.add_argument('--seconds', type=float, default=300.0, help="virtual time per run")
+    parser.add_argument('--latency-ms', type=float, default=40.0, help="mean camera-to-car delay")
+    parser.add_argument('--noise', type=float, default=0.05, help="z measurement noise, standard deviation")
+    parser.add_argument('--dropout-every', type=float, default=20.0, help="mean seconds between dropouts")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    segments, gaps = make_world(args.seed, args.seconds, args.dropout_every)
+    print(f"{len(segments)} tag speed changes, {len(gaps)} dropouts ({sum(g for _, g in gaps):.1f} s) "
+          f"over {args.seconds:.0f} s")
+    print(f"{'mode':<8} {'error mean/p99':>15} {'closest':>8} {'blind s':>8} {'changes/s':>10} "
+          f"{'late mean/max ms':>17} {'stale stops':>11}")
+    for mode in ('direct', 'pid'):
+        r = simulate(mode, segments, gaps, args.seconds, args.latency_ms, args.noise, args.seed)
+        errors = r['errors']
+        error_text = f"{sum(errors) / len(errors):.2f}/{percentile(errors, 99):.2f}"
+        late_text = '-' if r['late'] is None else f"{r['late'][0]:.1f}/{r['late'][1]}"
+        stale_text = '-' if mode == 'direct' else str(r['stale_stops'])
+        print(f"{mode:<8} {error_text:>15} {r['closest']:>8.2f} {r['blind']:>8.1f} {r['changes']:>10.1f} "
+              f"{late_text:>17} {stale_text:>11}")
+
+
+if __name__ == '__main__':
+    main()
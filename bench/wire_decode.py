@@ -0,0 +1,121 @@
+# Host cost of the Velocity Controlled Truck's MQTT callback parsing.
+#
+# Compares the old text path (msg.decode(), then float() twice, the way
+# micropico.py did, which raises on "on") with velocity_wire.Decoder reading
+# the same distance from the binary message in place, plus the ON and
+# foreign-text cases. Reports host ns per message and the most memory one
+# message allocates at once. Then feeds the decoder a stream with dropped
+# and swapped messages and prints what it counted.
+#
+# On the host the binary path is the slower and bigger one per distance
+# (CPython's float() and decode() are C, the decoder is bytecode). These
+# are host numbers only and say nothing about the Pico; the format is for
+# the sequence numbers, capture ticks and ON/OFF types, not parsing speed.
+#
+#   python -m bench.wire_decode
+
+import argparse
+import random
+import time
+import tracemalloc
+
+import hostsim
+
+hostsim.install()
+
+import velocity_wire  # noqa: E402
+
+
+def by_text(msg):
+    msg = msg.decode()
+    if float(msg) < -3:
+        return int(float(msg) * (-1) * 10000)
+    return 0
+
+
+def make_by_wire():
+    decoder = velocity_wire.Decoder()
+
+    def by_wire(msg):
+        decoder.seq = -1  # the same message over and over would be late otherwise
+        if decoder.feed(msg) == velocity_wire.MEASUREMENT:
+            z = decoder.value(0)
+            if z < -3 * velocity_wire.SCALE:
+                return -z
+        return 0
+
+    return by_wire
+
+
+def cost(parse, msg, repeat):
+    start = time.perf_counter_ns()
+    for _ in range(repeat):
+        parse(msg)
+    ns = (time.perf_counter_ns() - start) / repeat
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    parse(msg)
+    allocated = tracemalloc.get_traced_memory()[1] - before  # peak within one call
+    tracemalloc.stop()
+    return ns, allocated
+
+
+def stream(seed, count, loss, swap):
+    """
+    Messages as received: some never arrive, some neighbours swapped.
+    Returns (messages, sent, dropped, swapped).
+    """
+    rng = random.Random(seed)
+    encoder = velocity_wire.Encoder()
+    received = []
+    dropped = 0
+    for k in range(count):
+        msg = encoder.measurement(-4.0 - k % 10 / 10, ticks=k * 50)
+        if rng.random() < loss:
+            dropped += 1
+        else:
+            received.append(msg)
+    swapped = 0
+    for k in range(len(received) - 1):
+        if rng.random() < swap:
+            received[k], received[k + 1] = received[k + 1], received[k]
+            swapped += 1
+    return received, dropped, swapped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time velocity message parsing, text against binary.")
+    parser.add_argument('--repeat', type=int, default=200000)
+    parser.add_argument('--messages', type=int, default=100000, help="for the loss / reorder check")
+    parser.add_argument('--loss', type=float, default=0.02)
+    parser.add_argument('--swap', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    encoder = velocity_wire.Encoder()
+    cases = {
+        'distance': (b'-4.731822', encoder.measurement(-4.731822)),
+        'on': (b'on', encoder.control(True)),
+        'other text': (b'hello', b'hello'),
+    }
+    print(f"{'message':>10} {'text ns':>8} {'bytes':>6} {'binary ns':>10} {'bytes':>6}")
+    for label, (as_text, as_wire) in cases.items():
+        try:
+            text_ns, text_bytes = cost(by_text, as_text, args.repeat)
+            text = f"{text_ns:>8.0f} {text_bytes:>6.0f}"
+        except ValueError:
+            text = f"{'raises':>8} {'':>6}"
+        wire_ns, wire_bytes = cost(make_by_wire(), as_wire, args.repeat)
+        print(f"{label:>10} {text} {wire_ns:>10.0f} {wire_bytes:>6.0f}")
+
+    received, dropped, swapped = stream(args.seed, args.messages, args.loss, args.swap)
+    decoder = velocity_wire.Decoder()
+    for msg in received:
+        decoder.feed(msg)
+    print(f"\n{args.messages} sent, {dropped} dropped, {swapped} pairs swapped")
+    print(f"decoder: {decoder.received} accepted, {decoder.lost} lost, {decoder.late} late")
+
+
+if __name__ == '__main__':
+    main()
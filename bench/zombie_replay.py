@@ -0,0 +1,212 @@
+# Replays BLE advertisement traces through the Zombie human logic.
+#
+# Zombie.run_human runs unmodified on hostsim.virtual_loop, so its 100 ms
+# ticks, ticks_ms() and time.time() all follow a virtual clock and a
+# 10 minute trace replays in well under a second. Every advert in the trace is
+# handed to the scanner's BLE IRQ at its recorded time, as the zombie_advert
+# payload ("!13" becomes zombie 13; any other name is sent as a plain name
+# advertisement, which the scanner rejects on its bytes).
+#
+# Traces are what Zombie(trace='adverts.csv') records on the board:
+#
+#     # ms,name,rssi
+#     1520,!3,-61
+#     ...
+#
+# Without --trace a synthetic one is generated (zombies wandering in and out
+# of range with noisy RSSI and lost packets). Prints the tags and
+# zombification the logic produced, plus the host time each game tick took
+# (draining the advert queue plus check_proximity), so changes to the
+# proximity logic can be compared on the same recordings.
+#
+#   python -m bench.zombie_replay
+#   python -m bench.zombie_replay --trace adverts.csv --repeat 5
+#   python -m bench.zombie_replay --zombies 40 --seconds 600 --save synthetic.csv
+
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import tempfile
+import time
+
+import hostsim
+from bench.stats import percentile
+
+hostsim.install()
+
+from hostsim import clock  # noqa: E402
+from hostsim.virtual_loop import VirtualEventLoop  # noqa: E402
+import tag_journal  # noqa: E402
+import zombie_advert  # noqa: E402
+from bluetooth import name_payload  # noqa: E402
+
+
+def load_trace(path):
+    trace = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            ms, name, rssi = line.split(',')
+            trace.append((int(ms), name, int(rssi)))
+    trace.sort()
+    return trace
+
+
+def save_trace(trace, path):
+    with open(path, 'w') as f:
+        f.write('# ms,name,rssi\n')
+        for ms, name, rssi in trace:
+            f.write(f"{ms},{name},{rssi}\n")
+
+
+def synthetic_trace(seed, zombies=8, seconds=300, interval_ms=100, loss=0.1):
+    """
+    Each zombie alternates between near (around -52 dBm) and far (around
+    -78 dBm) for 2-10 s at a time, advertising every interval_ms with some
+    jitter, noise and lost packets.
+    """
+    rng = random.Random(seed)
+    trace = []
+    for zombie in range(1, zombies + 1):
+        t = rng.uniform(0, interval_ms)
+        near = rng.random() < 0.3
+        phase_end = rng.uniform(2000, 10000)
+        while t < seconds * 1000:
+            if t >= phase_end:
+                near = not near
+                phase_end = t + rng.uniform(2000, 10000)
+            if rng.random() >= loss:
+                rssi = rng.gauss(-52 if near else -78, 5)
+                trace.append((int(t), f"!{zombie}", int(rssi)))
+            t += interval_ms + rng.uniform(0, 10)
+    trace.sort()
+    return trace
+
+
+def adv_data(name):
+    """
+    Raw advertising data for a trace name.
+    """
+    if name.startswith('!') and name[1:].isdigit():
+        return zombie_advert.encode(int(name[1:]), 0)
+    return name_payload(name)
+
+
+def time_ticks(zombie, tick_costs):
+    # Wraps the two halves of a run_human tick on the instance, the code itself is untouched
+    queue = zombie.scanner.queue
+    drain = queue.drain
+    check_proximity = zombie.check_proximity
+    started = [0]
+
+    def timed_drain(handler, limit=0):
+        started[0] = time.perf_counter_ns()
+        return drain(handler, limit)
+
+    async def timed_check_proximity():
+        await check_proximity()
+        if zombie.role == 'human':  # the zombifying tick ran the whole zombie game inside it
+            tick_costs.append((time.perf_counter_ns() - started[0]) // 1000)
+
+    queue.drain = timed_drain
+    zombie.check_proximity = timed_check_proximity
+
+
+def replay(trace, tail_s=5.0, **zombie_args):
+    """
+    Runs one replay. Returns (journal records, host us per game tick, loop
+    wakeups, virtual seconds, host seconds).
+    """
+    hostsim.reset()
+    clock.use_virtual(0)
+    loop = VirtualEventLoop()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='zombie_replay_') as workdir:
+        os.chdir(workdir)  # the journal lands here, not in the repo
+        try:
+            import Zombie_chip
+
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                zombie = Zombie_chip.Zombie(role='human', verbose=False, **zombie_args)
+                scanner = zombie.scanner
+                tick_costs = []
+                time_ticks(zombie, tick_costs)
+                end_s = (trace[-1][0] / 1000 if trace else 0) + tail_s
+                payloads = {}
+                for ms, name, rssi in trace:
+                    data = payloads.get(name)
+                    if data is None:
+                        data = payloads[name] = adv_data(name)
+                    loop.call_at(ms / 1000, scanner.ble.sim_scan_result, data, rssi)
+                task = loop.create_task(zombie.run_human())
+
+                def finish():
+                    zombie.stop()
+                    task.cancel()
+
+                loop.call_at(end_s, finish)
+                host_start = time.perf_counter()
+                try:
+                    loop.run_until_complete(task)
+                except asyncio.CancelledError:
+                    pass
+                host_s = time.perf_counter() - host_start
+                pending = asyncio.all_tasks(loop)  # beeps still going
+                for other in pending:
+                    other.cancel()
+                if pending:
+                    loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            zombie.journal.flush()
+            with open(zombie.journal.path, 'rb') as f:
+                records = list(tag_journal.decode(f.read()))
+        finally:
+            loop.close()
+            clock.use_real()
+            os.chdir(cwd)
+    return records, tick_costs, loop.wakeups, end_s, host_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay BLE advert traces through the Zombie human logic.")
+    parser.add_argument('--trace', help="recorded trace (ms,name,rssi lines); synthetic if omitted")
+    parser.add_argument('--zombies', type=int, default=8, help="zombies in the synthetic trace")
+    parser.add_argument('--seconds', type=int, default=300, help="length of the synthetic trace")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', help="write the trace used to this file")
+    parser.add_argument('--repeat', type=int, default=3, help="replays, for stable timing")
+    parser.add_argument('--max-zombie', type=int, default=13, help="Zombie max_zombie_number")
+    args = parser.parse_args()
+
+    if args.trace:
+        trace = load_trace(args.trace)
+    else:
+        trace = synthetic_trace(args.seed, args.zombies, args.seconds)
+    if args.save:
+        save_trace(trace, args.save)
+
+    costs = []
+    host_s = 0.0
+    for _ in range(args.repeat):
+        records, run_costs, wakeups, virtual_s, run_host_s = replay(
+            trace, max_zombie_number=max(args.max_zombie, args.zombies))
+        costs.extend(run_costs)
+        host_s += run_host_s
+
+    for kind, zombie, count, ms in records:
+        if kind == tag_journal.TAG:
+            print(f"{ms / 1000:9.3f} s  tagged by zombie {zombie} ({count})")
+        elif kind == tag_journal.ZOMBIFIED:
+            print(f"{ms / 1000:9.3f} s  zombified by zombie {zombie}")
+    costs.sort()
+    print(f"{len(trace)} adverts over {virtual_s:.0f} s replayed in {host_s / args.repeat * 1000:.0f} ms "
+          f"({virtual_s * args.repeat / max(host_s, 1e-9):,.0f}x real time), {wakeups} wakeups per run")
+    print(f"host time per game tick ({len(costs) // args.repeat} ticks): p50 {percentile(costs, 50)} us, "
+          f"p99 {percentile(costs, 99)} us, max {costs[-1] if costs else '-'} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+# Runs a whole Zombie game with many devices on one host.
+#
+# Hundreds of unmodified Zombie instances share one virtual-clock event loop
+# (hostsim.virtual_loop) and talk over hostsim.radio: log-distance RSSI,
+# random loss, collisions between advertisers and the 100 ms advertising
+# interval. Players wander around a field sized so the density stays the same
+# as the player count grows. A fraction of them start as zombies and humans
+# turn into zombies after three tags, like the real game.
+#
+# For each player count it reports, per device:
+#   tick     host time of one run_human tick (queue drain + check_proximity)
+#   scan     host time spent in scan callbacks per second
+#   lag      how long a device's event loop is busy per 100 ms tick (its tick
+#            plus the scan callbacks that arrived since the last one), i.e. how
+#            late its next tick runs. All times are host CPU, the board is
+#            slower by a roughly constant factor.
+# and for the game:
+#   tag latency  time from a zombie getting within tag range of a human (the
+#                distance where the mean RSSI is rssi_threshold) and staying
+#                near (not beyond the distance for rssi_threshold -
+#                rssi_hysteresis), to the tag. Ideal is proximity_duration.
+#   false tags   tags without such a zombie near the human at the time
+#
+#   python -m bench.zombie_swarm
+#   python -m bench.zombie_swarm --players 50 100 200 400 --seconds 120
+
+import argparse
+import asyncio
+import contextlib
+import math
+import os
+import random
+import tempfile
+import time
+
+import hostsim
+from bench.stats import percentile
+from bench.zombie_replay import time_ticks
+
+hostsim.install()
+
+from hostsim import clock, recorder  # noqa: E402
+from hostsim.radio import Channel, Node  # noqa: E402
+from hostsim.virtual_loop import VirtualEventLoop  # noqa: E402
+
+STEP_S = 0.1
+AREA_PER_PLAYER = 25.0  # m^2, about a 5 m square each
+
+
+class Player:
+
+    def __init__(self, index, zombie, node, rng, side):
+        self.index = index
+        self.zombie = zombie
+        self.node = node
+        self.target = (rng.uniform(0, side), rng.uniform(0, side))
+        self.tick_costs = []
+        self.scan_ns = 0
+        self.busy_ns = 0  # scan callback time since the last tick
+        self.lags = []
+
+
+def _instrument(player):
+    # Like bench.zombie_replay.time_ticks, plus scan IRQ cost, wrapped on the instances only
+    zombie = player.zombie
+    time_ticks(zombie, player.tick_costs)
+    scanner = zombie.scanner
+    irq = scanner.ble.handler
+
+    def timed_irq(event, data):
+        start = time.perf_counter_ns()
+        irq(event, data)
+        spent = time.perf_counter_ns() - start
+        player.scan_ns += spent
+        player.busy_ns += spent
+
+    scanner.ble.irq(timed_irq)
+    drain = scanner.queue.drain
+
+    def drain_and_close_window(handler, limit=0):
+        player.lags.append(player.busy_ns // 1000)  # the tick cost is added once it is known
+        player.busy_ns = 0
+        return drain(handler, limit)
+
+    scanner.queue.drain = drain_and_close_window
+
+
+def simulate(players, seconds, zombie_fraction, seed, speed, rssi_threshold, rssi_hysteresis,
+             proximity_duration):
+    hostsim.reset()
+    rng = random.Random(seed)
+    clock.use_virtual(0)
+    loop = VirtualEventLoop()
+    channel = Channel(rng)
+    side = math.sqrt(players * AREA_PER_PLAYER)
+    tag_range = channel.distance_for(rssi_threshold)
+    leave_range = channel.distance_for(rssi_threshold - rssi_hysteresis)
+    zombies = max(1, int(players * zombie_fraction))
+    tags = []  # (us, latency in ms or None for a false tag)
+    everyone = []
+    close_since = {}  # (zombie player index, human player index) -> us they got within tag range
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='zombie_swarm_') as workdir:
+        os.chdir(workdir)  # tag journals land here
+        try:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                import Zombie_chip
+
+                for i in range(players):
+                    role = 'zombie' if i < zombies else 'human'
+                    zombie = Zombie_chip.Zombie(role=role, zombie_number=i + 1 if role == 'zombie' else None,
+                                                max_zombie_number=players, rssi_threshold=rssi_threshold,
+                                                rssi_hysteresis=rssi_hysteresis,
+                                                proximity_duration=proximity_duration, verbose=False,
+                                                journal=f'tag_journal_{i}.bin')
+                    node = channel.add(Node(rng.uniform(0, side), rng.uniform(0, side)))
+                    player = Player(i, zombie, node, rng, side)
+                    if role == 'human':
+                        _instrument(player)
+                        handle_tagging = zombie.handle_tagging
+
+                        async def record_tag(zombie_number, player=player, handle_tagging=handle_tagging):
+                            now = clock.now_us()
+                            starts = [since for (z, h), since in close_since.items()
+                                      if h == player.index and everyone[z].zombie.zombie_number == zombie_number]
+                            tags.append((now, (now - min(starts)) / 1000 if starts else None))
+                            await handle_tagging(zombie_number)
+
+                        zombie.handle_tagging = record_tag
+                    everyone.append(player)
+
+                def refresh(player):
+                    zombie = player.zombie
+                    if zombie.role == 'zombie':
+                        player.node.advertiser = zombie.advertiser.ble
+                        player.node.scanner = None
+                    else:
+                        player.node.scanner = zombie.scanner.ble
+
+                async def world():
+                    # Random waypoints at walking speed, and who is within tag range of whom
+                    while True:
+                        now = clock.now_us()
+                        for player in everyone:
+                            refresh(player)
+                            node = player.node
+                            dx = player.target[0] - node.x
+                            dy = player.target[1] - node.y
+                            distance = math.hypot(dx, dy)
+                            step = speed * STEP_S
+                            if distance <= step:
+                                player.target = (rng.uniform(0, side), rng.uniform(0, side))
+                            else:
+                                node.x += dx / distance * step
+                                node.y += dy / distance * step
+                        for z in everyone:
+                            if z.zombie.role != 'zombie':
+                                continue
+                            for h in everyone:
+                                if h.zombie.role != 'human':
+                                    continue
+                                key = (z.index, h.index)
+                                distance = math.hypot(z.node.x - h.node.x, z.node.y - h.node.y)
+                                if distance <= tag_range:
+                                    close_since.setdefault(key, now)
+                                elif distance > leave_range:
+                                    close_since.pop(key, None)
+                        await asyncio.sleep(STEP_S)
+
+                tasks = [loop.create_task(world())]
+                for player in everyone:
+                    refresh(player)
+                    tasks.append(loop.create_task(player.zombie.run()))
+                    tasks.append(loop.create_task(channel.run_node(player.node)))
+
+                async def clear_recorder():
+                    while True:
+                        await asyncio.sleep(1)
+                        recorder.clear()  # warning LEDs of hundreds of devices add up
+
+                tasks.append(loop.create_task(clear_recorder()))
+                host_start = time.perf_counter()
+                loop.run_until_complete(asyncio.sleep(seconds))
+                host_s = time.perf_counter() - host_start
+                # Zombie_chip swallows CancelledError, so a human that was tagged
+                # would go back to its game loop: end the game first
+                for player in everyone:
+                    player.zombie.stop()
+                for task in asyncio.all_tasks(loop):
+                    task.cancel()
+                loop.run_until_complete(asyncio.gather(*asyncio.all_tasks(loop), return_exceptions=True))
+        finally:
+            loop.close()
+            clock.use_real()
+            os.chdir(cwd)
+
+    latencies = [latency for _, latency in tags if latency is not None]
+    ticks = []
+    lags = []
+    scan = []
+    for player in everyone:
+        ticks.extend(player.tick_costs)
+        # lags[k] is the scan time before tick k; add tick k's own cost
+        lags.extend(busy + cost for busy, cost in zip(player.lags, player.tick_costs))
+        if player.tick_costs:
+            scan.append(player.scan_ns / 1000 / seconds)
+    return {
+        'players': players,
+        'host_s': host_s,
+        'tick': ticks,
+        'lag': lags,
+        'scan': scan,
+        'tags': len(tags),
+        'false_tags': len(tags) - len(latencies),
+        'latency_ms': latencies,
+        'zombies_at_end': sum(1 for p in everyone if p.zombie.role == 'zombie'),
+        'channel': channel,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a Zombie game with many devices on one host.")
+    parser.add_argument('--players', type=int, nargs='+', default=[25, 50, 100, 200])
+    parser.add_argument('--seconds', type=float, default=60.0, help="game length (virtual time)")
+    parser.add_argument('--zombie-fraction', type=float, default=0.2, help="players that start as zombies")
+    parser.add_argument('--speed', type=float, default=1.0, help="walking speed in m/s")
+    parser.add_argument('--rssi-threshold', type=int, default=-60)
+    parser.add_argument('--rssi-hysteresis', type=int, default=6)
+    parser.add_argument('--proximity-duration', type=float, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'players':>7} {'host s':>7} {'tick p50/p99 us':>16} {'lag p99/max us':>15} {'scan us/s':>10} "
+          f"{'tags':>5} {'false':>5} {'latency p50/p90 s':>18} {'zombies':>8} {'lost/coll %':>12}")
+    for players in args.players:
+        r = simulate(players, args.seconds, args.zombie_fraction, args.seed, args.speed,
+                     args.rssi_threshold, args.rssi_hysteresis, args.proximity_duration)
+        channel = r['channel']
+        attempts = max(channel.delivered + channel.lost + channel.collided, 1)
+        latency = r['latency_ms']
+        latency_text = (f"{percentile(latency, 50) / 1000:.1f}/{percentile(latency, 90) / 1000:.1f}"
+                        if latency else '-')
+        print(f"{players:>7} {r['host_s']:>7.1f} "
+              f"{str(percentile(r['tick'], 50)) + '/' + str(percentile(r['tick'], 99)):>16} "
+              f"{str(percentile(r['lag'], 99)) + '/' + str(max(r['lag'], default=0)):>15} "
+              f"{percentile(r['scan'], 50) or 0:>10.0f} {r['tags']:>5} {r['false_tags']:>5} {latency_text:>18} "
+              f"{r['zombies_at_end']:>8} "
+              f"{100 * channel.lost / attempts:>5.1f}/{100 * channel.collided / attempts:<5.1f}")
+
+
+if __name__ == '__main__':
+    main()
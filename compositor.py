@@ -0,0 +1,190 @@
+# Frame-based NeoPixel compositor.
+#
+# Instead of every task writing led[0] and calling led.write() on its own
+# schedule, effects are put on named layers and one task renders them:
+#
+#     comp = Compositor(led, layers=('base', 'dim', 'flash'))
+#     comp.set('base', Solid((255, 0, 0)))
+#     asyncio.create_task(comp.run())
+#     comp.set('dim', Fade((0, 0, 0), 0, 255, 1000))   # fade to black over 1 s
+#     await comp.wait('dim')
+#
+# Layers are drawn bottom to top in the order given, each blended over the
+# ones below by its opacity (0-255). While any effect is animating the task
+# renders at a fixed frame rate; once everything is static it sleeps until
+# the next set()/remove(). write() is only called when the rendered colour
+# differs from what is already on the strip.
+#
+# Every pixel of the strip shows the same colour, which is all the projects
+# here need (they drive a single pixel).
+
+import time
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+
+class Solid:
+    """
+    A constant colour.
+    """
+    animated = False
+
+    def __init__(self, color, alpha=255):
+        self.color = color
+        self.alpha = alpha
+
+    def render(self, elapsed_ms):
+        return self.alpha
+
+
+class Fade:
+    """
+    A colour whose opacity ramps from start_alpha to end_alpha. Fading a black
+    layer from 0 to 255 dims whatever is below it, fading it back to 0
+    brings it back.
+    """
+    animated = True
+
+    def __init__(self, color, start_alpha, end_alpha, duration_ms, hold=True):
+        """
+        :param color: (r, g, b) of the layer
+        :param start_alpha: Opacity at the start
+        :param end_alpha: Opacity at the end
+        :param duration_ms: Length of the ramp
+        :param hold: Keep showing end_alpha afterwards instead of finishing
+        """
+        self.color = color
+        self.start_alpha = start_alpha
+        self.end_alpha = end_alpha
+        self.duration_ms = max(1, duration_ms)
+        self.hold = hold
+
+    def render(self, elapsed_ms):
+        if elapsed_ms >= self.duration_ms:
+            if not self.hold:
+                return -1
+            self.animated = False  # nothing left to animate
+            return self.end_alpha
+        return self.start_alpha + (self.end_alpha - self.start_alpha) * elapsed_ms // self.duration_ms
+
+
+class Flash:
+    """
+    A colour shown for on_ms, then gone.
+    """
+    animated = True
+
+    def __init__(self, color, on_ms):
+        self.color = color
+        self.on_ms = on_ms
+
+    def render(self, elapsed_ms):
+        return 255 if elapsed_ms < self.on_ms else -1
+
+
+class Compositor:
+
+    def __init__(self, np, layers=('base',), fps=50):
+        """
+        :param np: neopixel.NeoPixel to drive
+        :param layers: Layer names, bottom first
+        :param fps: Frame rate while something is animating
+        """
+        self.np = np
+        self.frame_ms = 1000 // fps
+        self._index = {name: i for i, name in enumerate(layers)}
+        self._effects = [None] * len(layers)
+        self._started = [0] * len(layers)
+        self._shown = bytearray(3)
+        self._frame = bytearray(3)
+        self._written = False
+        self._changed = asyncio.Event()
+        self._finished = asyncio.Event()
+        self.frames = 0
+        self.writes = 0
+
+    def set(self, layer, effect):
+        """
+        Puts an effect on a layer, replacing what was there. It starts now.
+        """
+        i = self._index[layer]
+        self._effects[i] = effect
+        self._started[i] = time.ticks_ms()
+        self._changed.set()
+
+    def remove(self, layer):
+        i = self._index[layer]
+        if self._effects[i] is not None:
+            self._effects[i] = None
+            self._changed.set()
+            self._finished.set()
+
+    def active(self, layer):
+        return self._effects[self._index[layer]] is not None
+
+    async def wait(self, layer):
+        """
+        Waits until the effect on a layer is done: finished, removed, or (for
+        a Fade that holds) at its end opacity.
+        """
+        i = self._index[layer]
+        while self._effects[i] is not None and self._effects[i].animated:
+            self._finished.clear()
+            await self._finished.wait()
+
+    def render(self):
+        """
+        Blends all layers into one colour and writes it if it changed.
+        Returns True while something is still animating.
+        """
+        now = time.ticks_ms()
+        frame = self._frame
+        frame[0] = frame[1] = frame[2] = 0
+        animating = False
+        finished = False
+        effects = self._effects
+        for i in range(len(effects)):
+            effect = effects[i]
+            if effect is None:
+                continue
+            was_animated = effect.animated
+            alpha = effect.render(time.ticks_diff(now, self._started[i]))
+            if alpha < 0:
+                effects[i] = None
+                finished = True
+                continue
+            if effect.animated:
+                animating = True
+            elif was_animated:
+                finished = True
+            color = effect.color
+            for c in range(3):
+                frame[c] = (color[c] * alpha + frame[c] * (255 - alpha)) // 255
+        self.frames += 1
+        if not self._written or frame != self._shown:
+            self._shown[:] = frame
+            self._written = True
+            self.np.fill((frame[0], frame[1], frame[2]))
+            self.np.write()
+            self.writes += 1
+        if finished:
+            self._finished.set()
+        return animating
+
+    async def run(self):
+        deadline = time.ticks_ms()
+        while True:
+            self._changed.clear()
+            if self.render():
+                deadline = time.ticks_add(deadline, self.frame_ms)
+                delay = time.ticks_diff(deadline, time.ticks_ms())
+                if delay < 0:
+                    deadline = time.ticks_ms()  # fell behind, don't try to catch up
+                    delay = 0
+                await asyncio.sleep_ms(delay)
+            else:
+                await self._changed.wait()
+                deadline = time.ticks_ms()
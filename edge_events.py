@@ -0,0 +1,108 @@
+# Button edges from a pin IRQ to an asyncio task.
+#
+# The interrupt handler only stores (ticks_ms, level) into preallocated
+# arrays and sets a ThreadSafeFlag. It never allocates, so it can run as a
+# hard IRQ. One consumer task drains the ring, debounces, and hands out
+# PRESS/RELEASE events:
+#
+#     button = EdgeButton(Pin('GPIO20', Pin.IN, Pin.PULL_UP))
+#     async for kind, ticks in button:
+#         if kind == PRESS:
+#             ...
+#
+# The ring is single-producer (IRQ) / single-consumer (task). The IRQ only
+# writes _head and the task only writes _tail, so no locking is needed.
+
+import time
+from array import array
+
+from machine import Pin
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+RELEASE = 0
+PRESS = 1
+
+
+class EdgeButton:
+
+    def __init__(self, pin, debounce_ms=30, size=16, active_low=True, hard=True):
+        """
+        :param pin: Input Pin, usually with PULL_UP
+        :param debounce_ms: Edges closer than this to the last accepted one are bounces
+        :param size: Ring size, rounded up to a power of two
+        :param active_low: True when pressing pulls the pin to 0
+        :param hard: Register a hard IRQ (the handler is allocation-free)
+        """
+        n = 1
+        while n < size:
+            n <<= 1
+        self.pin = pin
+        self.debounce_ms = debounce_ms
+        self._pressed_level = 0 if active_low else 1
+        self._mask = n - 1
+        self._times = array('i', bytes(4 * n))
+        self._levels = bytearray(n)
+        self._head = 0
+        self._tail = 0
+        self._flag = asyncio.ThreadSafeFlag()
+        self._level = pin.value()
+        self._last = time.ticks_add(time.ticks_ms(), -debounce_ms)
+        self._unsettled = False
+        self.overflows = 0
+        self.bounces = 0
+        self._handler = self._irq  # bind once, binding allocates
+        pin.irq(handler=self._handler, trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, hard=hard)
+
+    def _irq(self, pin):
+        head = self._head
+        nxt = (head + 1) & self._mask
+        if nxt == self._tail:
+            self.overflows += 1
+            return
+        self._times[head] = time.ticks_ms()
+        self._levels[head] = pin.value()
+        self._head = nxt
+        self._flag.set()
+
+    def close(self):
+        self.pin.irq(handler=None)
+
+    def _accept(self, level, ticks):
+        self._level = level
+        self._last = ticks
+        return (PRESS if level == self._pressed_level else RELEASE, ticks)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            if self._tail == self._head:
+                if not self._unsettled:
+                    await self._flag.wait()
+                    continue
+                # Edges were dropped as bounces. Once the debounce window is
+                # over, look at the pin itself in case it settled elsewhere.
+                self._unsettled = False
+                wait = time.ticks_diff(time.ticks_add(self._last, self.debounce_ms), time.ticks_ms())
+                if wait > 0:
+                    await asyncio.sleep_ms(wait)
+                if self._tail == self._head and self.pin.value() != self._level:
+                    return self._accept(self.pin.value(), time.ticks_ms())
+                continue
+
+            i = self._tail
+            ticks = self._times[i]
+            level = self._levels[i]
+            self._tail = (i + 1) & self._mask
+            if level == self._level:
+                continue
+            if time.ticks_diff(ticks, self._last) < self.debounce_ms:
+                self.bounces += 1
+                self._unsettled = True
+                continue
+            return self._accept(level, ticks)
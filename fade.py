@@ -0,0 +1,142 @@
+# Breathing-LED fade engine.
+#
+# The old breathe loops stepped duty_u16 linearly by 500 and slept between
+# steps, waking the event loop hundreds of times per breath. Because the eye
+# is roughly logarithmic, a linear ramp looks like it jumps to full brightness
+# and then sits there.
+#
+# Breather precomputes one full up-and-down cycle of gamma-corrected duty
+# values into an array once. A machine.Timer callback then just writes the
+# next entry, so the event loop is not involved at all. If no hardware timer
+# is free, run() plays the same table from asyncio against ticks_ms deadlines.
+#
+#     breather = Breather(blueLED, period_ms=2000)
+#     breather.start()
+#     ...
+#     breather.stop()
+
+import time
+from array import array
+
+from machine import Timer
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+
+def build_table(steps, depth=65535, gamma=2.2, floor=0):
+    """
+    Duty values for one breath: steps entries going up, then back down.
+
+    :param steps: Number of entries in the whole cycle
+    :param depth: Peak duty (0-65535)
+    :param gamma: Perceptual correction, 1.0 is a plain linear ramp
+    :param floor: Lowest duty, so the LED never switches fully off
+    """
+    half = max(2, steps // 2)
+    table = array('H', bytes(2 * 2 * half))
+    span = depth - floor
+    for i in range(half):
+        duty = floor + int(span * (i / (half - 1)) ** gamma + 0.5)
+        table[i] = duty
+        table[2 * half - 1 - i] = duty
+    return table
+
+
+class Breather:
+
+    def __init__(self, pwm, period_ms=2000, depth=65535, tick_ms=20, gamma=2.2, floor=0, timer_id=-1):
+        """
+        :param pwm: machine.PWM driving the LED
+        :param period_ms: Length of one full breath (up and down)
+        :param depth: Peak duty (0-65535)
+        :param tick_ms: Time between duty updates. 20 ms matches the 50 Hz PWM
+                        the nightlights use; updating faster is invisible.
+        :param gamma: Perceptual correction exponent
+        :param floor: Lowest duty of the breath
+        :param timer_id: machine.Timer id, -1 for a virtual timer
+        """
+        self.pwm = pwm
+        self.tick_ms = tick_ms
+        self.gamma = gamma
+        self.floor = floor
+        self.timer_id = timer_id
+        self.period_ms = period_ms
+        self.depth = depth
+        self.table = build_table(max(2, period_ms // tick_ms), depth, gamma, floor)
+        self._index = 0
+        self._timer = None
+        self._task = None
+
+    def configure(self, period_ms=None, depth=None):
+        """
+        Changes period and/or depth. Rebuilds the table, keeping the current
+        position in the cycle, so a running breath carries on smoothly.
+        """
+        if period_ms is not None:
+            self.period_ms = period_ms
+        if depth is not None:
+            self.depth = depth
+        position = self._index / len(self.table)
+        table = build_table(max(2, self.period_ms // self.tick_ms), self.depth, self.gamma, self.floor)
+        self._index = int(position * len(table))
+        self.table = table
+
+    def _step(self, _timer=None):
+        # Runs in IRQ context when driven by the timer: no allocation here.
+        # Read the table once, configure() may swap it between two ticks.
+        table = self.table
+        i = self._index + 1
+        if i >= len(table):
+            i = 0
+        self._index = i
+        self.pwm.duty_u16(table[i])
+
+    @property
+    def running(self):
+        return self._timer is not None or self._task is not None
+
+    def start(self, use_timer=True):
+        """
+        Starts breathing. Does nothing if already running.
+
+        :param use_timer: Drive the fade from a hardware timer (no event loop
+                          wakeups). Pass False to use the asyncio scheduler.
+        """
+        if self.running:
+            return
+        if use_timer:
+            self._timer = Timer(self.timer_id)
+            self._timer.init(mode=Timer.PERIODIC, period=self.tick_ms, callback=self._step)
+        else:
+            self._task = asyncio.create_task(self.run())
+
+    def stop(self, duty=0):
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._index = 0
+        self.pwm.duty_u16(duty)
+
+    async def run(self, cycles=None):
+        """
+        Plays the table from asyncio, one wakeup per tick. Sleeps until
+        absolute deadlines, so a late wakeup does not stretch the breath.
+
+        :param cycles: Number of breaths, None for forever
+        """
+        n = len(self.table) * cycles if cycles is not None else -1
+        deadline = time.ticks_ms()
+        while n != 0:
+            self._step()
+            n -= 1
+            deadline = time.ticks_add(deadline, self.tick_ms)
+            delay = time.ticks_diff(deadline, time.ticks_ms())
+            if delay < -self.period_ms:
+                deadline = time.ticks_ms()  # fell a whole breath behind, resync
+            await asyncio.sleep_ms(max(0, delay))
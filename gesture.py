@@ -0,0 +1,162 @@
+# Tap / double tap / shake detection over blocks of accelerometer samples.
+#
+# Works on the interleaved x, y, z blocks that msa311_stream.MSA311 hands
+# out. Per sample it runs a one-pole high-pass filter per axis (drops gravity
+# and slow tilting), takes the squared magnitude of the filtered vector and
+# looks for peaks above a threshold, with a refractory window after each
+# peak. A peak is "sharp" if the magnitude falls back below a third of the
+# threshold within sharp_ms; taps are sharp, shaking is not. Peaks are then
+# classified:
+#
+#   TAP         one sharp peak, nothing else within double_ms
+#   DOUBLE_TAP  two sharp peaks within double_ms, then quiet for settle_ms
+#   SHAKE       shake_peaks peaks of any kind within shake_ms
+#
+# All state is plain ints and events go into a preallocated array, so
+# process() does not allocate per sample. Everything stays in small-int range
+# on MicroPython.
+#
+#     detector = TapDetector(rate_hz=500)
+#     async for block in accelerometer:
+#         for k in range(detector.process(block)):
+#             kind, sample = detector.event(k)
+
+from array import array
+
+TAP = 1
+DOUBLE_TAP = 2
+SHAKE = 3
+
+NAMES = {TAP: 'tap', DOUBLE_TAP: 'double tap', SHAKE: 'shake'}
+
+
+class TapDetector:
+
+    def __init__(self, rate_hz=500, threshold=6000, refractory_ms=60, double_ms=300,
+                 sharp_ms=40, settle_ms=100, shake_ms=800, shake_peaks=4, alpha=240, max_events=16):
+        """
+        :param rate_hz: Sample rate of the blocks
+        :param threshold: High-passed magnitude (raw units) that counts as a peak
+        :param refractory_ms: Dead time after a peak, so one tap's ringing is one peak
+        :param double_ms: Longest gap between the two taps of a double tap
+        :param sharp_ms: How quickly a tap has to die down again
+        :param settle_ms: Quiet time after a double tap before it is reported,
+                          so the start of a shake is not taken for one
+        :param shake_ms: Window in which shake_peaks peaks make a shake
+        :param shake_peaks: Peaks needed for a shake
+        :param alpha: High-pass coefficient out of 256 (240 ~ 5 Hz corner at 500 Hz)
+        :param max_events: Size of the event buffer per process() call
+        """
+        self.rate_hz = rate_hz
+        self.alpha = alpha
+        # Work on values >> 4 so the squared magnitude stays a small int
+        self.threshold_sq = (threshold >> 4) * (threshold >> 4)
+        self.quiet_sq = self.threshold_sq // 9
+        self.sharp = sharp_ms * rate_hz // 1000
+        self.settle = settle_ms * rate_hz // 1000
+        self.refractory = refractory_ms * rate_hz // 1000
+        self.double_window = double_ms * rate_hz // 1000
+        self.shake_window = shake_ms * rate_hz // 1000
+        self.shake_peaks = shake_peaks
+        self.events = array('i', bytes(4 * 2 * max_events))
+        self.max_events = max_events
+        self.dropped_events = 0
+        self.reset()
+
+    def reset(self):
+        self.n = 0  # samples seen
+        self._px = self._py = self._pz = None
+        self._hx = self._hy = self._hz = 0
+        self._quiet_until = 0
+        self._pending = -1  # sample index of an unconfirmed single tap
+        self._peak_at = -1  # sample index of a peak not yet known to be sharp
+        self._double = -1  # sample index of a double tap waiting to settle
+        self._burst_start = 0
+        self._burst_peaks = 0
+        self._count = 0
+
+    def _emit(self, kind, sample):
+        if self._count >= self.max_events:
+            self.dropped_events += 1
+            return
+        self.events[2 * self._count] = kind
+        self.events[2 * self._count + 1] = sample
+        self._count += 1
+
+    def event(self, k):
+        """
+        (kind, sample index) of the k-th event from the last process() call.
+        """
+        return self.events[2 * k], self.events[2 * k + 1]
+
+    def _peak(self, n):
+        # Shake: enough peaks close together, regardless of what they looked like
+        if n - self._burst_start > self.shake_window:
+            self._burst_start = n
+            self._burst_peaks = 0
+        self._burst_peaks += 1
+        self._double = -1  # more peaks: that was no double tap
+        if self._burst_peaks >= self.shake_peaks:
+            self._emit(SHAKE, n)
+            self._pending = -1
+            self._peak_at = -1
+            self._burst_peaks = 0
+            self._burst_start = n
+            self._quiet_until = n + self.shake_window  # one shake, not several
+            return
+        self._peak_at = n
+
+    def _sharp_peak(self, n):
+        if self._pending >= 0 and n - self._pending <= self.double_window:
+            self._double = n
+            self._pending = -1
+        else:
+            self._pending = n
+
+    def process(self, block):
+        """
+        Runs the detector over one block of interleaved x, y, z samples.
+
+        :return: Number of events written to self.events (read them with event())
+        """
+        self._count = 0
+        alpha = self.alpha
+        threshold_sq = self.threshold_sq
+        hx, hy, hz = self._hx, self._hy, self._hz
+        px, py, pz = self._px, self._py, self._pz
+        if px is None:
+            px, py, pz = block[0], block[1], block[2]
+        n = self.n
+        for i in range(0, len(block) - 2, 3):
+            x = block[i]
+            y = block[i + 1]
+            z = block[i + 2]
+            hx = (alpha * (hx + x - px)) >> 8
+            hy = (alpha * (hy + y - py)) >> 8
+            hz = (alpha * (hz + z - pz)) >> 8
+            px, py, pz = x, y, z
+            if self._pending >= 0 and n - self._pending > self.double_window:
+                self._emit(TAP, self._pending)
+                self._pending = -1
+            if self._double >= 0 and n - self._double > self.settle:
+                self._emit(DOUBLE_TAP, self._double)
+                self._double = -1
+            ax = hx >> 4
+            ay = hy >> 4
+            az = hz >> 4
+            m = ax * ax + ay * ay + az * az
+            if self._peak_at >= 0:
+                if m < self.quiet_sq:
+                    self._sharp_peak(self._peak_at)
+                    self._peak_at = -1
+                elif n - self._peak_at > self.sharp:
+                    self._peak_at = -1  # still moving: only counts towards a shake
+            if n >= self._quiet_until and m >= threshold_sq:
+                self._peak(n)
+                if self._quiet_until <= n:
+                    self._quiet_until = n + self.refractory
+            n += 1
+        self.n = n
+        self._hx, self._hy, self._hz = hx, hy, hz
+        self._px, self._py, self._pz = px, py, pz
+        return self._count
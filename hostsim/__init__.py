@@ -0,0 +1,54 @@
+"""
+Host-side simulator for the MicroPython scripts in this repo.
+
+hostsim/modules holds stand-ins for machine, neopixel, network, mqtt,
+uasyncio, uselect, MSA311, Tufts_ble, bluetooth and the OpenMV sensor module.
+Every hardware call goes into hostsim.recorder with a timestamp, so loop
+rates, latencies and CPU cost can be measured on a PC.
+
+Run a script for a few seconds and print what it did:
+
+    python -m hostsim SA_Nightlight_Part_1.py --seconds 5
+"""
+
+import os
+import sys
+
+from hostsim import compat
+
+MODULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modules')
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def install():
+    """
+    Makes the simulated modules importable and patches time/asyncio.
+    Safe to call more than once.
+    """
+    if MODULES_DIR not in sys.path:
+        sys.path.insert(0, MODULES_DIR)
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(1, REPO_ROOT)
+    compat.install()
+
+
+def reset():
+    """
+    Clears the recorder, broker, pins and devices so runs don't leak into each other.
+    """
+    install()
+    import bluetooth
+    import machine
+    import mqtt
+    import sensor
+    import Tufts_ble
+    from hostsim import broker, devices, recorder
+
+    recorder.clear()
+    broker.default.reset()
+    devices.reset()
+    machine.sim_reset()
+    mqtt.sim_reset()
+    sensor.reset()
+    Tufts_ble.sim_reset()
+    bluetooth.sim_reset()
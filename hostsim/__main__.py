@@ -0,0 +1,20 @@
+# python -m hostsim SCRIPT [SCRIPT ...] [--seconds N] [--verbose]
+
+import argparse
+
+from hostsim.runner import run_script
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run board scripts against the simulated hardware.")
+    parser.add_argument('scripts', nargs='+')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--verbose', action='store_true', help="show the scripts' own print output")
+    args = parser.parse_args()
+    for script in args.scripts:
+        report = run_script(script, args.seconds, quiet=not args.verbose)
+        print(report.format())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+# In-process stand-in for broker.hivemq.com.
+#
+# Every simulated MQTTClient in the process talks to the same Broker, so a
+# camera script and a car script can exchange messages without a network.
+#
+# serve() adds a TCP front-end so clients that speak real MQTT over a socket
+# (async_mqtt.MQTTClient) end up on the same broker.
+
+from hostsim import recorder
+
+PUBLIC_HOST = 'broker.hivemq.com'
+
+
+def topic_matches(topic_filter, topic):
+    """
+    MQTT topic matching with the '+' and '#' wildcards.
+
+    :param topic_filter: Subscription filter, e.g. b'ME35-24/+'
+    :param topic: Topic of the published message
+    """
+    filter_levels = topic_filter.split(b'/')
+    topic_levels = topic.split(b'/')
+    for i, level in enumerate(filter_levels):
+        if level == b'#':
+            return True
+        if i >= len(topic_levels):
+            return False
+        if level != b'+' and level != topic_levels[i]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+def to_bytes(value):
+    if isinstance(value, str):
+        return value.encode()
+    return bytes(value)
+
+
+class Broker:
+
+    def __init__(self):
+        self.subscriptions = []  # (topic_filter, client) pairs
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, client, topic_filter):
+        topic_filter = to_bytes(topic_filter)
+        if (topic_filter, client) not in self.subscriptions:
+            self.subscriptions.append((topic_filter, client))
+
+    def unsubscribe(self, client, topic_filter=None):
+        self.subscriptions = [(f, c) for f, c in self.subscriptions
+                              if c is not client or (topic_filter is not None and f != to_bytes(topic_filter))]
+
+    def publish(self, topic, msg):
+        """
+        Routes a message to every matching subscriber. Anyone can call this to
+        inject a message, e.g. a benchmark sending 'start' to the nightlight.
+        """
+        topic, msg = to_bytes(topic), to_bytes(msg)
+        self.published += 1
+        for topic_filter, client in self.subscriptions:
+            if topic_matches(topic_filter, topic):
+                client.deliver(topic, msg)
+                self.delivered += 1
+
+    def reset(self):
+        self.subscriptions = []
+        self.published = 0
+        self.delivered = 0
+
+
+default = Broker()
+
+
+class _Session:
+    """
+    One TCP client of the local MQTT front-end. Understands just enough of
+    MQTT 3.1.1 for async_mqtt.MQTTClient: CONNECT, SUBSCRIBE, PUBLISH (QoS 0),
+    PINGREQ and DISCONNECT.
+    """
+
+    def __init__(self, broker, reader, writer):
+        self.broker = broker
+        self.reader = reader
+        self.writer = writer
+        self.source = 'MQTT(tcp)'
+
+    def _send(self, first_byte, body):
+        n = len(body)
+        length = bytearray()
+        while True:
+            byte = n & 0x7F
+            n >>= 7
+            length.append(byte | (0x80 if n else 0))
+            if not n:
+                break
+        self.writer.write(bytes([first_byte]) + bytes(length) + body)
+
+    def deliver(self, topic, msg):
+        recorder.record(self.source, 'receive', (topic, msg))
+        self._send(0x30, len(topic).to_bytes(2, 'big') + topic + msg)
+
+    async def _read_packet(self):
+        first = (await self.reader.readexactly(1))[0]
+        n = shift = 0
+        while True:
+            byte = (await self.reader.readexactly(1))[0]
+            n |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                break
+            shift += 7
+        return first, await self.reader.readexactly(n)
+
+    async def serve(self):
+        try:
+            while True:
+                first, body = await self._read_packet()
+                kind = first & 0xF0
+                if kind == 0x10:  # CONNECT
+                    n = int.from_bytes(body[10:12], 'big')
+                    self.source = f"MQTT({body[12:12 + n].decode()})"
+                    recorder.record(self.source, 'connect')
+                    self._send(0x20, b'\x00\x00')
+                elif kind == 0x80:  # SUBSCRIBE
+                    pid, i = body[:2], 2
+                    while i < len(body):
+                        n = int.from_bytes(body[i:i + 2], 'big')
+                        self.broker.subscribe(self, body[i + 2:i + 2 + n])
+                        recorder.record(self.source, 'subscribe', body[i + 2:i + 2 + n])
+                        i += n + 3
+                    self._send(0x90, pid + b'\x00')
+                elif kind == 0x30:  # PUBLISH
+                    n = int.from_bytes(body[:2], 'big')
+                    start = 2 + n + (2 if first & 0x06 else 0)
+                    recorder.record(self.source, 'publish', (body[2:2 + n], body[start:]))
+                    self.broker.publish(body[2:2 + n], body[start:])
+                elif kind == 0xC0:  # PINGREQ
+                    self._send(0xD0, b'')
+                elif kind == 0xE0:  # DISCONNECT
+                    break
+                await self.writer.drain()
+        except (EOFError, ConnectionError):
+            pass
+        finally:
+            self.broker.unsubscribe(self)
+            self.writer.close()
+
+
+async def serve(broker=None, host='127.0.0.1', port=0):
+    """
+    Starts a TCP front-end for broker (default: the shared one) so real MQTT
+    clients can connect to it. Returns the asyncio server; the chosen port is
+    server.sockets[0].getsockname()[1].
+    """
+    import asyncio
+
+    broker = broker or default
+
+    async def on_client(reader, writer):
+        try:
+            await _Session(broker, reader, writer).serve()
+        except asyncio.CancelledError:
+            pass  # runner shutting down
+
+    return await asyncio.start_server(on_client, host, port)
@@ -0,0 +1,83 @@
+# Clock shared by every simulated module.
+#
+# MicroPython's ticks_ms/ticks_us wrap around (at 2**30 on the RP2040 port), so
+# the host versions wrap at the same point. That way code which forgets to use
+# ticks_diff breaks on the host too.
+#
+# The clock runs in real time by default. Replay tools can switch it to a
+# virtual clock that only moves when advance() is called.
+
+import time
+
+TICKS_PERIOD = 1 << 30
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALFPERIOD = TICKS_PERIOD // 2
+
+_origin_ns = time.perf_counter_ns()
+_virtual_us = None
+
+
+def now_us():
+    """
+    Non-wrapping microseconds since the simulator started (or virtual time).
+    """
+    if _virtual_us is not None:
+        return _virtual_us
+    return (time.perf_counter_ns() - _origin_ns) // 1000
+
+
+def ticks_us():
+    return now_us() & TICKS_MAX
+
+
+def ticks_ms():
+    return (now_us() // 1000) & TICKS_MAX
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & TICKS_MAX
+
+
+def ticks_diff(ticks1, ticks2):
+    diff = (ticks1 - ticks2) & TICKS_MAX
+    return ((diff + TICKS_HALFPERIOD) & TICKS_MAX) - TICKS_HALFPERIOD
+
+
+def use_virtual(start_us=0):
+    """
+    Freezes the clock at start_us. Time only moves through advance().
+    """
+    global _virtual_us
+    _virtual_us = start_us
+
+
+def use_real():
+    global _virtual_us, _origin_ns
+    if _virtual_us is not None:
+        # Carry on from the virtual time so timestamps stay monotonic
+        _origin_ns = time.perf_counter_ns() - _virtual_us * 1000
+    _virtual_us = None
+
+
+def advance(us):
+    global _virtual_us
+    if _virtual_us is None:
+        raise RuntimeError("advance() needs the virtual clock, call use_virtual() first")
+    _virtual_us += us
+
+
+def is_virtual():
+    return _virtual_us is not None
+
+
+def spend(us):
+    """
+    Stands in for work that takes us on the board: moves the virtual clock, or
+    sleeps in real time.
+    """
+    if us <= 0:
+        return
+    if _virtual_us is not None:
+        advance(int(us))
+    else:
+        time.sleep(us / 1000000)
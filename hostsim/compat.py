@@ -0,0 +1,125 @@
+# Adds the MicroPython-only bits of time and asyncio to the host modules.
+#
+# The scripts call time.ticks_ms(), time.sleep_ms(), asyncio.sleep_ms() and so
+# on, which CPython does not have. install() patches them in once per process.
+
+import asyncio
+import time
+
+from hostsim import clock
+
+_installed = False
+_redirects = {}
+_real_time = time.time
+_epoch = _real_time()
+
+
+def _time():
+    # time.time() follows the virtual clock too, starting from when we were installed
+    if clock.is_virtual():
+        return _epoch + clock.now_us() / 1000000
+    return _real_time()
+
+
+def _sleep_ms(ms):
+    clock.spend(ms * 1000)  # moves the virtual clock instead when it is on
+
+
+def _sleep_us(us):
+    clock.spend(us)
+
+
+class _OpenMVClock:
+    """
+    time.clock() on OpenMV: tick() once per frame, fps() for the rate.
+    """
+
+    def __init__(self):
+        self._start = None
+        self._fps = 0.0
+
+    def tick(self):
+        now = clock.now_us()
+        if self._start is not None and now > self._start:
+            self._fps = 1000000 / (now - self._start)
+        self._start = now
+
+    def fps(self):
+        return self._fps
+
+    def avg(self):
+        return 1000 / self._fps if self._fps else 0.0
+
+
+class ThreadSafeFlag:
+    """
+    asyncio.ThreadSafeFlag from MicroPython: set() may be called from an IRQ
+    (here: any thread), wait() is awaited by a single task.
+    """
+
+    def __init__(self):
+        self._flag = False
+        self._event = None
+        self._loop = None
+
+    def set(self):
+        self._flag = True
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._event.set()
+        else:
+            loop.call_soon_threadsafe(self._event.set)
+
+    def clear(self):
+        self._flag = False
+
+    async def wait(self):
+        if self._event is None or self._loop is not asyncio.get_running_loop():
+            self._loop = asyncio.get_running_loop()
+            self._event = asyncio.Event()
+        while not self._flag:
+            await self._event.wait()
+            self._event.clear()
+        self._flag = False
+
+
+def redirect(host, to_host, to_port):
+    """
+    Sends asyncio.open_connection(host, ...) to (to_host, to_port) instead,
+    e.g. broker.hivemq.com to the local broker started by the runner.
+    """
+    _redirects[host] = (to_host, to_port)
+
+
+def install():
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    time.ticks_ms = clock.ticks_ms
+    time.ticks_us = clock.ticks_us
+    time.ticks_add = clock.ticks_add
+    time.ticks_diff = clock.ticks_diff
+    time.sleep_ms = _sleep_ms
+    time.sleep_us = _sleep_us
+    time.clock = _OpenMVClock
+    time.time = _time
+
+    async def sleep_ms(ms):
+        await asyncio.sleep(ms / 1000)
+
+    real_open_connection = asyncio.open_connection
+
+    async def open_connection(host=None, port=None, **kwargs):
+        host, port = _redirects.get(host, (host, port))
+        return await real_open_connection(host, port, **kwargs)
+
+    asyncio.sleep_ms = sleep_ms
+    asyncio.open_connection = open_connection
+    asyncio.ThreadSafeFlag = ThreadSafeFlag
@@ -0,0 +1,51 @@
+# Simulated I2C devices that hang off machine.I2C.
+#
+# A device is anything with read(reg, n) -> bytes and write(reg, data).
+# Devices are attached by 7-bit address and shared by every I2C bus object.
+
+import struct
+
+i2c_devices = {}
+
+
+def attach(addr, device):
+    i2c_devices[addr] = device
+    return device
+
+
+def detach(addr):
+    i2c_devices.pop(addr, None)
+
+
+def reset():
+    i2c_devices.clear()
+    attach(MSA311Device.ADDRESS, MSA311Device())
+
+
+class MSA311Device:
+    """
+    Register model of the MSA311 accelerometer on the nightlight board.
+
+    Samples come from sample_source, a callable returning raw (x, y, z) int16
+    values, so benchmarks can play back recorded traces.
+    """
+
+    ADDRESS = 0x62
+    PART_ID = 0x13
+
+    def __init__(self, sample_source=None):
+        self.regs = bytearray(0x40)
+        self.regs[0x01] = self.PART_ID
+        self.sample_source = sample_source or (lambda: (0, 0, 8192))
+
+    def read(self, reg, n):
+        if reg <= 0x02 < reg + n:
+            # Reading from ACC_X_LSB latches a fresh sample like the real part
+            struct.pack_into('<hhh', self.regs, 0x02, *self.sample_source())
+        return bytes(self.regs[reg:reg + n])
+
+    def write(self, reg, data):
+        self.regs[reg:reg + len(data)] = data
+
+
+reset()
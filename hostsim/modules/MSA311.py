@@ -0,0 +1,19 @@
+# Host stand-in for the MSA311 accelerometer library used by Nightlight_Part_2.py.
+# Reads go through the simulated I2C bus, so they show up in the recorder.
+
+import struct
+
+from machine import I2C
+
+MSA311_ADDR = 0x62
+REG_ACC_X_LSB = 0x02
+
+
+class Acceleration:
+
+    def __init__(self, scl, sda, addr=MSA311_ADDR):
+        self.addr = addr
+        self.i2c = I2C(1, scl=scl, sda=sda, freq=100000)
+
+    def read_accel(self):
+        return struct.unpack('<hhh', self.i2c.readfrom_mem(self.addr, REG_ACC_X_LSB, 6))
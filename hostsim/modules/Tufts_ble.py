@@ -0,0 +1,70 @@
+# Host stand-in for the course BLE helpers (Sniff scans, Yell advertises).
+#
+# There is no radio: benchmarks feed advertisements to a Sniff with
+# sim_advert(), which behaves like the scan IRQ of the real class. The
+# board's Sniff filters and stores adverts inside its own BLE IRQ handler
+# and has no per-advert method to override; _deliver() is this stand-in's
+# internals (hostsim.radio calls it to skip the recorder), not something
+# code meant for the board can hook.
+
+from hostsim import recorder
+
+_scanners = []
+
+
+class Sniff:
+
+    def __init__(self, discriminator='!', verbose=True):
+        self.discriminator = discriminator
+        self.verbose = verbose
+        self.scanning = False
+        self.last_name = ''
+        self.last_rssi = None
+        _scanners.append(self)
+
+    def scan(self, duration=2000):
+        self.scanning = True
+        recorder.record('BLE', 'scan', duration)
+
+    def stop_scan(self):
+        self.scanning = False
+        recorder.record('BLE', 'stop_scan')
+
+    def _deliver(self, name, rssi):
+        # Same filtering as the IRQ handler on the board
+        if name and name.startswith(self.discriminator):
+            self.last_name = name
+            self.last_rssi = rssi
+            if self.verbose:
+                print(name, rssi)
+
+    def sim_advert(self, name, rssi):
+        if self.scanning:
+            recorder.record('BLE', 'advert', (name, rssi))
+            self._deliver(name, rssi)
+
+
+class Yell:
+
+    def __init__(self):
+        self.name = None
+
+    def advertise(self, name='Pico', interval_us=100000):
+        self.name = name
+        recorder.record('BLE', 'advertise', name)
+
+    def stop_advertising(self):
+        self.name = None
+        recorder.record('BLE', 'stop_advertising')
+
+
+def sim_broadcast(name, rssi):
+    """
+    Hands an advertisement to every scanner in the process.
+    """
+    for scanner in _scanners:
+        scanner.sim_advert(name, rssi)
+
+
+def sim_reset():
+    del _scanners[:]
@@ -0,0 +1,90 @@
+# Host stand-in for MicroPython's bluetooth module (the BLE GAP parts).
+#
+# There is no radio: benchmarks hand raw advertising data to a scanning BLE
+# with sim_scan_result(), which calls the registered IRQ handler with
+# _IRQ_SCAN_RESULT like the real stack. hostsim.radio does the same for
+# simulated devices.
+#
+# Unlike the board, BLE() returns a new object each time, so one process can
+# hold many simulated devices.
+
+from hostsim import recorder
+
+_IRQ_SCAN_RESULT = 5
+_IRQ_SCAN_DONE = 6
+
+_ADV_IND = 0x00
+_ADV_TYPE_NAME = 0x09
+
+_radios = []
+
+
+def name_payload(name):
+    """
+    Advertising data for a plain complete-local-name advertisement, the way
+    Tufts_ble.Yell sends its name.
+    """
+    encoded = name.encode()
+    return bytes((0x02, 0x01, 0x06, len(encoded) + 1, _ADV_TYPE_NAME)) + encoded
+
+
+class BLE:
+
+    def __init__(self):
+        self._active = False
+        self.handler = None
+        self.scanning = False
+        self.adv_data = None  # what gap_advertise is sending, None when not advertising
+        self.interval_us = 0
+        _radios.append(self)
+
+    def active(self, *state):
+        if state:
+            self._active = bool(state[0])
+        return self._active
+
+    def irq(self, handler):
+        self.handler = handler
+
+    def gap_scan(self, duration_ms, interval_us=1280000, window_us=11250, active=False):
+        if duration_ms is None:
+            was_scanning = self.scanning
+            self.scanning = False
+            recorder.record('BLE', 'stop_scan')
+            if was_scanning and self.handler is not None:
+                self.handler(_IRQ_SCAN_DONE, None)
+            return
+        self.scanning = True
+        recorder.record('BLE', 'scan', (duration_ms, interval_us, window_us))
+
+    def gap_advertise(self, interval_us, adv_data=None):
+        if interval_us is None:
+            self.adv_data = None
+            recorder.record('BLE', 'stop_advertising')
+            return
+        self.interval_us = interval_us
+        self.adv_data = bytes(adv_data) if adv_data is not None else b''
+        recorder.record('BLE', 'advertise', self.adv_data)
+
+    def sim_scan_result(self, adv_data, rssi, addr=b'\x00' * 6, record=True):
+        """
+        Delivers one advertisement if scanning. record=False leaves it out of
+        the recorder, so hundreds of simulated devices don't flood it.
+        """
+        if not self.scanning or self.handler is None:
+            return
+        if record:
+            recorder.record('BLE', 'advert', (bytes(adv_data), rssi))
+        self.handler(_IRQ_SCAN_RESULT, (0, addr, _ADV_IND, rssi, memoryview(adv_data)))
+
+
+def sim_broadcast(adv_data, rssi):
+    """
+    Hands an advertisement to every scanning BLE in the process.
+    """
+    for radio in _radios:
+        radio.sim_scan_result(adv_data, rssi)
+
+
+def sim_reset():
+    del _radios[:]
@@ -0,0 +1,247 @@
+# Host stand-in for MicroPython's machine module (RP2040 flavour).
+#
+# Every call that would touch hardware is recorded in hostsim.recorder with a
+# timestamp. Benchmarks drive inputs through sim_drive().
+
+import threading
+import time
+
+from hostsim import devices, recorder
+
+
+def pin_name(pin_id):
+    if isinstance(pin_id, Pin):
+        return pin_id.name
+    if isinstance(pin_id, int):
+        return f"GPIO{pin_id}"
+    return str(pin_id)
+
+
+class _PinState:
+    __slots__ = ('value', 'mode', 'handler', 'trigger')
+
+    def __init__(self):
+        self.value = 0
+        self.mode = None
+        self.handler = None
+        self.trigger = 0
+
+
+_pins = {}
+
+
+def _state(name):
+    state = _pins.get(name)
+    if state is None:
+        state = _pins[name] = _PinState()
+    return state
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, pin_id, mode=-1, pull=-1, value=None):
+        self.name = pin_name(pin_id)
+        self._state = _state(self.name)
+        self.init(mode, pull, value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if mode != -1:
+            self._state.mode = mode
+        if pull == Pin.PULL_UP:
+            self._state.value = 1
+        elif pull == Pin.PULL_DOWN:
+            self._state.value = 0
+        if value is not None:
+            self.value(value)
+
+    def value(self, value=None):
+        if value is None:
+            return self._state.value
+        self._state.value = 1 if value else 0
+        recorder.record(f"Pin({self.name})", 'value', self._state.value)
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def toggle(self):
+        self.value(not self._state.value)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        self._state.handler = handler
+        self._state.trigger = trigger
+        recorder.record(f"Pin({self.name})", 'irq', trigger)
+
+    def __repr__(self):
+        return f"Pin({self.name})"
+
+
+def sim_drive(pin_id, value):
+    """
+    Drives an input pin from outside, like a button or sensor would.
+
+    Fires the registered IRQ handler in the caller's context when the edge
+    matches its trigger, which is as close to a hard IRQ as the host gets.
+    """
+    name = pin_name(pin_id)
+    state = _state(name)
+    value = 1 if value else 0
+    old = state.value
+    state.value = value
+    recorder.record(f"Pin({name})", 'drive', value)
+    if old == value or state.handler is None:
+        return
+    edge = Pin.IRQ_RISING if value else Pin.IRQ_FALLING
+    if state.trigger & edge:
+        state.handler(Pin(name))
+
+
+class PWM:
+
+    def __init__(self, pin, freq=None, duty_u16=None):
+        self.pin = pin if isinstance(pin, Pin) else Pin(pin)
+        self.source = f"PWM({self.pin.name})"
+        self._freq = 1000
+        self._duty = 0
+        if freq is not None:
+            self.freq(freq)
+        if duty_u16 is not None:
+            self.duty_u16(duty_u16)
+
+    def freq(self, value=None):
+        if value is None:
+            return self._freq
+        self._freq = int(value)
+        recorder.record(self.source, 'freq', self._freq)
+
+    def duty_u16(self, value=None):
+        if value is None:
+            return self._duty
+        value = int(value)
+        if not 0 <= value <= 65535:
+            raise ValueError("duty must be 0-65535")
+        self._duty = value
+        recorder.record(self.source, 'duty_u16', value)
+
+    def deinit(self):
+        self._duty = 0
+        recorder.record(self.source, 'deinit')
+
+
+class I2C:
+
+    def __init__(self, bus_id=0, scl=None, sda=None, freq=400000):
+        self.source = f"I2C({bus_id})"
+        self.freq = freq
+
+    def scan(self):
+        return sorted(devices.i2c_devices)
+
+    def _device(self, addr):
+        device = devices.i2c_devices.get(addr)
+        if device is None:
+            raise OSError(5)  # EIO, same as a NACK on the Pico
+        return device
+
+    def readfrom_mem(self, addr, reg, nbytes, addrsize=8):
+        data = self._device(addr).read(reg, nbytes)
+        recorder.record(self.source, 'read', (addr, reg, nbytes))
+        return data
+
+    def readfrom_mem_into(self, addr, reg, buf, addrsize=8):
+        buf[:] = self._device(addr).read(reg, len(buf))
+        recorder.record(self.source, 'read', (addr, reg, len(buf)))
+
+    def writeto_mem(self, addr, reg, buf, addrsize=8):
+        self._device(addr).write(reg, bytes(buf))
+        recorder.record(self.source, 'write', (addr, reg, len(buf)))
+
+
+_timers = []
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, timer_id=-1, mode=PERIODIC, period=-1, freq=-1, callback=None):
+        self._thread = None
+        self._stop = threading.Event()
+        _timers.append(self)
+        if callback is not None:
+            self.init(mode=mode, period=period, freq=freq, callback=callback)
+
+    def init(self, mode=PERIODIC, period=-1, freq=-1, callback=None):
+        self.deinit()
+        if freq > 0:
+            period = 1000 / freq
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(mode, period / 1000, callback, self._stop),
+                                        daemon=True)
+        self._thread.start()
+
+    def _run(self, mode, period_s, callback, stop):
+        deadline = time.perf_counter()
+        while not stop.is_set():
+            deadline += period_s
+            delay = deadline - time.perf_counter()
+            if delay > 0 and stop.wait(delay):
+                return
+            recorder.record('Timer', 'fire')
+            callback(self)
+            if mode == Timer.ONE_SHOT:
+                return
+
+    def deinit(self):
+        self._stop.set()
+        self._thread = None
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state=0):
+    pass
+
+
+def freq(value=None):
+    return 125_000_000
+
+
+def unique_id():
+    return b'\xe6\x61\x38\x00\x00\x00\x00\x01'
+
+
+def reset():
+    raise SystemExit("machine.reset()")
+
+
+def sim_reset():
+    """
+    Forgets all pin state and stops all timers between benchmark runs.
+    """
+    _pins.clear()
+    for timer in _timers:
+        timer.deinit()
+    del _timers[:]
+
+
+def idle():
+    time.sleep(0)
+
+
+def lightsleep(ms=None):
+    time.sleep((ms or 0) / 1000)
@@ -0,0 +1,26 @@
+# Host stand-in for the micropython module.
+
+
+def const(value):
+    return value
+
+
+def native(f):
+    return f
+
+
+def viper(f):
+    return f
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def schedule(func, arg):
+    # The host has no soft-IRQ queue, run straight away
+    func(arg)
+
+
+def mem_info(verbose=False):
+    pass
@@ -0,0 +1,109 @@
+# Host stand-in for the umqtt.simple based mqtt.py copied onto the boards.
+#
+# Same API, but messages go through the in-process broker in hostsim.broker
+# instead of a socket. check_msg() handles at most one message per call, like
+# the real client.
+#
+# PUBLISH_US is how long publish() holds up the caller, like the blocking
+# socket write on the board. It is 0 unless a benchmark sets it. sim_stall()
+# stalls the network for a while: publish() blocks until it is over, and the
+# client's sock doesn't poll as writable (see the uselect stand-in) until then.
+
+import collections
+import time
+
+from hostsim import broker, clock, recorder
+
+PUBLISH_US = 0
+
+_stall_until_us = 0
+
+POLLOUT = 0x004
+
+
+def sim_stall(us):
+    """
+    Stalls the network for every client for the next us microseconds.
+    """
+    global _stall_until_us
+    _stall_until_us = max(_stall_until_us, clock.now_us() + us)
+    recorder.record('MQTT', 'stall', us)
+
+
+def sim_reset():
+    global _stall_until_us
+    _stall_until_us = 0
+
+
+class _Socket:
+    # Only here so uselect.poll() can ask whether a publish would block
+
+    def sim_poll(self, eventmask):
+        if eventmask & POLLOUT and clock.now_us() >= _stall_until_us:
+            return POLLOUT
+        return 0
+
+
+class MQTTException(Exception):
+    pass
+
+
+class MQTTClient:
+
+    def __init__(self, client_id, server, port=0, user=None, password=None, keepalive=0,
+                 ssl=False, ssl_params={}):
+        self.client_id = client_id if isinstance(client_id, str) else client_id.decode()
+        self.server = server
+        self.port = port
+        self.keepalive = keepalive
+        self.source = f"MQTT({self.client_id})"
+        self.cb = None
+        self.inbox = collections.deque()
+        self.connected = False
+        self.sock = _Socket()
+
+    def set_callback(self, f):
+        self.cb = f
+
+    def connect(self, clean_session=True):
+        self.connected = True
+        recorder.record(self.source, 'connect', self.server)
+        return 0
+
+    def disconnect(self):
+        broker.default.unsubscribe(self)
+        self.connected = False
+
+    def ping(self):
+        pass
+
+    def subscribe(self, topic, qos=0):
+        if not self.connected:
+            raise MQTTException("not connected")
+        broker.default.subscribe(self, topic)
+        recorder.record(self.source, 'subscribe', broker.to_bytes(topic))
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        if not self.connected:
+            raise MQTTException("not connected")
+        clock.spend(_stall_until_us - clock.now_us())  # blocked until the network is back
+        recorder.record(self.source, 'publish', (broker.to_bytes(topic), broker.to_bytes(msg)))
+        clock.spend(PUBLISH_US)
+        broker.default.publish(topic, msg)
+
+    def deliver(self, topic, msg):
+        # Called by the broker, possibly from another thread
+        self.inbox.append((topic, msg))
+
+    def check_msg(self):
+        if not self.inbox:
+            return None
+        topic, msg = self.inbox.popleft()
+        recorder.record(self.source, 'receive', (topic, msg))
+        if self.cb is not None:
+            self.cb(topic, msg)
+
+    def wait_msg(self):
+        while not self.inbox:
+            time.sleep(0.001)
+        return self.check_msg()
@@ -0,0 +1,34 @@
+# Host stand-in for MicroPython's neopixel module.
+
+from hostsim import recorder
+from machine import Pin
+
+
+class NeoPixel:
+    ORDER = (1, 0, 2, 3)  # GRB on the wire, same as the firmware
+
+    def __init__(self, pin, n, bpp=3, timing=1):
+        self.pin = pin if isinstance(pin, Pin) else Pin(pin)
+        self.source = f"NeoPixel({self.pin.name})"
+        self.n = n
+        self.bpp = bpp
+        self.buf = bytearray(n * bpp)
+
+    def __len__(self):
+        return self.n
+
+    def __setitem__(self, i, value):
+        offset = i * self.bpp
+        for j in range(self.bpp):
+            self.buf[offset + self.ORDER[j]] = value[j]
+
+    def __getitem__(self, i):
+        offset = i * self.bpp
+        return tuple(self.buf[offset + self.ORDER[j]] for j in range(self.bpp))
+
+    def fill(self, value):
+        for i in range(self.n):
+            self[i] = value
+
+    def write(self):
+        recorder.record(self.source, 'write', tuple(self[i] for i in range(self.n)))
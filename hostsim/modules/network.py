@@ -0,0 +1,47 @@
+# Host stand-in for MicroPython's network module. Connecting always succeeds.
+
+from hostsim import recorder
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_GOT_IP = 3
+
+
+class WLAN:
+
+    def __init__(self, interface_id=STA_IF):
+        self._active = False
+        self._connected = False
+        self._ssid = None
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._active
+        self._active = bool(is_active)
+
+    def connect(self, ssid=None, key=None, **kwargs):
+        self._ssid = ssid
+        self._connected = True
+        recorder.record('WLAN', 'connect', ssid)
+
+    def disconnect(self):
+        self._connected = False
+
+    def isconnected(self):
+        return self._connected
+
+    def status(self, param=None):
+        return STAT_GOT_IP if self._connected else STAT_IDLE
+
+    def ifconfig(self, config=None):
+        if self._connected:
+            return ('192.168.4.2', '255.255.255.0', '192.168.4.1', '192.168.4.1')
+        return ('0.0.0.0', '0.0.0.0', '0.0.0.0', '0.0.0.0')
+
+    def config(self, *args, **kwargs):
+        if args == ('mac',):
+            return b'\x28\xcd\xc1\x00\x00\x01'
+        return None
@@ -0,0 +1,118 @@
+# Host stand-in for the OpenMV sensor module.
+#
+# snapshot() returns an Image whose find_apriltags() reports the tags from the
+# current scene. A scene is a callable taking the frame number and returning
+# a list of Tag objects. Set it with set_scene(). Each find_apriltags() call
+# is recorded with (pixels searched, tags found, principal point). Like
+# OpenMV, a search with roi= works on the cropped image, so cx/cy (default:
+# its centre) are relative to the roi; the recorded principal point is in
+# full-frame pixels, and pose is only right when it is the frame's one.
+
+from hostsim import clock, recorder
+
+RGB565 = 2
+GRAYSCALE = 1
+QQVGA = 6
+QVGA = 8
+
+_SIZES = {QQVGA: (160, 120), QVGA: (320, 240)}
+
+# Rough OpenMV M7 costs: the sensor delivers at most 60 frames/s and
+# find_apriltags takes about 2.5 us per pixel searched (~20 fps on QQVGA).
+FRAME_US = 16667
+APRILTAG_US_PER_PIXEL = 2.5
+
+_framesize = QQVGA
+_frame = 0
+_scene = lambda frame: []
+_next_frame_us = 0
+
+
+class Tag:
+
+    def __init__(self, tag_id, cx, cy, w=20, h=20, z_translation=-5.0):
+        self.id = tag_id
+        self.cx = cx
+        self.cy = cy
+        self.w = w
+        self.h = h
+        self.rect = (cx - w // 2, cy - h // 2, w, h)
+        self.x_translation = 0.0
+        self.y_translation = 0.0
+        self.z_translation = z_translation
+        self.x_rotation = 0.0
+        self.y_rotation = 0.0
+        self.z_rotation = 0.0
+
+
+class Image:
+
+    def __init__(self, frame, tags):
+        self.frame = frame
+        self._tags = tags
+        self._w, self._h = _SIZES.get(_framesize, (160, 120))
+
+    def width(self):
+        return self._w
+
+    def height(self):
+        return self._h
+
+    def find_apriltags(self, roi=None, **kwargs):
+        # A tag is only found when all of it is inside the roi (and the frame)
+        x, y, w, h = roi or (0, 0, self._w, self._h)
+        clock.spend(w * h * APRILTAG_US_PER_PIXEL)
+        found = [tag for tag in self._tags
+                 if x <= tag.rect[0] and y <= tag.rect[1]
+                 and tag.rect[0] + tag.w <= min(x + w, self._w) and tag.rect[1] + tag.h <= min(y + h, self._h)]
+        principal = (x + kwargs.get('cx', w * 0.5), y + kwargs.get('cy', h * 0.5))
+        recorder.record('sensor', 'find_apriltags', (w * h, len(found), principal))
+        return found
+
+    def draw_rectangle(self, *args, **kwargs):
+        pass
+
+    def draw_cross(self, *args, **kwargs):
+        pass
+
+
+def set_scene(scene):
+    global _scene, _frame
+    _scene = scene
+    _frame = 0
+
+
+def reset():
+    global _frame, _next_frame_us
+    _frame = 0
+    _next_frame_us = 0
+
+
+def set_pixformat(pixformat):
+    pass
+
+
+def set_framesize(framesize):
+    global _framesize
+    _framesize = framesize
+
+
+def skip_frames(n=None, time=None):
+    pass
+
+
+def set_auto_gain(enable, **kwargs):
+    pass
+
+
+def set_auto_whitebal(enable, **kwargs):
+    pass
+
+
+def snapshot():
+    global _frame, _next_frame_us
+    clock.spend(_next_frame_us - clock.now_us())
+    _next_frame_us = max(_next_frame_us, clock.now_us()) + FRAME_US
+    _frame += 1
+    recorder.record('sensor', 'snapshot', _frame)
+    return Image(_frame, _scene(_frame))
@@ -0,0 +1,8 @@
+# 'import uasyncio as asyncio' gets the host asyncio, with the MicroPython extras
+# added by hostsim.compat.
+
+import sys
+
+import asyncio
+
+sys.modules[__name__] = asyncio
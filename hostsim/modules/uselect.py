@@ -0,0 +1,65 @@
+# Host stand-in for MicroPython's uselect, for polling the mqtt stand-in.
+#
+# poll() works on objects with a sim_poll(eventmask) method (the mqtt
+# stand-in's socket) and on anything with a fileno() through the host's
+# select. A timeout moves the virtual clock, or sleeps in real time.
+
+import select as _select
+
+from hostsim import clock
+
+POLLIN = 0x001
+POLLOUT = 0x004
+POLLERR = 0x008
+POLLHUP = 0x010
+
+
+class _Poll:
+
+    def __init__(self):
+        self._entries = {}
+
+    def register(self, obj, eventmask=POLLIN | POLLOUT):
+        self._entries[id(obj)] = (obj, eventmask)
+
+    def modify(self, obj, eventmask):
+        self.register(obj, eventmask)
+
+    def unregister(self, obj):
+        self._entries.pop(id(obj), None)
+
+    def _ready(self):
+        ready = []
+        for obj, mask in self._entries.values():
+            if hasattr(obj, 'sim_poll'):
+                events = obj.sim_poll(mask)
+            else:
+                poller = _select.poll()
+                poller.register(obj.fileno(), mask)
+                result = poller.poll(0)
+                events = result[0][1] if result else 0
+            if events:
+                ready.append((obj, events))
+        return ready
+
+    def poll(self, timeout=-1):
+        """
+        :param timeout: ms to wait for something to become ready, 0 to just look, -1 for up to a second
+        """
+        ready = self._ready()
+        if ready or timeout == 0:
+            return ready
+        waited = 0
+        limit = timeout if timeout > 0 else 1000
+        while not ready and waited < limit:
+            clock.spend(1000)
+            waited += 1
+            ready = self._ready()
+        return ready
+
+    def ipoll(self, timeout=-1, flags=0):
+        return iter(self.poll(timeout))
+
+
+def poll():
+    return _Poll()
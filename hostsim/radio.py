@@ -0,0 +1,157 @@
+# Simulated BLE advertising channel between many devices on one host.
+#
+# Each Node has a position and optionally a scanner and/or an advertiser:
+# either the hostsim Tufts_ble classes (Sniff, Yell) or a hostsim
+# bluetooth.BLE. Channel.run_node() advertises for a node every interval_ms
+# (plus BLE's 0-10 ms random delay) while its Yell has a name or its BLE has
+# advertising data. Every scanning node in reach gets the advert through its
+# scan callback with an RSSI from a log-distance path loss model:
+#
+#     rssi = p0_dbm - 10 * n * log10(distance) + gauss(0, noise_db)
+#
+# Packets are lost at random (base_loss), below the sensitivity floor, or by
+# colliding with other advertisers. The collision chance grows with the number
+# of advertisers on air: 1 - exp(-2 * advertisers * airtime / interval), the
+# pure ALOHA estimate.
+#
+# Delivery calls a Sniff's _deliver() directly rather than sim_advert(), and
+# a BLE's sim_scan_result() with record=False, so hundreds of devices don't
+# flood the recorder. A BLE scanner gets names as a name advertisement; a
+# Sniff can't decode raw advertising data and never hears it.
+
+import asyncio
+import math
+
+from hostsim import clock
+from hostsim.modules.bluetooth import name_payload
+
+
+def payload(advertiser):
+    """
+    What advertiser is sending: a name, advertising data bytes, or None.
+    """
+    if advertiser is None:
+        return None
+    adv_data = getattr(advertiser, 'adv_data', None)
+    return adv_data if adv_data is not None else getattr(advertiser, 'name', None)
+
+
+class Node:
+
+    def __init__(self, x=0.0, y=0.0, scanner=None, advertiser=None):
+        """
+        :param x: Position in metres
+        :param y: Position in metres
+        :param scanner: Tufts_ble.Sniff or bluetooth.BLE that receives adverts, or None
+        :param advertiser: Tufts_ble.Yell or bluetooth.BLE, sent while it advertises, or None
+        """
+        self.x = x
+        self.y = y
+        self.scanner = scanner
+        self.advertiser = advertiser
+        self.sent = 0
+        self.received = 0
+
+
+class Channel:
+
+    def __init__(self, rng, p0_dbm=-50, path_loss_exp=2.0, noise_db=4.0, base_loss=0.05,
+                 floor_dbm=-95, interval_ms=100, airtime_us=376):
+        """
+        :param rng: random.Random, so runs are reproducible
+        :param p0_dbm: RSSI at 1 m
+        :param path_loss_exp: Path loss exponent, 2 is free space
+        :param noise_db: Standard deviation of the RSSI noise
+        :param base_loss: Chance of losing any one packet
+        :param floor_dbm: Receiver sensitivity, weaker packets are never heard
+        :param interval_ms: Advertising interval
+        :param airtime_us: Time one advert occupies the air
+        """
+        self.rng = rng
+        self.p0_dbm = p0_dbm
+        self.path_loss_exp = path_loss_exp
+        self.noise_db = noise_db
+        self.base_loss = base_loss
+        self.floor_dbm = floor_dbm
+        self.interval_ms = interval_ms
+        self.airtime_us = airtime_us
+        self.nodes = []
+        self.sent = 0
+        self.delivered = 0
+        self.lost = 0
+        self.collided = 0
+        self._on_air = 0
+        self._on_air_us = None
+        self._name_payloads = {}
+
+    def add(self, node):
+        self.nodes.append(node)
+        return node
+
+    def mean_rssi(self, distance):
+        return self.p0_dbm - 10 * self.path_loss_exp * math.log10(max(distance, 0.1))
+
+    def distance_for(self, rssi):
+        """
+        Distance at which the mean RSSI equals rssi.
+        """
+        return 10 ** ((self.p0_dbm - rssi) / (10 * self.path_loss_exp))
+
+    def advertisers(self):
+        return sum(1 for node in self.nodes if payload(node.advertiser))
+
+    def deliver(self, sender, data):
+        """
+        Sends one advert (a name or advertising data) from sender to every
+        scanning node.
+        """
+        raw = not isinstance(data, str)
+        adv_data = data
+        if not raw:
+            adv_data = self._name_payloads.get(data)
+            if adv_data is None:
+                adv_data = self._name_payloads[data] = name_payload(data)
+        self.sent += 1
+        sender.sent += 1
+        rng = self.rng
+        now = clock.now_us()
+        if self._on_air_us is None or now - self._on_air_us >= self.interval_ms * 1000:
+            self._on_air = self.advertisers()  # counted once per interval, not per packet
+            self._on_air_us = now
+        on_air = self._on_air
+        collision = 1 - math.exp(-2 * max(on_air - 1, 0) * self.airtime_us / (self.interval_ms * 1000))
+        for node in self.nodes:
+            scanner = node.scanner
+            if node is sender or scanner is None or not scanner.scanning:
+                continue
+            is_ble = hasattr(scanner, 'sim_scan_result')
+            if raw and not is_ble:
+                continue
+            distance = math.hypot(node.x - sender.x, node.y - sender.y)
+            rssi = self.mean_rssi(distance) + rng.gauss(0, self.noise_db)
+            if rssi < self.floor_dbm:
+                continue  # out of reach, not counted as lost
+            if rng.random() < self.base_loss:
+                self.lost += 1
+                continue
+            if rng.random() < collision:
+                self.collided += 1
+                continue
+            self.delivered += 1
+            node.received += 1
+            if is_ble:
+                scanner.sim_scan_result(adv_data, int(rssi), record=False)
+            else:
+                scanner._deliver(data, int(rssi))
+
+    async def run_node(self, node):
+        """
+        Advertises for node for as long as it runs.
+        """
+        rng = self.rng
+        await asyncio.sleep(rng.uniform(0, self.interval_ms) / 1000)  # devices don't start in step
+        while True:
+            data = payload(node.advertiser)
+            if data:
+                self.deliver(node, data)
+            await asyncio.sleep((self.interval_ms + rng.uniform(0, 10)) / 1000)
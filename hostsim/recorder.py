@@ -0,0 +1,92 @@
+# Timestamped log of every simulated hardware call.
+#
+# Each simulated peripheral records events like ('PWM(GPIO0)', 'duty_u16', 32768).
+# Benchmarks read the log afterwards to work out loop rates and latencies.
+
+from hostsim import clock
+
+
+class Event:
+    __slots__ = ('t_us', 'source', 'kind', 'value')
+
+    def __init__(self, t_us, source, kind, value):
+        self.t_us = t_us
+        self.source = source
+        self.kind = kind
+        self.value = value
+
+    def __repr__(self):
+        return f"Event({self.t_us}, {self.source!r}, {self.kind!r}, {self.value!r})"
+
+
+events = []
+_listeners = []
+
+
+def record(source, kind, value=None):
+    event = Event(clock.now_us(), source, kind, value)
+    events.append(event)
+    for listener in _listeners:
+        listener(event)
+    return event
+
+
+def clear():
+    del events[:]
+
+
+def add_listener(listener):
+    """
+    Calls listener(event) for every new event, e.g. to stop a benchmark early.
+    """
+    _listeners.append(listener)
+
+
+def remove_listener(listener):
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def select(kind=None, source=None, after_us=None):
+    """
+    Returns the recorded events matching every given filter.
+
+    :param kind: Event kind such as 'duty_u16' or 'write'
+    :param source: Substring of the event source such as 'GPIO18'
+    :param after_us: Only events at or after this timestamp
+    """
+    result = []
+    for event in events:
+        if kind is not None and event.kind != kind:
+            continue
+        if source is not None and source not in event.source:
+            continue
+        if after_us is not None and event.t_us < after_us:
+            continue
+        result.append(event)
+    return result
+
+
+def first(kind=None, source=None, after_us=None):
+    for event in select(kind, source, after_us):
+        return event
+    return None
+
+
+def summary(elapsed_us=None):
+    """
+    Counts events per (source, kind) and turns them into rates.
+
+    :param elapsed_us: Duration to divide by (default: span of the log)
+    :return: List of (source, kind, count, per_second) sorted by source
+    """
+    if not events:
+        return []
+    if elapsed_us is None:
+        elapsed_us = max(events[-1].t_us - events[0].t_us, 1)
+    counts = {}
+    for event in events:
+        key = (event.source, event.kind)
+        counts[key] = counts.get(key, 0) + 1
+    return [(source, kind, count, count * 1_000_000 / elapsed_us)
+            for (source, kind), count in sorted(counts.items())]
@@ -0,0 +1,169 @@
+# Runs one of the board scripts on the host for a fixed time.
+#
+# The scripts never return: they end in asyncio.run(main()) or a while True
+# loop. run_script() swaps asyncio.run for a version that stops after the
+# given number of seconds, and uses SIGALRM as a backstop for plain loops.
+# run_script_virtual() runs a plain-loop script on the virtual clock instead,
+# where the simulated hardware's costs are the only thing that moves time.
+
+import asyncio
+import io
+import os
+import runpy
+import signal
+import sys
+import time
+
+import hostsim
+from hostsim import broker, clock, compat, recorder
+
+
+class StopSimulation(BaseException):
+    # BaseException so the scripts' own 'except Exception' blocks don't eat it
+    pass
+
+
+class Report:
+
+    def __init__(self, script, seconds):
+        self.script = script
+        self.seconds = seconds
+        self.wall_s = 0.0
+        self.cpu_s = 0.0
+        self.loop_iterations = 0
+        self.loop_wakeups = 0
+        self.error = None
+        self.result = None
+
+    def format(self):
+        lines = [f"{self.script}: {self.wall_s:.2f} s wall, {self.cpu_s:.3f} s CPU "
+                 f"({100 * self.cpu_s / max(self.wall_s, 1e-9):.1f}%)"]
+        if self.loop_iterations:
+            lines.append(f"  event loop: {self.loop_iterations} iterations, "
+                         f"{self.loop_wakeups / max(self.wall_s, 1e-9):.1f} wakeups/s")
+        for source, kind, count, rate in recorder.summary(int(self.wall_s * 1000000)):
+            lines.append(f"  {source:<24} {kind:<16} {count:>8} {rate:>10.1f}/s")
+        if self.error:
+            lines.append(f"  stopped by {self.error}")
+        return '\n'.join(lines)
+
+
+def _count_wakeups(loop, report):
+    # Every pass of the loop calls select(); a timeout other than 0 means the
+    # loop had nothing to do and went to sleep until the next deadline or I/O.
+    selector = loop._selector
+    select = selector.select
+
+    def counting_select(timeout=None):
+        report.loop_iterations += 1
+        if timeout is None or timeout > 0:
+            report.loop_wakeups += 1
+        return select(timeout)
+
+    selector.select = counting_select
+
+
+async def _bounded(main, seconds, stimulus, report):
+    _count_wakeups(asyncio.get_running_loop(), report)
+    server = await broker.serve()
+    compat.redirect(broker.PUBLIC_HOST, '127.0.0.1', server.sockets[0].getsockname()[1])
+    main_task = asyncio.ensure_future(main)
+    if stimulus is None:
+        await asyncio.wait([main_task], timeout=seconds)
+    else:
+        stimulus_task = asyncio.ensure_future(stimulus())
+        await asyncio.wait([main_task, stimulus_task], timeout=seconds,
+                           return_when=asyncio.FIRST_COMPLETED)
+        if stimulus_task.done():
+            report.result = stimulus_task.result()
+        else:
+            stimulus_task.cancel()
+    server.close()
+    if main_task.done():
+        return main_task.result()
+    main_task.cancel()
+    for task in asyncio.all_tasks():
+        if task is not asyncio.current_task():
+            task.cancel()
+
+
+class _NullWriter(io.TextIOBase):
+
+    def write(self, s):
+        return len(s)
+
+
+def run_script(path, seconds=5.0, stimulus=None, quiet=True):
+    """
+    Runs a board script under the simulator.
+
+    :param path: Path to the script, e.g. 'SA_Nightlight_Part_1.py'
+    :param seconds: How long to let it run
+    :param stimulus: Optional coroutine function started next to the script's
+                     main task once it calls asyncio.run(). The run ends as
+                     soon as the stimulus returns; its return value ends up in
+                     report.result.
+    :param quiet: Swallow the script's print() output
+    :return: Report with timing, loop wakeups and any error that stopped it
+    """
+    hostsim.reset()
+    report = Report(path, seconds)
+    path = os.path.abspath(path)
+    real_run = asyncio.run
+
+    def bounded_run(main, debug=None):
+        return real_run(_bounded(main, seconds, stimulus, report))
+
+    def on_alarm(signum, frame):
+        raise StopSimulation(f"{seconds} s time limit")
+
+    sys.path.insert(0, os.path.dirname(path))
+    stdout = sys.stdout
+    old_handler = signal.signal(signal.SIGALRM, on_alarm)
+    asyncio.run = bounded_run
+    if quiet:
+        sys.stdout = _NullWriter()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    signal.setitimer(signal.ITIMER_REAL, seconds + 0.5)
+    try:
+        runpy.run_path(path, run_name='__main__')
+    except StopSimulation as e:
+        report.error = str(e)
+    except (Exception, KeyboardInterrupt, SystemExit) as e:
+        report.error = repr(e)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        report.wall_s = time.perf_counter() - wall_start
+        report.cpu_s = time.process_time() - cpu_start
+        signal.signal(signal.SIGALRM, old_handler)
+        asyncio.run = real_run
+        sys.stdout = stdout
+        sys.path.remove(os.path.dirname(path))
+    return report
+
+
+def run_script_virtual(path, seconds, backstop_s=60.0):
+    """
+    Runs a plain-loop board script (camera loops, no asyncio) on the virtual
+    clock until seconds of virtual time have passed. Only the simulated
+    hardware moves the clock: frames, searches, sleeps and modelled publishes.
+
+    :param path: Path to the script
+    :param seconds: Virtual time to run for
+    :param backstop_s: Real time limit, in case the script never touches the hardware
+    :return: Report; wall_s and cpu_s are host time
+    """
+    end_us = int(seconds * 1000000)
+
+    def stop_at_end(event):
+        if event.t_us >= end_us:
+            raise StopSimulation(f"{seconds} s of virtual time")
+
+    clock.use_virtual(0)
+    recorder.add_listener(stop_at_end)
+    try:
+        return run_script(path, backstop_s)
+    finally:
+        recorder.remove_listener(stop_at_end)
+        clock.use_real()
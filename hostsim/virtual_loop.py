@@ -0,0 +1,68 @@
+# asyncio event loop that runs on the virtual clock.
+#
+# loop.time() reads hostsim.clock, and whenever the loop would go to sleep
+# until its next timer it advances the virtual clock to that timer instead.
+# Code that only sleeps (asyncio.sleep, sleep_ms) and reads time.ticks_ms()
+# therefore runs unmodified, as fast as the host can execute it. Real I/O
+# still works but is only polled, never waited for.
+#
+#     clock.use_virtual()
+#     loop = VirtualEventLoop()
+#     loop.run_until_complete(main())
+#     print(loop.wakeups, loop.costs_us[:10])
+
+import asyncio
+import selectors
+import time
+
+from hostsim import clock
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+
+    def __init__(self):
+        super().__init__()
+        self.wakeups = 0
+        self.costs_us = []  # host time spent per wakeup, between two selects
+        self._resumed = None
+
+    def select(self, timeout=None):
+        now = time.perf_counter_ns()
+        if self._resumed is not None:
+            self.costs_us.append((now - self._resumed) // 1000)
+        events = super().select(0)
+        if not events:
+            if timeout is None:
+                raise RuntimeError("virtual event loop has nothing scheduled and would sleep forever")
+            if timeout > 0:
+                clock.advance(int(timeout * 1000000) + 1)
+                self.wakeups += 1
+        self._resumed = time.perf_counter_ns()
+        return events
+
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+
+    def __init__(self):
+        if not clock.is_virtual():
+            raise RuntimeError("VirtualEventLoop needs the virtual clock, call clock.use_virtual() first")
+        self._virtual_selector = _VirtualSelector()
+        super().__init__(self._virtual_selector)
+
+    def time(self):
+        return clock.now_us() / 1000000
+
+    @property
+    def wakeups(self):
+        """
+        Times the loop went to sleep, i.e. moved the virtual clock forward.
+        """
+        return self._virtual_selector.wakeups
+
+    @property
+    def costs_us(self):
+        """
+        Host microseconds spent between consecutive selects, one entry per
+        loop iteration.
+        """
+        return self._virtual_selector.costs_us
@@ -0,0 +1,219 @@
+# Frame-to-motor latency tracing across camera, broker and car.
+#
+# Each traced command gets a trace id on the camera, and every device notes
+# time.ticks_us() as the command passes a stage:
+#
+#     CAPTURE   sensor.snapshot() returned           camera
+#     PUBLISH   client.publish() returned            camera
+#     RECEIVE   the MQTT callback was entered        car
+#     ACTUATE   duty_u16() was set from it           car
+#
+# The id travels with the command: text commands get a "#id" suffix (tag()
+# on the camera, untag() on the car), velocity_wire messages already carry
+# their sequence number, which is used as the id. That number is only given
+# out when the message is published, so the camera marks PUBLISH with it
+# and the id begin() gave the frame (published(seq, frame)). Devices
+# collect records in a preallocated buffer and publish them in one message
+# on TOPIC now and then (due() / message()).
+#
+# The boards' clocks are unrelated, so the collector on the host
+# (tools/latency_report.py) publishes a clock probe on PING_TOPIC every few
+# seconds and every device answers it at once with its own ticks_us()
+# (pong()). From the round trip the collector works out each device's clock
+# against its own and puts every stage on one time line.
+#
+# Camera:
+#
+#     tracer = Tracer("ME35_kachow", every=10)
+#     client.set_callback(lambda topic, msg: client.publish(TOPIC, tracer.pong(msg)))
+#     client.subscribe(PING_TOPIC)
+#     publisher = ChangePublisher(client, topic, tracer=tracer)
+#     while True:
+#         img = sensor.snapshot()
+#         trace = tracer.begin()
+#         ...
+#         publisher.offer(command, trace)      # tags it, marks PUBLISH
+#         client.check_msg()
+#         if tracer.due():
+#             client.publish(TOPIC, tracer.message())
+#
+# Car, in the callback:
+#
+#     received = time.ticks_us()
+#     msg, trace = untag(msg)
+#     tracer.mark(trace, RECEIVE, received)
+#     if ...:                                   # a duty was set from msg
+#         tracer.mark(trace, ACTUATE)
+#
+# Only ids that are multiples of every are recorded and tagged, so tracing
+# can be thinned out; untraced commands go out exactly as before. A tagged
+# text command is a different payload for any listener that doesn't
+# untag(), so keep every well above 1 outside of tests.
+
+import struct
+import time
+
+TOPIC = b'ME35-24/trace'
+PING_TOPIC = b'ME35-24/trace/ping'
+
+CAPTURE = 0
+PUBLISH = 1
+RECEIVE = 2
+ACTUATE = 3
+STAGES = ('capture', 'publish', 'receive', 'actuate')
+
+RECORDS = b'T'
+PONG = b'P'
+
+_RECORD = '<HBI'  # trace id, stage, ticks_us
+RECORD_SIZE = 7
+_RING = 16  # capture times kept for commands not published yet
+
+
+class Tracer:
+
+    def __init__(self, name, every=1, size=64, flush_ms=1000):
+        """
+        :param name: Device name in the records, e.g. the MQTT client id
+        :param every: Record only trace ids that are a multiple of this
+        :param size: Records buffered between two messages; more are dropped
+        :param flush_ms: How often due() says it's time to publish
+        """
+        name = name.encode() if isinstance(name, str) else name
+        self.every = every
+        self.size = size
+        self.flush_ms = flush_ms
+        self._header = RECORDS + bytes([len(name)]) + name
+        self._pong = PONG + bytes([len(name)]) + name
+        self._buf = bytearray(len(self._header) + size * RECORD_SIZE)
+        self._buf[:len(self._header)] = self._header
+        self.n = 0
+        self.dropped = 0
+        self._next_id = 0
+        self._ring_id = bytearray(2 * _RING)
+        self._ring_ticks = bytearray(4 * _RING)
+        self._flushed = time.ticks_ms()
+
+    def sampled(self, trace_id):
+        return trace_id != 0 and trace_id % self.every == 0
+
+    def begin(self, trace_id=None, ticks=None):
+        """
+        Call when a frame is captured. Returns the frame's trace id: trace_id
+        if given, else the next one.
+
+        :param ticks: ticks_us() of the capture, now if not given
+        """
+        if ticks is None:
+            ticks = time.ticks_us()
+        if trace_id is None:
+            self._next_id = self._next_id % 0xFFFF + 1
+            trace_id = self._next_id
+        slot = trace_id % _RING
+        struct.pack_into('<H', self._ring_id, 2 * slot, trace_id)
+        struct.pack_into('<I', self._ring_ticks, 4 * slot, ticks)
+        return trace_id
+
+    def tag(self, msg, trace_id):
+        """
+        Text command msg with the trace id appended, if it is being traced.
+        """
+        if not self.sampled(trace_id):
+            return msg
+        if isinstance(msg, str):
+            return '%s#%d' % (msg, trace_id)
+        return msg + b'#' + str(trace_id).encode()
+
+    def mark(self, trace_id, stage, ticks=None, frame=None):
+        """
+        Records that trace_id reached stage at ticks (ticks_us(), now if not
+        given). Marking PUBLISH also records the frame's CAPTURE.
+
+        :param frame: Id begin() returned for the frame, if the message got
+            another one (trace_id) when it was published
+        """
+        if not self.sampled(trace_id):
+            return
+        if ticks is None:
+            ticks = time.ticks_us()
+        if stage == PUBLISH:
+            if frame is None:
+                frame = trace_id
+            slot = frame % _RING
+            if struct.unpack_from('<H', self._ring_id, 2 * slot)[0] == frame:
+                self._add(trace_id, CAPTURE, struct.unpack_from('<I', self._ring_ticks, 4 * slot)[0])
+        self._add(trace_id, stage, ticks)
+
+    def published(self, trace_id, frame=None):
+        self.mark(trace_id, PUBLISH, frame=frame)
+
+    def actuated(self, trace_id):
+        self.mark(trace_id, ACTUATE)
+
+    def _add(self, trace_id, stage, ticks):
+        if self.n >= self.size:
+            self.dropped += 1
+            return
+        struct.pack_into(_RECORD, self._buf, len(self._header) + self.n * RECORD_SIZE, trace_id, stage, ticks)
+        self.n += 1
+
+    def due(self):
+        if self.n >= self.size // 2:
+            return True
+        return self.n > 0 and time.ticks_diff(time.ticks_ms(), self._flushed) >= self.flush_ms
+
+    def message(self):
+        """
+        The buffered records as one message for TOPIC. Empties the buffer.
+        """
+        msg = bytes(memoryview(self._buf)[:len(self._header) + self.n * RECORD_SIZE])
+        self.n = 0
+        self._flushed = time.ticks_ms()
+        return msg
+
+    def pong(self, ping):
+        """
+        Answer to a clock probe from PING_TOPIC, for TOPIC.
+        """
+        return self._pong + bytes(ping[:4]) + struct.pack('<I', time.ticks_us())
+
+
+def untag(msg):
+    """
+    Splits a received text command into (command, trace id); the id is 0 if
+    it has none.
+    """
+    i = msg.find(b'#')
+    if i < 0:
+        return msg, 0
+    try:
+        return msg[:i], int(msg[i + 1:])
+    except ValueError:
+        return msg, 0
+
+
+def ping(probe):
+    """
+    Clock probe for PING_TOPIC.
+    """
+    return struct.pack('<I', probe)
+
+
+def decode(msg):
+    """
+    Host side. Returns (RECORDS, name, [(trace_id, stage, ticks), ...]) or
+    (PONG, name, (probe, ticks)), or None for anything else.
+    """
+    kind = msg[:1]
+    if kind not in (RECORDS, PONG) or len(msg) < 2:
+        return None
+    end = 2 + msg[1]
+    name = bytes(msg[2:end]).decode()
+    if kind == PONG:
+        if len(msg) != end + 8:
+            return None
+        return PONG, name, struct.unpack_from('<II', msg, end)
+    records = []
+    for offset in range(end, len(msg) - RECORD_SIZE + 1, RECORD_SIZE):
+        records.append(struct.unpack_from(_RECORD, msg, offset))
+    return RECORDS, name, records
@@ -0,0 +1,184 @@
+# Compiled melodies played against absolute deadlines.
+#
+# A melody like [('C4', 0.5), ('G4', 1.0)] is compiled once into a flat
+# array('H') of (frequency, on_ms, off_ms) triples. MelodyPlayer plays it
+# from one task that sleeps until absolute ticks_ms deadlines, so a late
+# wakeup (breathing, MQTT, ...) shortens the next sleep instead of slowing
+# the song down.
+#
+#     player = MelodyPlayer(buzzer)
+#     song = compile_melody(melody, NOTES)
+#     player.play(song)          # returns immediately
+#     player.play(other_song)    # switches straight away
+#     player.play(song, at_boundary=True)  # switches when the current note ends
+#
+# Melody files hold one melody per line:
+#
+#     twinkle: C4 0.5, C4 0.5, G4 0.5, G4 0.5, A4 0.5, A4 0.5, G4 1.0
+#     # comments and blank lines are ignored, R is a rest
+#
+# and are loaded with player.load('melodies.txt').
+
+import time
+from array import array
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+_SEMITONES = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+
+
+def note_frequency(note):
+    """
+    Equal-temperament frequency of a note name like 'A4', 'C#5' or 'Bb3'.
+    'R' is a rest and returns 0.
+    """
+    if note == 'R':
+        return 0
+    semitone = _SEMITONES[note[0]]
+    octave = note[1:]
+    if octave[0] == '#':
+        semitone += 1
+        octave = octave[1:]
+    elif octave[0] == 'b':
+        semitone -= 1
+        octave = octave[1:]
+    midi = 12 * (int(octave) + 1) + semitone
+    return int(440 * 2 ** ((midi - 69) / 12) + 0.5)
+
+
+def compile_melody(melody, notes=None, gap_ms=10):
+    """
+    Turns [(note, seconds), ...] into an array('H') of (freq, on_ms, off_ms).
+
+    :param melody: List of (note name, duration in seconds)
+    :param notes: Optional note name -> frequency table, e.g. the script's NOTES.
+                  Names not in it fall back to note_frequency().
+    :param gap_ms: Silence after each note so repeated notes are heard separately
+    """
+    compiled = array('H')
+    for note, duration in melody:
+        frequency = notes[note] if notes and note in notes else note_frequency(note)
+        compiled.append(frequency)
+        compiled.append(int(duration * 1000 + 0.5))
+        compiled.append(gap_ms)
+    return compiled
+
+
+def parse_melodies(lines, notes=None, gap_ms=10):
+    """
+    Parses 'name: NOTE SECONDS, NOTE SECONDS, ...' lines into a dict of
+    compiled melodies.
+    """
+    melodies = {}
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        name, _, body = line.partition(':')
+        melody = []
+        for item in body.split(','):
+            note, duration = item.split()
+            melody.append((note, float(duration)))
+        melodies[name.strip()] = compile_melody(melody, notes, gap_ms)
+    return melodies
+
+
+class MelodyPlayer:
+
+    def __init__(self, buzzer, duty=700):
+        """
+        :param buzzer: machine.PWM driving the buzzer
+        :param duty: duty_u16 while a note sounds
+        """
+        self.buzzer = buzzer
+        self.duty = duty
+        self.melodies = {}
+        self._song = None
+        self._next = None
+        self._loop = False
+        self._task = None
+        self.late_ms = 0  # worst wakeup lateness seen, for tuning
+
+    def add(self, name, compiled):
+        self.melodies[name] = compiled
+
+    def load(self, path, notes=None, gap_ms=10):
+        """
+        Preloads every melody in a file. Returns the names that were loaded.
+        """
+        with open(path) as f:
+            melodies = parse_melodies(f, notes, gap_ms)
+        self.melodies.update(melodies)
+        return list(melodies)
+
+    @property
+    def playing(self):
+        return self._task is not None
+
+    def play(self, melody, loop=False, at_boundary=False):
+        """
+        Starts a melody, switching over if another one is playing. Does not block.
+
+        :param melody: Compiled melody or the name of a loaded one
+        :param loop: Repeat until stop() or the next play()
+        :param at_boundary: Let the current note finish first instead of
+                            cutting it off, for seamless switching
+        """
+        if isinstance(melody, str):
+            melody = self.melodies[melody]
+        self._next = melody
+        self._loop = loop
+        if self._task is not None and not at_boundary:
+            self._task.cancel()
+            self._task = None
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._next = None
+        self.buzzer.duty_u16(0)
+
+    async def _wait_until(self, deadline):
+        delay = time.ticks_diff(deadline, time.ticks_ms())
+        if delay > 0:
+            await asyncio.sleep_ms(delay)
+        else:
+            if -delay > self.late_ms:
+                self.late_ms = -delay
+            await asyncio.sleep_ms(0)
+
+    async def _run(self):
+        buzzer = self.buzzer
+        deadline = time.ticks_ms()
+        i = 0
+        try:
+            while True:
+                if self._next is not None:
+                    self._song = self._next
+                    self._next = None
+                    i = 0
+                song = self._song
+                if i >= len(song):
+                    if not self._loop:
+                        break
+                    i = 0
+                frequency, on_ms, off_ms = song[i], song[i + 1], song[i + 2]
+                i += 3
+                if frequency:
+                    buzzer.freq(frequency)
+                    buzzer.duty_u16(self.duty)
+                deadline = time.ticks_add(deadline, on_ms)
+                await self._wait_until(deadline)
+                buzzer.duty_u16(0)
+                deadline = time.ticks_add(deadline, off_ms)
+                await self._wait_until(deadline)
+        finally:
+            if self._task is asyncio.current_task():
+                self._task = None
+                buzzer.duty_u16(0)
@@ -0,0 +1,169 @@
+# Persistent MSA311 accelerometer driver with block reads.
+#
+# The MSA311 has no hardware FIFO, so this driver builds one: on every
+# new-data interrupt (or timer tick at the output data rate when INT1 is not
+# wired) it does a single 8-byte burst read of ACC_X..MOTION_INT_STATUS into
+# a preallocated buffer and copies the sample into a ring of fixed-size
+# blocks. Consumers wake up once per full block, not once per sample:
+#
+#     accel = MSA311(I2C(1, scl=Pin(27), sda=Pin(26), freq=400000))
+#     async for block in accel:        # array('h') view: x0, y0, z0, x1, ...
+#         ...
+#
+# Tap events from the sensor's own tap engine come in through wait_tap().
+#
+# Values are the raw left-justified 16-bit readings, same units as the old
+# MSA311.Acceleration.read_accel().
+
+import time
+from array import array
+
+import micropython
+from machine import Pin, Timer
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+ADDR = 0x62
+
+REG_PART_ID = 0x01
+REG_ACC_X_LSB = 0x02
+REG_MOTION_INT = 0x09
+REG_RANGE = 0x0F
+REG_ODR = 0x10
+REG_POWER = 0x11
+REG_INT_SET0 = 0x16
+REG_INT_SET1 = 0x17
+REG_INT_MAP0 = 0x19
+REG_INT_MAP1 = 0x1A
+REG_INT_LATCH = 0x21
+REG_TAP_DUR = 0x2A
+REG_TAP_TH = 0x2B
+
+RANGE_2G = 0x00
+RANGE_4G = 0x01
+RANGE_8G = 0x02
+RANGE_16G = 0x03
+
+ODR_HZ = {125: 0x07, 250: 0x08, 500: 0x09, 1000: 0x0A}
+
+SINGLE_TAP = 0x20
+DOUBLE_TAP = 0x10
+
+
+class MSA311:
+
+    def __init__(self, i2c, int_pin=None, odr=500, range_g=RANGE_2G, block=50, blocks=4, taps=True):
+        """
+        :param i2c: machine.I2C the sensor is on
+        :param int_pin: Pin wired to INT1, or None to poll from a timer at the ODR
+        :param odr: Output data rate in Hz (125, 250, 500 or 1000)
+        :param range_g: One of the RANGE_* constants
+        :param block: Samples per block handed to consumers
+        :param blocks: Blocks in the ring; a slow consumer loses the oldest ones
+        :param taps: Enable the sensor's single/double tap interrupts
+        """
+        self.i2c = i2c
+        self.odr = odr
+        self.block = block
+        self.blocks = blocks
+        self._ring = array('h', bytes(2 * 3 * block * blocks))
+        self._raw = bytearray(8)
+        self._write = 0   # next sample slot in the ring
+        self._filled = 0  # blocks written so far
+        self._taken = 0   # blocks handed out so far
+        self._data_flag = asyncio.ThreadSafeFlag()
+        self._tap_flag = asyncio.ThreadSafeFlag()
+        self._tap_status = 0
+        self._tap_ticks = 0
+        self.samples = 0
+        self.overruns = 0
+        self._drain_ref = self._drain  # bound once, schedule() must not allocate
+
+        self._write_reg(REG_POWER, 0x1E)               # normal mode, 500 Hz bandwidth
+        self._write_reg(REG_RANGE, range_g)
+        self._write_reg(REG_ODR, ODR_HZ[odr])          # all axes on
+        self._write_reg(REG_INT_LATCH, 0x00)           # non-latched
+        self._write_reg(REG_INT_SET1, 0x10)            # new-data interrupt
+        self._write_reg(REG_INT_MAP1, 0x01)            # new data -> INT1
+        if taps:
+            self._write_reg(REG_TAP_DUR, 0x04)         # 250 ms double tap window
+            self._write_reg(REG_TAP_TH, 0x0A)
+            self._write_reg(REG_INT_SET0, SINGLE_TAP | DOUBLE_TAP)
+            self._write_reg(REG_INT_MAP0, SINGLE_TAP | DOUBLE_TAP)
+
+        self._timer = None
+        self.int_pin = int_pin
+        if int_pin is not None:
+            int_pin.irq(handler=self._irq, trigger=Pin.IRQ_RISING, hard=True)
+        else:
+            self._timer = Timer(-1)
+            self._timer.init(mode=Timer.PERIODIC, period=max(1, 1000 // odr), callback=self._irq)
+
+    def _write_reg(self, reg, value):
+        self.i2c.writeto_mem(ADDR, reg, bytes([value]))
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.deinit()
+        if self.int_pin is not None:
+            self.int_pin.irq(handler=None)
+
+    def _irq(self, _source):
+        # Hard IRQ / timer context: I2C is not allowed here, defer to a soft IRQ
+        micropython.schedule(self._drain_ref, 0)
+
+    def _drain(self, _arg):
+        raw = self._raw
+        self.i2c.readfrom_mem_into(ADDR, REG_ACC_X_LSB, raw)  # X, Y, Z, reserved, motion status
+        ring = self._ring
+        i = self._write
+        for axis in range(3):
+            value = raw[2 * axis] | (raw[2 * axis + 1] << 8)
+            ring[i + axis] = value - 0x10000 if value & 0x8000 else value
+        self.samples += 1
+        i += 3
+        if i >= len(ring):
+            i = 0
+        self._write = i
+        if i % (3 * self.block) == 0:
+            self._filled += 1
+            self._data_flag.set()
+        status = raw[7] & (SINGLE_TAP | DOUBLE_TAP)
+        if status:
+            self._tap_status = status
+            self._tap_ticks = time.ticks_ms()
+            self._tap_flag.set()
+
+    async def read_block(self):
+        """
+        Waits for the next full block and returns a memoryview of it, straight
+        out of the ring (no copy). It stays valid until the ring wraps, i.e.
+        for blocks - 1 more blocks.
+        """
+        while self._taken == self._filled:
+            await self._data_flag.wait()
+        behind = self._filled - self._taken
+        if behind >= self.blocks:
+            # The writer lapped us: skip to the newest complete block
+            self.overruns += behind - 1
+            self._taken = self._filled - 1
+        start = (self._taken % self.blocks) * 3 * self.block
+        self._taken += 1
+        return memoryview(self._ring)[start:start + 3 * self.block]
+
+    async def wait_tap(self):
+        """
+        Waits for the sensor's tap engine. Returns (SINGLE_TAP or DOUBLE_TAP, ticks_ms).
+        """
+        await self._tap_flag.wait()
+        kind = DOUBLE_TAP if self._tap_status & DOUBLE_TAP else SINGLE_TAP
+        return kind, self._tap_ticks
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.read_block()
@@ -0,0 +1,123 @@
+# Proximity tracking for the Zombie game, indexed by zombie number.
+#
+# Per-zombie state lives in flat arrays (last seen, time it entered range,
+# flags) instead of a dict of dicts. Exit and tag deadlines go into a
+# min-heap, so poll() only looks at zombies whose deadline has come up: with
+# nobody due it is a single comparison, however many zombie numbers exist.
+#
+#     tracker = ProximityTracker(max_id=13, exit_ms=1000, tag_ms=3000)
+#     tracker.seen(5, ticks)              # on every advert, True if 5 just entered
+#     for k in range(tracker.poll()):     # every game tick
+#         kind, zombie = tracker.event(k) # EXIT or TAG
+#
+# Times are time.ticks_ms() values. Internally they are turned into
+# milliseconds since the tracker was made, so heap order survives the ticks
+# wrapping around. Deadlines are checked lazily: an exit deadline is pushed
+# when a zombie enters and, when it comes up, re-pushed from the latest
+# sighting if the zombie was heard again in the meantime. Adverts therefore
+# never touch the heap, and a zombie in range costs one heap entry per
+# exit_ms.
+
+import time
+from array import array
+
+try:
+    import heapq
+except ImportError:
+    import uheapq as heapq
+
+EXIT = 1
+TAG = 2
+
+IN_RANGE = 1
+TAGGED = 2
+
+
+class ProximityTracker:
+
+    def __init__(self, max_id, exit_ms=1000, tag_ms=3000):
+        """
+        :param max_id: Highest zombie number (numbers run 1..max_id)
+        :param exit_ms: Not heard for this long means out of range
+        :param tag_ms: Time in range before it counts as a tag
+        """
+        n = max_id + 1
+        self.max_id = max_id
+        self.exit_ms = exit_ms
+        self.tag_ms = tag_ms
+        self._last = array('i', bytes(4 * n))   # last sighting, tracker ms
+        self._start = array('i', bytes(4 * n))  # when this visit started, tracker ms
+        self._flags = bytearray(n)
+        self._heap = []
+        self._events = array('H', bytes(2 * 2 * 2 * n))  # at most an EXIT and a TAG per zombie
+        self._base_ticks = time.ticks_ms()
+        self._base_ms = 0
+        self.in_range = 0  # zombies currently in range
+
+    def _ms(self, ticks):
+        return self._base_ms + time.ticks_diff(ticks, self._base_ticks)
+
+    def is_in_range(self, zombie):
+        return bool(self._flags[zombie] & IN_RANGE)
+
+    def seen(self, zombie, ticks=None):
+        """
+        Records an advert from a zombie. Returns True if it just came into range.
+
+        :param zombie: Zombie number, 1..max_id
+        :param ticks: time.ticks_ms() the advert was heard, default now
+        """
+        t = self._ms(time.ticks_ms() if ticks is None else ticks)
+        last = self._last
+        if self._flags[zombie] & IN_RANGE:
+            if t > last[zombie]:  # batches can arrive slightly out of order
+                last[zombie] = t
+            return False
+        last[zombie] = t
+        self._start[zombie] = t
+        self._flags[zombie] = IN_RANGE
+        self.in_range += 1
+        heapq.heappush(self._heap, (t + self.exit_ms, EXIT, zombie, t))
+        heapq.heappush(self._heap, (t + self.tag_ms, TAG, zombie, t))
+        return True
+
+    def event(self, k):
+        """
+        (EXIT or TAG, zombie number) of the k-th event from the last poll().
+        """
+        return self._events[2 * k], self._events[2 * k + 1]
+
+    def poll(self, ticks=None):
+        """
+        Handles every deadline that is due. Returns the number of events,
+        read them with event().
+        """
+        if ticks is None:
+            ticks = time.ticks_ms()
+        self._base_ms += time.ticks_diff(ticks, self._base_ticks)
+        self._base_ticks = ticks
+        now = self._base_ms
+
+        heap = self._heap
+        flags = self._flags
+        events = self._events
+        count = 0
+        while heap and heap[0][0] <= now:
+            deadline, kind, zombie, visit = heapq.heappop(heap)
+            if not flags[zombie] & IN_RANGE or visit != self._start[zombie]:
+                continue  # left over from an earlier visit
+            if kind == EXIT:
+                expires = self._last[zombie] + self.exit_ms
+                if expires > now:
+                    heapq.heappush(heap, (expires, EXIT, zombie, visit))
+                    continue
+                flags[zombie] = 0
+                self.in_range -= 1
+            else:
+                if flags[zombie] & TAGGED:
+                    continue
+                flags[zombie] |= TAGGED  # one tag per visit, re-entry needed for the next
+            events[2 * count] = kind
+            events[2 * count + 1] = zombie
+            count += 1
+        return count
@@ -0,0 +1,254 @@
+# Change-only, rate-limited MQTT publishing for the OpenMV camera loops.
+#
+# The camera loops work out a command every frame and used to publish it
+# every frame, blocking on the socket each time. ChangePublisher sits in
+# between. offer() it the frame's command (None when there is nothing to say)
+# and it publishes only when the command changes, at most once per
+# min_interval_ms: a burst of changes in between is coalesced into the latest
+# one. While the same command keeps coming it is repeated every keepalive_ms,
+# so a car that missed the message catches up.
+#
+#     publisher = ChangePublisher(client, "ME35-24/mater")
+#     while True:
+#         ...
+#         if publisher.offer(command):
+#             print(command)
+#         if publisher.report_due():
+#             print(publisher.report())    # frames/s and msgs/s
+#
+# A failed publish raises as before and leaves the command pending, so it is
+# retried on the next offer().
+#
+# Both take an optional latency_trace.Tracer: offer() then takes the
+# frame's trace id as well, and the publisher marks PUBLISH when the value
+# goes out. ChangePublisher appends the id to the text command (tag()).
+# LatestPublisher with a velocity_wire encoder uses the message's sequence
+# number as its trace id, and offer() takes the id tracer.begin() gave the
+# frame so the capture time can be found.
+#
+# LatestPublisher is for measurements that change every frame, like a tag's
+# distance. The capture loop offer()s each new value into a one-slot buffer
+# (a newer value replaces an unsent one) and calls poll() once per frame.
+# poll() publishes at most rate_hz times a second, only when the socket
+# polls writable, and throws away values older than stale_ms, so a network
+# stall never holds up sensor.snapshot():
+#
+#     publisher = LatestPublisher(client, topic, rate_hz=20, stale_ms=250)
+#     while True:
+#         img = sensor.snapshot()
+#         ...
+#         publisher.offer(str(tag.z_translation))
+#         publisher.poll()
+#
+# Given a velocity_wire.Encoder, offer() takes the raw distance and its
+# capture ticks_ms, and poll() packs it as a MEASUREMENT only when it
+# publishes it. Values that are replaced or go stale never get a sequence
+# number, so the car's Decoder counts only messages lost on the way.
+
+import time
+
+try:
+    import uselect as select
+except ImportError:
+    import select
+
+
+class ChangePublisher:
+
+    def __init__(self, client, topic, min_interval_ms=100, keepalive_ms=1000, report_ms=5000, tracer=None):
+        """
+        :param client: Connected mqtt.MQTTClient
+        :param topic: Topic to publish on
+        :param min_interval_ms: Shortest time between two publishes
+        :param keepalive_ms: Repeat an unchanged command this often, 0 to never repeat it
+        :param report_ms: How often report_due() says it's time for report()
+        :param tracer: latency_trace.Tracer, or None
+        """
+        self.client = client
+        self.topic = topic
+        self.min_interval_ms = min_interval_ms
+        self.keepalive_ms = keepalive_ms
+        self.report_ms = report_ms
+        self.tracer = tracer
+        self.last = None  # last command published
+        self._pending = None
+        self._pending_trace = 0
+        self._sent_at = time.ticks_ms()  # last publish, for the keep-alive
+        self._changed_at = time.ticks_add(self._sent_at, -min_interval_ms)  # last change, for the rate limit
+        self.frames = 0
+        self.published = 0
+        self.keepalives = 0
+        self.coalesced = 0  # changes replaced by a newer one before they were sent
+        self._window_start = time.ticks_ms()
+        self._window_frames = 0
+        self._window_published = 0
+
+    def offer(self, msg, trace=0):
+        """
+        Call once per frame. Returns True if something was published.
+
+        :param trace: The frame's trace id, for the tracer
+        """
+        self.frames += 1
+        now = time.ticks_ms()
+        if msg is not None:
+            if msg != self.last:
+                if self._pending is not None and self._pending != msg:
+                    self.coalesced += 1
+                if self._pending != msg:
+                    self._pending_trace = trace
+                self._pending = msg
+            elif self._pending is not None:
+                self._pending = None  # changed and changed back before it went out
+                self.coalesced += 1
+        if self._pending is not None:
+            # Keep-alives don't count against the rate limit, only changes do
+            if time.ticks_diff(now, self._changed_at) >= self.min_interval_ms:
+                self._send(self._pending, now, self._pending_trace)
+                self._changed_at = now
+                self._pending = None
+                return True
+            return False
+        if msg is not None and self.keepalive_ms and time.ticks_diff(now, self._sent_at) >= self.keepalive_ms:
+            self._send(msg, now, trace)
+            self.keepalives += 1
+            return True
+        return False
+
+    def _send(self, msg, now, trace):
+        tracer = self.tracer
+        if tracer is None:
+            self.client.publish(self.topic, msg)
+        else:
+            self.client.publish(self.topic, tracer.tag(msg, trace))
+            tracer.published(trace)
+        self.last = msg
+        self._sent_at = now
+        self.published += 1
+
+    def report_due(self):
+        return time.ticks_diff(time.ticks_ms(), self._window_start) >= self.report_ms
+
+    def report(self):
+        """
+        Frames and messages per second since the last report, as a string.
+        """
+        now = time.ticks_ms()
+        elapsed = max(time.ticks_diff(now, self._window_start), 1)
+        fps = (self.frames - self._window_frames) * 1000 / elapsed
+        mps = (self.published - self._window_published) * 1000 / elapsed
+        self._window_start = now
+        self._window_frames = self.frames
+        self._window_published = self.published
+        return "%.1f frames/s, %.1f msgs/s (%d coalesced, %d keep-alives)" % (
+            fps, mps, self.coalesced, self.keepalives)
+
+
+class LatestPublisher:
+
+    def __init__(self, client, topic, rate_hz=20, stale_ms=250, report_ms=5000, tracer=None, encoder=None):
+        """
+        :param client: Connected mqtt.MQTTClient
+        :param topic: Topic to publish on
+        :param rate_hz: Most publishes per second
+        :param stale_ms: Values older than this are dropped instead of sent
+        :param report_ms: How often report_due() says it's time for report()
+        :param tracer: latency_trace.Tracer, or None
+        :param encoder: velocity_wire.Encoder to pack values as MEASUREMENT messages when they are published, or None
+        """
+        self.client = client
+        self.topic = topic
+        self.period_ms = 1000 // rate_hz
+        self.stale_ms = stale_ms
+        self.report_ms = report_ms
+        self.tracer = tracer
+        self.encoder = encoder
+        self._value = None
+        self._trace = 0
+        self._value_at = 0  # capture ticks_ms
+        self._due = time.ticks_ms()
+        self._poller = None
+        sock = getattr(client, 'sock', None)
+        if sock is not None:
+            self._poller = select.poll()
+            self._poller.register(sock, select.POLLOUT)
+        self.offered = 0
+        self.published = 0
+        self.dropped = 0  # replaced by a newer value before they were sent
+        self.stale = 0  # too old by the time the socket could take them
+        self.blocked = 0  # polls that found the socket not writable
+        self._window_start = time.ticks_ms()
+        self._window_offered = 0
+        self._window_published = 0
+
+    def offer(self, value, trace=0, ticks=None):
+        """
+        Puts value in the buffer, replacing an unsent one. Never blocks.
+
+        :param trace: The value's trace id, for the tracer; with an encoder,
+            the id tracer.begin() gave the frame
+        :param ticks: ticks_ms() the value was captured, now if not given
+        """
+        if self._value is not None:
+            self.dropped += 1
+        self._value = value
+        self._trace = trace
+        self._value_at = time.ticks_ms() if ticks is None else ticks
+        self.offered += 1
+
+    def writable(self):
+        if self._poller is None:
+            return True
+        for _, event in self._poller.poll(0):
+            if event & select.POLLOUT:
+                return True
+        return False
+
+    def poll(self):
+        """
+        Call once per frame. Publishes the buffered value if it is time and the
+        socket can take it. Returns True if something was published.
+        """
+        if self._value is None:
+            return False
+        now = time.ticks_ms()
+        if time.ticks_diff(now, self._due) < 0:
+            return False
+        if time.ticks_diff(now, self._value_at) > self.stale_ms:
+            self._value = None
+            self.stale += 1
+            return False
+        if not self.writable():
+            self.blocked += 1
+            return False
+        value = self._value
+        self._value = None  # gone even if publishing fails, a newer one is on its way
+        self._due = time.ticks_add(now, self.period_ms)
+        trace = self._trace
+        frame = None
+        if self.encoder is not None:
+            frame = trace
+            trace = self.encoder.seq  # numbered only now that it goes out
+            value = self.encoder.measurement(value, ticks=self._value_at)
+        self.client.publish(self.topic, value)
+        if self.tracer is not None:
+            self.tracer.published(trace, frame)
+        self.published += 1
+        return True
+
+    def report_due(self):
+        return time.ticks_diff(time.ticks_ms(), self._window_start) >= self.report_ms
+
+    def report(self):
+        """
+        Values offered and published per second since the last report, as a string.
+        """
+        now = time.ticks_ms()
+        elapsed = max(time.ticks_diff(now, self._window_start), 1)
+        offered = (self.offered - self._window_offered) * 1000 / elapsed
+        published = (self.published - self._window_published) * 1000 / elapsed
+        self._window_start = now
+        self._window_offered = self.offered
+        self._window_published = self.published
+        return "%.1f values/s, %.1f msgs/s (%d dropped, %d stale, %d blocked)" % (
+            offered, published, self.dropped, self.stale, self.blocked)
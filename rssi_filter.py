@@ -0,0 +1,81 @@
+# Per-zombie RSSI smoothing with enter/exit hysteresis.
+#
+# A single BLE RSSI reading easily jumps 5-10 dB between adverts, so comparing
+# each one against one threshold makes a human standing still flap in and
+# out of range. RssiFilter keeps an exponentially weighted moving average per
+# zombie number and only calls a zombie near once the average rises above
+# enter_dbm. It stays near until the average falls below exit_dbm, a few dB
+# lower.
+#
+#     rssi = RssiFilter(max_id=13, enter_dbm=-60, exit_dbm=-66)
+#     if rssi.update(zombie, reading, ticks):
+#         ...  # near
+#
+# State is three preallocated arrays. Averages are kept in 1/16 dB fixed
+# point so the update is integer-only. A zombie not heard for reset_ms starts
+# over from its next reading, so an old average does not linger.
+
+import time
+from array import array
+
+SCALE = 16  # fixed point: averages are stored as dBm * 16
+
+
+class RssiFilter:
+
+    def __init__(self, max_id, enter_dbm=-60, exit_dbm=-66, shift=2, reset_ms=3000):
+        """
+        :param max_id: Highest zombie number (numbers run 1..max_id)
+        :param enter_dbm: Average RSSI at or above which a zombie becomes near
+        :param exit_dbm: Average RSSI below which a near zombie is no longer near
+        :param shift: Smoothing, each reading moves the average by 1 / 2**shift
+        :param reset_ms: Forget the average after this long without a reading
+        """
+        n = max_id + 1
+        self.enter = enter_dbm * SCALE
+        self.exit = exit_dbm * SCALE
+        self.shift = shift
+        self.reset_ms = reset_ms
+        self._avg = array('h', bytes(2 * n))
+        self._last = array('i', bytes(4 * n))
+        self._state = bytearray(n)  # 0 unseen, 1 far, 2 near
+        self.transitions = 0  # near/far changes, for tuning
+
+    def average(self, zombie):
+        """
+        Smoothed RSSI of a zombie in dBm, or None if it has not been heard.
+        """
+        if not self._state[zombie]:
+            return None
+        return self._avg[zombie] / SCALE
+
+    def update(self, zombie, rssi, ticks=None):
+        """
+        Adds a reading. Returns True while the zombie counts as near.
+
+        :param zombie: Zombie number, 1..max_id
+        :param rssi: Raw RSSI in dBm
+        :param ticks: time.ticks_ms() of the reading, default now
+        """
+        if ticks is None:
+            ticks = time.ticks_ms()
+        state = self._state[zombie]
+        sample = rssi * SCALE
+        if not state or time.ticks_diff(ticks, self._last[zombie]) > self.reset_ms:
+            avg = sample
+            if state == 2:
+                self.transitions += 1
+            state = 1
+        else:
+            avg = self._avg[zombie]
+            avg += (sample - avg) >> self.shift
+        self._avg[zombie] = avg
+        self._last[zombie] = ticks
+        if state == 1 and avg >= self.enter:
+            state = 2
+            self.transitions += 1
+        elif state == 2 and avg < self.exit:
+            state = 1
+            self.transitions += 1
+        self._state[zombie] = state
+        return state == 2
@@ -0,0 +1,129 @@
+# Adaptive BLE scan duty cycling for the Zombie human.
+#
+# Scanning all game long is what drains the battery. ScanScheduler switches
+# the scanner on and off from a task instead: while zombies are around it
+# scans continuously, and when nothing has been heard for hold_ms it backs
+# off one level at a time to short scan windows at longer and longer
+# intervals. A single nearby advert puts it straight back to continuous.
+#
+#     scheduler = ScanScheduler(scanner)
+#     asyncio.create_task(scheduler.run())
+#     ...
+#     scheduler.heard(rssi)   # from the advert handler
+#
+# levels are scan intervals in ms; 0 means continuous. Each non-zero level
+# scans for window_ms at the start of each interval, so the worst-case delay
+# before an advertising zombie is first heard is about
+# interval - window_ms + the advertising interval. Keep the longest level
+# well under proximity_duration: the tag timer only starts once a zombie has
+# been heard.
+
+import time
+from array import array
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+
+class ScanScheduler:
+
+    DEFAULT_LEVELS = (0, 250, 500, 1000)
+
+    def __init__(self, scanner, levels=DEFAULT_LEVELS, window_ms=120, hold_ms=5000, wake_dbm=-75):
+        """
+        :param scanner: Scanner with scan() and stop_scan(), e.g. zombie_advert.ZombieScanner
+        :param levels: Scan intervals in ms from fastest to slowest, 0 = continuous
+        :param window_ms: Scan time per interval; a bit over the 100 ms advertising interval
+        :param hold_ms: Quiet time before backing off one level
+        :param wake_dbm: Adverts at least this strong count as something nearby
+        """
+        self.scanner = scanner
+        self.levels = levels
+        self.window_ms = window_ms
+        self.hold_ms = hold_ms
+        self.wake_dbm = wake_dbm
+        self.level = 0
+        self._last_heard = time.ticks_ms()
+        self._scanning = False
+        self._since = time.ticks_ms()
+        self._wake = asyncio.Event()
+        self._running = False
+        self.level_ms = array('i', bytes(4 * len(levels)))  # time spent at each level
+        self.scan_ms = 0  # radio time actually spent scanning
+        self.wakeups = 0  # back-off levels cancelled by an advert
+
+    def heard(self, rssi):
+        """
+        Called for every zombie advert. Strong enough ones reset the back-off.
+        """
+        if rssi < self.wake_dbm:
+            return
+        self._last_heard = time.ticks_ms()
+        if self.level:
+            self.wakeups += 1
+            self._set_level(0)
+            self._wake.set()
+
+    def _account(self):
+        now = time.ticks_ms()
+        spent = time.ticks_diff(now, self._since)
+        self.level_ms[self.level] += spent
+        if self._scanning:
+            self.scan_ms += spent
+        self._since = now
+
+    def _set_level(self, level):
+        self._account()
+        self.level = level
+
+    def _scan(self, on):
+        if on == self._scanning:
+            return
+        self._account()
+        self._scanning = on
+        if on:
+            self.scanner.scan(0)
+        else:
+            self.scanner.stop_scan()
+
+    def duty(self):
+        """
+        Fraction of the time spent scanning so far.
+        """
+        self._account()
+        total = sum(self.level_ms)
+        return self.scan_ms / total if total else 1.0
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        self._scan(False)
+
+    async def _sleep(self, ms):
+        # Sleeps, but returns early if heard() wants continuous scanning again
+        self._wake.clear()
+        try:
+            await asyncio.wait_for(self._wake.wait(), ms / 1000)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self):
+        self._running = True
+        self._last_heard = time.ticks_ms()
+        while self._running:
+            quiet = time.ticks_diff(time.ticks_ms(), self._last_heard)
+            if quiet >= self.hold_ms * (self.level + 1) and self.level < len(self.levels) - 1:
+                self._set_level(self.level + 1)  # one level per hold_ms of quiet
+            interval = self.levels[self.level]
+            if interval == 0:
+                self._scan(True)
+                await self._sleep(self.hold_ms)
+            else:
+                self._scan(True)
+                await asyncio.sleep_ms(self.window_ms)
+                if self.levels[self.level] == 0 or not self._running:  # heard() during the window
+                    continue
+                self._scan(False)
+                await self._sleep(interval - self.window_ms)
@@ -0,0 +1,135 @@
+# Append-only binary journal of Zombie game events.
+#
+# The old code reopened tag_data.txt in 'w' mode and rewrote every count as
+# text on every tag, from inside the event loop. This journal appends fixed
+# 8-byte records instead:
+#
+#     kind (B)  zombie (B)  count (H)  ms since the game started (I)
+#
+# A TAG record carries the zombie's running tag count, so the latest TAG per
+# zombie is its total. A game ends at the third tag by one zombie, so a
+# journal stays at a few hundred bytes and is never compacted; each game
+# starts a new file. Records are packed into a preallocated buffer and
+# written by a background task flush_ms after the first one was buffered,
+# one write per batch. A full buffer is flushed on the spot.
+#
+#     journal = TagJournal('tag_journal.bin')
+#     asyncio.create_task(journal.run())
+#     journal.tag(zombie_number)
+#
+# decode() works on the host too; tools/decode_tag_journal.py uses it to
+# turn a journal copied off the board back into per-zombie counts.
+
+import os
+import struct
+import time
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+RECORD = '<BBHI'
+RECORD_SIZE = 8
+
+START = 1      # a new game; count is unused
+TAG = 2        # tagged by zombie; count is that zombie's total so far
+ZOMBIFIED = 3  # the human turned into zombie; ms is how long they lasted
+
+NAMES = {START: 'start', TAG: 'tag', ZOMBIFIED: 'zombified'}
+
+
+def decode(data):
+    """
+    Yields (kind, zombie, count, ms) for every whole record in a journal.
+    """
+    for offset in range(0, len(data) - RECORD_SIZE + 1, RECORD_SIZE):
+        yield struct.unpack_from(RECORD, data, offset)
+
+
+def totals(data):
+    """
+    Rebuilds {zombie: tag count} and the lasted time in ms (or None) from a
+    journal.
+    """
+    counts = {}
+    lasted = None
+    for kind, zombie, count, ms in decode(data):
+        if kind == TAG:
+            counts[zombie] = count
+        elif kind == ZOMBIFIED:
+            lasted = ms
+    return counts, lasted
+
+
+class TagJournal:
+
+    def __init__(self, path='tag_journal.bin', buffer_records=16, flush_ms=2000):
+        """
+        Starts a new game. The previous game's journal, if any, is kept as
+        path + '.old'.
+
+        :param path: Journal file
+        :param buffer_records: Records held in RAM before a flush is forced
+        :param flush_ms: How long a record may wait in RAM
+        """
+        self.path = path
+        self.flush_ms = flush_ms
+        self._buf = bytearray(RECORD_SIZE * buffer_records)
+        self._used = 0
+        self._flag = asyncio.Event()
+        self._start = time.ticks_ms()
+        self.counts = {}
+        self.size = 0  # bytes in the file
+        self.flushes = 0
+        try:
+            os.rename(path, path + '.old')
+        except OSError:
+            pass
+        with open(path, 'wb'):
+            pass
+        self._append(START, 0, 0)
+
+    def _append(self, kind, zombie, count):
+        if self._used == len(self._buf):
+            self.flush()  # full: the background task has fallen behind
+        ms = time.ticks_diff(time.ticks_ms(), self._start)
+        struct.pack_into(RECORD, self._buf, self._used, kind, zombie, count, ms)
+        self._used += RECORD_SIZE
+        if self._used == RECORD_SIZE:
+            self._flag.set()  # first record of a batch, start the flush timer
+
+    def tag(self, zombie):
+        """
+        Records a tag and returns that zombie's total.
+        """
+        count = self.counts.get(zombie, 0) + 1
+        self.counts[zombie] = count
+        self._append(TAG, zombie, count)
+        return count
+
+    def zombified(self, zombie):
+        self._append(ZOMBIFIED, zombie, self.counts.get(zombie, 0))
+
+    def flush(self):
+        """
+        Writes buffered records out now.
+        """
+        if not self._used:
+            return
+        with open(self.path, 'ab') as f:
+            f.write(memoryview(self._buf)[:self._used])
+        self.size += self._used
+        self._used = 0
+        self.flushes += 1
+
+    async def run(self):
+        """
+        Background flusher: writes a batch flush_ms after its first record.
+        """
+        while True:
+            if not self._used:
+                await self._flag.wait()
+            self._flag.clear()
+            await asyncio.sleep_ms(self.flush_ms)
+            self.flush()
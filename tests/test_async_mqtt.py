@@ -0,0 +1,82 @@
+# async_mqtt against a local broker that hangs up, on the host's asyncio.
+#
+#   python -m pytest tests
+
+import asyncio
+import errno
+import unittest
+
+from async_mqtt import MQTTClient
+
+
+class FlakyBroker:
+    # Accepts every connection with a CONNACK, then hangs up on the first one
+
+    def __init__(self):
+        self.connections = 0
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        await reader.read(64)  # CONNECT
+        writer.write(b'\x20\x02\x00\x00')
+        await writer.drain()
+        if self.connections == 1:
+            writer.close()
+            return
+        while await reader.read(64):
+            pass
+        writer.close()
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+class PublishWhileDisconnected(unittest.IsolatedAsyncioTestCase):
+
+    async def test_before_connect(self):
+        client = MQTTClient('test', '127.0.0.1')
+        with self.assertRaises(OSError) as raised:
+            await client.publish('ME35-24_bhs/stats', 'x')
+        self.assertEqual(raised.exception.args[0], errno.ENOTCONN)
+        self.assertEqual(client.published, 0)
+
+    async def test_while_reconnecting(self):
+        broker = FlakyBroker()
+        port = await broker.start()
+        client = MQTTClient('test', '127.0.0.1', port, keepalive=0, reconnect_delay=0.2)
+        await client.connect()
+        runner = asyncio.create_task(client.run())
+        try:
+            # The broker hangs up, run() drops the writer and waits to reconnect
+            for _ in range(50):
+                if client._writer is None:
+                    break
+                await asyncio.sleep(0.01)
+            self.assertIsNone(client._writer)
+            # What a stats task does: a failed publish is an OSError it can catch
+            with self.assertRaises(OSError) as raised:
+                await client.publish('ME35-24_bhs/stats', 'x')
+            self.assertEqual(raised.exception.args[0], errno.ENOTCONN)
+            # and the next one goes out once run() has reconnected
+            for _ in range(100):
+                if client._writer is not None:
+                    break
+                await asyncio.sleep(0.01)
+            await client.publish('ME35-24_bhs/stats', 'x')
+            self.assertEqual(client.published, 1)
+            self.assertEqual(broker.connections, 2)
+        finally:
+            runner.cancel()
+            await asyncio.gather(runner, return_exceptions=True)
+            await client.disconnect()
+            await broker.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
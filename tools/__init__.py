@@ -0,0 +1,4 @@
+"""
+Host-side tools for files copied off the boards and messages they publish.
+Run from the repo root, e.g. python -m tools.decode_tag_journal tag_journal.bin
+"""
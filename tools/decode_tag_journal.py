@@ -0,0 +1,38 @@
+# Decodes a Zombie tag journal (tag_journal.bin) copied off the board.
+#
+#   python -m tools.decode_tag_journal tag_journal.bin
+#   python -m tools.decode_tag_journal tag_journal.bin --records
+#
+# Prints the per-zombie tag counts in the same words the old tag_data.txt
+# used, and with --records every record in the file.
+
+import argparse
+
+from tag_journal import NAMES, RECORD_SIZE, decode, totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode a Zombie tag journal.")
+    parser.add_argument('journal', nargs='+', help="tag_journal.bin (or .old) files")
+    parser.add_argument('--records', action='store_true', help="also list every record")
+    args = parser.parse_args()
+
+    for path in args.journal:
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(args.journal) > 1:
+            print(f"{path}:")
+        if len(data) % RECORD_SIZE:
+            print(f"  ({len(data) % RECORD_SIZE} trailing bytes ignored, the last write was cut short)")
+        if args.records:
+            for kind, zombie, count, ms in decode(data):
+                print(f"  {ms / 1000:9.3f} s  {NAMES.get(kind, kind):<10} zombie {zombie:<3} count {count}")
+        counts, lasted = totals(data)
+        for zombie in sorted(counts):
+            print(f"Zombie {zombie} tagged {counts[zombie]} times.")
+        if lasted is not None:
+            print(f"This human lasted {lasted / 1000:.1f} seconds before being zombified!")
+
+
+if __name__ == '__main__':
+    main()
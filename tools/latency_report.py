@@ -0,0 +1,203 @@
+# Frame-to-motor latency per stage, from the boards' latency_trace records.
+#
+# Connects to the broker the boards use, sends a clock probe every few
+# seconds on latency_trace.PING_TOPIC, and collects the pongs and trace
+# records from latency_trace.TOPIC. Each board's ticks_us() is put on the
+# host's clock with the probe that had the shortest round trip among the
+# last few (half the round trip is the error bound), so stages on different
+# boards can be compared. After --seconds (or Ctrl-C) it prints, per car:
+#
+#   capture -> publish    camera: snapshot to the publish returning
+#   publish -> receive    broker and WiFi, across boards
+#   receive -> actuate    car: callback to duty_u16
+#   capture -> actuate    the whole way
+#
+# with percentiles and a histogram, and how well each board's clock is known.
+#
+#   python -m tools.latency_report --seconds 60
+#   python -m tools.latency_report --broker 127.0.0.1 --port 1883
+#
+# One traced camera per broker: trace ids are only unique per camera.
+
+import argparse
+import asyncio
+import time
+
+import latency_trace
+from async_mqtt import MQTTClient
+from latency_trace import ACTUATE, CAPTURE, PONG, PUBLISH, RECEIVE, RECORDS, STAGES
+
+TICKS_PERIOD = 1 << 30  # MicroPython's ticks_us() wraps here
+PAIRS = ((CAPTURE, PUBLISH), (PUBLISH, RECEIVE), (RECEIVE, ACTUATE), (CAPTURE, ACTUATE))
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def ticks_diff(a, b):
+    return (a - b + TICKS_PERIOD // 2) % TICKS_PERIOD - TICKS_PERIOD // 2
+
+
+def host_us():
+    return time.perf_counter_ns() // 1000
+
+
+class Collector:
+
+    def __init__(self, window=8):
+        """
+        :param window: Clock probes per board to pick the shortest round trip from
+        """
+        self.window = window
+        self.samples = {}  # board -> [(host_us at the middle of the round trip, ticks, round trip us)]
+        self.pending = {}  # board -> records that arrived before its first pong
+        self.senders = {}  # trace id -> {CAPTURE: host_us, PUBLISH: host_us}
+        self.receivers = {}  # trace id -> {board: {RECEIVE: host_us, ACTUATE: host_us}}
+        self.probes = {}  # probe -> host_us it was sent
+        self._probe = 0
+
+    def ping(self, now=None):
+        """
+        Next clock probe for PING_TOPIC.
+        """
+        self._probe += 1
+        self.probes[self._probe] = host_us() if now is None else now
+        return latency_trace.ping(self._probe)
+
+    def feed(self, msg, now=None):
+        """
+        Takes one message from TOPIC.
+        """
+        now = host_us() if now is None else now
+        decoded = latency_trace.decode(msg)
+        if decoded is None:
+            return
+        kind, board, body = decoded
+        if kind == PONG:
+            probe, ticks = body
+            sent = self.probes.get(probe)
+            if sent is None:
+                return
+            samples = self.samples.setdefault(board, [])
+            samples.append(((sent + now) // 2, ticks, now - sent))
+            del samples[:-self.window]
+            for record in self.pending.pop(board, []):
+                self._add(board, *record)
+        elif kind == RECORDS:
+            if board not in self.samples:
+                self.pending.setdefault(board, []).extend(body)
+                return
+            for record in body:
+                self._add(board, *record)
+
+    def reference(self, board):
+        """
+        (host_us, ticks, round trip us) of the board's best clock probe.
+        """
+        return min(self.samples[board], key=lambda sample: sample[2])
+
+    def _add(self, board, trace_id, stage, ticks):
+        ref_host, ref_ticks, _ = self.reference(board)
+        t = ref_host + ticks_diff(ticks, ref_ticks)
+        if stage in (CAPTURE, PUBLISH):
+            self.senders.setdefault(trace_id, {})[stage] = t
+        else:
+            self.receivers.setdefault(trace_id, {}).setdefault(board, {})[stage] = t
+
+    def latencies(self):
+        """
+        {board: {(from stage, to stage): [us, ...]}} for every receiving board.
+        """
+        result = {}
+        for trace_id, boards in self.receivers.items():
+            times = self.senders.get(trace_id, {})
+            for board, stages in boards.items():
+                merged = dict(times)
+                merged.update(stages)
+                per_board = result.setdefault(board, {pair: [] for pair in PAIRS})
+                for start, end in PAIRS:
+                    if start in merged and end in merged:
+                        per_board[(start, end)].append(merged[end] - merged[start])
+        return result
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def histogram(values, width=40):
+    counts = [0] * (len(BUCKETS_MS) + 1)
+    for us in values:
+        k = 0
+        while k < len(BUCKETS_MS) and us >= BUCKETS_MS[k] * 1000:
+            k += 1
+        counts[k] += 1
+    top = max(counts)
+    lines = []
+    lower = 0
+    for k, count in enumerate(counts):
+        label = f"{lower}-{BUCKETS_MS[k]} ms" if k < len(BUCKETS_MS) else f">{lower} ms"
+        if count:
+            lines.append(f"      {label:>12} {count:>6} {'#' * max(1, count * width // top)}")
+        lower = BUCKETS_MS[k] if k < len(BUCKETS_MS) else lower
+    return lines
+
+
+def format_report(collector):
+    lines = []
+    for board in sorted(collector.samples):
+        rtt = collector.reference(board)[2]
+        lines.append(f"{board}: clock known to +-{rtt / 2000:.1f} ms ({len(collector.samples[board])} probes)")
+    latencies = collector.latencies()
+    if not latencies:
+        lines.append("no traced commands received yet")
+    for board, pairs in sorted(latencies.items()):
+        lines.append(f"\n{board}")
+        for (start, end), values in pairs.items():
+            name = f"{STAGES[start]} -> {STAGES[end]}"
+            if not values:
+                lines.append(f"  {name:<22} no samples")
+                continue
+            ms = [v / 1000 for v in values]
+            lines.append(f"  {name:<22} n={len(values):<5} p50 {percentile(ms, 50):7.1f}  p90 {percentile(ms, 90):7.1f}"
+                         f"  p99 {percentile(ms, 99):7.1f}  max {max(ms):7.1f} ms")
+            lines.extend(histogram(values))
+    return '\n'.join(lines)
+
+
+async def collect(collector, broker, port, seconds, ping_s):
+    def callback(topic, msg):
+        collector.feed(msg)
+
+    client = MQTTClient('latency_report', broker, port, keepalive=60)
+    client.set_callback(callback)
+    await client.connect()
+    await client.subscribe(latency_trace.TOPIC)
+    reader = asyncio.create_task(client.run())
+    try:
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            await client.publish(latency_trace.PING_TOPIC, collector.ping())
+            await asyncio.sleep(min(ping_s, max(end - time.monotonic(), 0)))
+    finally:
+        reader.cancel()
+        await client.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frame-to-motor latency histograms from the boards' traces.")
+    parser.add_argument('--broker', default='broker.hivemq.com')
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--seconds', type=float, default=60.0, help="how long to collect")
+    parser.add_argument('--ping-s', type=float, default=2.0, help="seconds between clock probes")
+    args = parser.parse_args()
+
+    collector = Collector()
+    try:
+        asyncio.run(collect(collector, args.broker, args.port, args.seconds, args.ping_s))
+    except KeyboardInterrupt:
+        pass  # report what came in so far
+    print(format_report(collector))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# Command dispatch for the Remote control tow truck cars.
+#
+# leftmotor.py and rightmotor.py used to decode every payload to a str,
+# print it, walk an if/elif chain of string compares, set four drive flags
+# and call a method that checked them again. TowDispatch looks the raw
+# payload bytes up in one dict built at start-up, which maps each command
+# straight to what it does to the motor:
+#
+#     "1.00, 0.00"   start: drive commands move the motor from now on
+#     "0.00, 1.00"   stop: motor off, drive commands ignored
+#     "forward"      (0, 65535)   if started
+#     "right"        (0, 65535)   if started
+#     "left"         (0, 0)       if started
+#     "backward"     (50000, 0)   if started
+#
+# The duty pairs are (motor a, motor b) tuples made once, and duty_u16() is
+# only called when the pair changes. Nothing is allocated or printed per
+# message; unknown payloads are counted.
+#
+#     dispatch = TowDispatch(motor1_a, motor1_b)
+#     ...
+#     if dispatch(msg):            # from the MQTT callback, msg as received
+#         ...                      # the motor's duty was just set from msg
+
+START = b'1.00, 0.00'
+STOP = b'0.00, 1.00'
+
+OFF = (0, 0)
+
+# payload -> (motor on after it, duty pair or None); on is None for drive
+# commands, which leave it as it is and only move a started motor
+COMMANDS = {
+    START: (True, None),
+    STOP: (False, OFF),
+    b'forward': (None, (0, 65535)),
+    b'right': (None, (0, 65535)),
+    b'left': (None, OFF),
+    b'backward': (None, (50000, 0)),
+}
+
+
+class TowDispatch:
+
+    def __init__(self, motor_a, motor_b, commands=COMMANDS):
+        """
+        :param motor_a: PWM for the motor's first input
+        :param motor_b: PWM for its second input
+        :param commands: Payload bytes -> (motor on, duty pair), see COMMANDS
+        """
+        self.motor_a = motor_a
+        self.motor_b = motor_b
+        self.commands = commands
+        self.motor_on = False
+        self.duty = None  # last pair written, None before the first
+        self.handled = 0
+        self.unknown = 0
+
+    def __call__(self, msg):
+        """
+        Acts on one payload. Returns True if it set the motor's duty.
+        """
+        command = self.commands.get(msg)
+        if command is None:
+            self.unknown += 1
+            return False
+        self.handled += 1
+        on, duty = command
+        if on is not None:
+            self.motor_on = on
+        elif not self.motor_on:
+            return False
+        if duty is None or duty == self.duty:
+            return False
+        self.duty = duty
+        self.motor_a.duty_u16(duty[0])
+        self.motor_b.duty_u16(duty[1])
+        return True
@@ -0,0 +1,220 @@
+# Fixed-rate PID distance controller for the Velocity Controlled Truck.
+#
+# micropico.py used to set the motor duty inside the MQTT callback, so the
+# car was only controlled when a message arrived and kept its last duty
+# forever when they stopped. VelocityController runs as its own task, every
+# period_ms on ticks_ms deadlines. The callback only hands it the newest
+# measurement (the tag's z_translation) and, now and then, a new target:
+#
+#     controller = VelocityController(((motor1_b, motor1_a), (motor2_a, motor2_b)), target=-3 * SCALE)
+#     asyncio.create_task(controller.run())
+#     ...
+#     controller.measure(decoder.value(0), decoder.ticks)   # from the callback
+#
+# Each step it extrapolates the newest measurement to now with its smoothed
+# rate of change (worked out on the capture ticks, so network jitter doesn't
+# show up as speed; the D term uses the same rate), runs PID on target - measurement, and writes the duty to every
+# (forward, backward) PWM pair. The integral stops growing while the output
+# is saturated (anti-windup), the duty changes by at most slew per second,
+# and the motors stop if no measurement has arrived for stale_ms.
+#
+# Measurements and targets are in velocity_wire's fixed-point units, so the
+# gains are duty per unit of SCALE. report() gives loop rate and timing
+# (how late the steps ran, overruns, step time) for publishing.
+
+import time
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+MAX_DUTY = 65535
+
+
+class VelocityController:
+
+    def __init__(self, channels, target, kp=12.0, ki=4.0, kd=1.0, period_ms=20, stale_ms=300,
+                 slew=600000, rate_smoothing=0.1, reverse=False, report_ms=5000, tracer=None):
+        """
+        :param channels: (forward PWM, backward PWM) for each motor
+        :param target: Measurement to hold, in velocity_wire units
+        :param kp: Duty per unit of error
+        :param ki: Duty per unit of error per second
+        :param kd: Duty per unit of measurement change per second
+        :param period_ms: Control period
+        :param stale_ms: Stop the motors when the newest measurement is older than this
+        :param slew: Most duty change per second
+        :param rate_smoothing: Weight of each new sample in the measurement's rate of change, 0-1
+        :param reverse: Drive backwards for negative outputs, otherwise stop at 0
+        :param report_ms: How often report_due() says it's time for report()
+        :param tracer: latency_trace.Tracer to mark ACTUATE on, or None
+        """
+        self.channels = channels
+        self.target = target
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.period_ms = period_ms
+        self.stale_ms = stale_ms
+        self.slew_step = slew * period_ms // 1000
+        self.rate_smoothing = rate_smoothing
+        self.min_duty = -MAX_DUTY if reverse else 0
+        self.report_ms = report_ms
+        self.tracer = tracer
+        self._trace = 0  # trace id of the newest measurement, until a step has used it
+        self.enabled = True
+        self.duty = 0  # last duty written, negative is backwards
+        self.integral = 0.0
+        self._value = None
+        self._rate = 0.0  # measurement units per ms
+        self._received = 0  # ticks_ms the newest measurement arrived
+        self._captured = 0  # its capture ticks, sender's clock
+        self._running = False
+        # Timing, since the start and since the last report
+        self.steps = 0
+        self.overruns = 0  # deadlines missed by a whole period, skipped
+        self.stale_stops = 0
+        self.late_max_ms = 0
+        self.step_max_us = 0
+        self._late_sum = 0
+        self._window_start = time.ticks_ms()
+        self._window_steps = 0
+
+    def measure(self, value, ticks=None, trace=0):
+        """
+        New measurement. Call from the message callback; never blocks.
+
+        :param ticks: Capture ticks_ms on the sender's clock, for the rate
+        :param trace: Its trace id, marked ACTUATE by the step that uses it
+        """
+        now = time.ticks_ms()
+        if ticks is None:
+            ticks = now
+        if self._value is not None and not self._stale(now):
+            dt = time.ticks_diff(ticks, self._captured)
+            if dt > 0:
+                # Smoothed: the difference of two noisy samples is mostly noise
+                self._rate += ((value - self._value) / dt - self._rate) * self.rate_smoothing
+        else:
+            self._rate = 0.0
+        self._value = value
+        self._received = now
+        self._captured = ticks
+        self._trace = trace
+
+    def set_target(self, target):
+        self.target = target
+
+    def enable(self, on):
+        self.enabled = on
+        if not on:
+            self._reset()
+
+    def _stale(self, now):
+        return time.ticks_diff(now, self._received) > self.stale_ms
+
+    def _reset(self):
+        self.integral = 0.0
+        self._write(0)
+
+    def _write(self, duty):
+        """
+        Sets both motors to duty. Returns True if that changed their duty.
+        """
+        if duty == self.duty:
+            return False
+        self.duty = duty
+        forward = duty if duty > 0 else 0
+        backward = -duty if duty < 0 else 0
+        for fwd, back in self.channels:
+            # Release one side before driving the other
+            if forward:
+                back.duty_u16(0)
+                fwd.duty_u16(forward)
+            else:
+                fwd.duty_u16(0)
+                back.duty_u16(backward)
+        return True
+
+    def step(self, now=None):
+        """
+        One control step. run() calls this every period_ms.
+        """
+        if now is None:
+            now = time.ticks_ms()
+        if not self.enabled or self._value is None:
+            return
+        if self._stale(now):
+            if self.duty or self.integral:
+                self.stale_stops += 1
+                self._reset()
+            return
+        dt = self.period_ms / 1000
+        estimate = self._value + self._rate * time.ticks_diff(now, self._received)
+        error = self.target - estimate
+        # Derivative on the measurement, so target changes don't kick
+        pd = self.kp * error - self.kd * self._rate * 1000
+        integral = max(self.min_duty, min(MAX_DUTY, self.integral + self.ki * error * dt))
+        out = pd + integral
+        # Integrate only while that doesn't push further into saturation
+        if not (out > MAX_DUTY and error > 0 or out < self.min_duty and error < 0):
+            self.integral = integral
+        out = pd + self.integral
+        duty = int(max(self.min_duty, min(MAX_DUTY, out)))
+        step = self.slew_step
+        if duty > self.duty + step:
+            duty = self.duty + step
+        elif duty < self.duty - step:
+            duty = self.duty - step
+        wrote = self._write(duty)
+        if self._trace:
+            # A measurement that left the duty as it was never reaches the motors
+            if wrote and self.tracer is not None:
+                self.tracer.actuated(self._trace)
+            self._trace = 0
+
+    async def run(self):
+        self._running = True
+        deadline = time.ticks_ms()
+        while self._running:
+            now = time.ticks_ms()
+            late = time.ticks_diff(now, deadline)
+            if late >= self.period_ms:
+                # Missed whole periods: skip them rather than catching up in a burst
+                self.overruns += late // self.period_ms
+                deadline = time.ticks_add(deadline, late // self.period_ms * self.period_ms)
+                late %= self.period_ms
+            self.late_max_ms = max(self.late_max_ms, late)
+            self._late_sum += late
+            start = time.ticks_us()
+            self.step(now)
+            self.step_max_us = max(self.step_max_us, time.ticks_diff(time.ticks_us(), start))
+            self.steps += 1
+            deadline = time.ticks_add(deadline, self.period_ms)
+            await asyncio.sleep_ms(max(time.ticks_diff(deadline, time.ticks_ms()), 0))
+
+    def stop(self):
+        self._running = False
+        self._reset()
+
+    def report_due(self):
+        return time.ticks_diff(time.ticks_ms(), self._window_start) >= self.report_ms
+
+    def report(self):
+        """
+        Steps per second and timing since the last report, as a string.
+        """
+        now = time.ticks_ms()
+        elapsed = max(time.ticks_diff(now, self._window_start), 1)
+        steps = self.steps - self._window_steps
+        rate = steps * 1000 / elapsed
+        late_mean = self._late_sum / steps if steps else 0.0
+        text = "%.1f steps/s, late mean %.1f max %d ms, step max %d us, %d overruns, %d stale stops, duty %d" % (
+            rate, late_mean, self.late_max_ms, self.step_max_us, self.overruns, self.stale_stops, self.duty)
+        self._window_start = now
+        self._window_steps = self.steps
+        self._late_sum = 0
+        self.late_max_ms = 0
+        self.step_max_us = 0
+        return text
@@ -0,0 +1,182 @@
+# Binary messages between the Velocity Controlled Truck's camera and Pico.
+#
+# The camera used to publish str(tag.z_translation) and the Pico ran
+# float(msg.decode()) on everything, including the "on"/"off" control
+# messages, which raised. Each message is now an 8-byte little-endian header
+# and count signed 32-bit values:
+#
+#     0  type     MEASUREMENT, SETPOINT, ON or OFF
+#     1  count    values that follow (0 for ON / OFF)
+#     2  seq      u16, one more per message, wraps
+#     4  ticks    u32, sender's time.ticks_ms() when the data was captured
+#     8  values   i32 each, fixed point: the real value times SCALE
+#
+# A MEASUREMENT is what the camera saw (the tag's z_translation), a
+# SETPOINT a new target for the car. They share the sequence with the
+# control commands, so a late one can't overtake an OFF. The camera packs
+# with Encoder:
+#
+#     wire = Encoder()
+#     publisher.offer(wire.measurement(tag.z_translation, ticks=captured))
+#
+# and the Pico reads the received bytes in place with Decoder, without
+# decoding them into a string or float:
+#
+#     kind = decoder.feed(msg)
+#     if kind == MEASUREMENT:
+#         z = decoder.value(0)           # z_translation * SCALE, an int
+#
+# feed() returns 0 for anything that isn't a message (text from another
+# client on the topic) and for messages older than one already handled, and
+# counts those, and the messages lost in between, for report().
+
+import struct
+import time
+
+SETPOINT = 1
+ON = 2
+OFF = 3
+MEASUREMENT = 4
+
+SCALE = 10000
+HEADER_SIZE = 8
+MAX_VALUES = 4
+
+_HEADER = '<BBHI'
+_LIMIT = 0x7FFFFFFF
+
+# A sequence number at most this far behind the last one is a late message,
+# anything further back means the sender restarted (a restart less than
+# this many messages in is taken for late messages until it catches up)
+REORDER_WINDOW = 64
+
+
+class Encoder:
+
+    def __init__(self):
+        self.seq = 0
+
+    def _next(self):
+        seq = self.seq
+        self.seq = (seq + 1) & 0xFFFF
+        return seq
+
+    def setpoint(self, *values, ticks=None):
+        """
+        Packs up to MAX_VALUES values (floats) as a SETPOINT message.
+
+        :param ticks: time.ticks_ms() when the values were captured, now if not given
+        """
+        return self._values(SETPOINT, values, ticks)
+
+    def measurement(self, *values, ticks=None):
+        """
+        Packs up to MAX_VALUES values (floats) as a MEASUREMENT message.
+
+        :param ticks: time.ticks_ms() when the values were captured, now if not given
+        """
+        return self._values(MEASUREMENT, values, ticks)
+
+    def _values(self, kind, values, ticks):
+        if ticks is None:
+            ticks = time.ticks_ms()
+        count = len(values)
+        if count > MAX_VALUES:
+            raise ValueError("at most %d values" % MAX_VALUES)
+        msg = bytearray(HEADER_SIZE + 4 * count)
+        struct.pack_into(_HEADER, msg, 0, kind, count, self._next(), ticks & 0xFFFFFFFF)
+        for i in range(count):
+            v = int(values[i] * SCALE)
+            struct.pack_into('<i', msg, HEADER_SIZE + 4 * i, max(-_LIMIT, min(_LIMIT, v)))
+        return bytes(msg)
+
+    def control(self, on, ticks=None):
+        """
+        Packs an ON (on is True) or OFF message.
+        """
+        if ticks is None:
+            ticks = time.ticks_ms()
+        return struct.pack(_HEADER, ON if on else OFF, 0, self._next(), ticks & 0xFFFFFFFF)
+
+
+class Decoder:
+
+    def __init__(self, report_ms=5000):
+        """
+        :param report_ms: How often report_due() says it's time for report()
+        """
+        self.report_ms = report_ms
+        # Header of the last message feed() accepted
+        self.type = 0
+        self.count = 0
+        self.seq = -1
+        self.ticks = 0
+        self._msg = b''
+        self.received = 0
+        self.lost = 0  # sequence numbers skipped over, never received
+        self.late = 0  # arrived after a newer message, ignored
+        self.invalid = 0  # not a message in this format
+        self.restarts = 0  # sender's sequence started over
+        self._window_start = time.ticks_ms()
+        self._window_received = 0
+
+    def feed(self, msg):
+        """
+        Checks the message in msg (bytes, not copied) and returns its type, or
+        0 if it should be ignored. Call value() for the values.
+        """
+        n = len(msg)
+        if n < HEADER_SIZE:
+            self.invalid += 1
+            return 0
+        kind = msg[0]
+        count = msg[1]
+        if kind < SETPOINT or kind > MEASUREMENT or count > MAX_VALUES or n != HEADER_SIZE + 4 * count:
+            self.invalid += 1
+            return 0
+        seq = msg[2] | msg[3] << 8
+        if self.seq >= 0:
+            gap = (seq - self.seq) & 0xFFFF
+            if gap == 0 or gap > 0x10000 - REORDER_WINDOW:
+                if gap and self.lost:
+                    self.lost -= 1  # counted as lost when it was skipped over
+                self.late += 1
+                return 0
+            if gap < 0x8000:
+                self.lost += gap - 1
+            else:
+                self.restarts += 1
+        self.type = kind
+        self.count = count
+        self.seq = seq
+        # ticks_ms() wraps well below 2**30, so this stays a small int
+        self.ticks = msg[4] | msg[5] << 8 | msg[6] << 16 | msg[7] << 24
+        self._msg = msg
+        self.received += 1
+        return kind
+
+    def value(self, i=0):
+        """
+        Value i of the last message, times SCALE, as an int.
+        """
+        msg = self._msg
+        j = HEADER_SIZE + 4 * i
+        top = msg[j + 3]
+        if top & 0x80:
+            top -= 256
+        return top << 24 | msg[j + 2] << 16 | msg[j + 1] << 8 | msg[j]
+
+    def report_due(self):
+        return time.ticks_diff(time.ticks_ms(), self._window_start) >= self.report_ms
+
+    def report(self):
+        """
+        Messages per second since the last report and the loss counters, as a string.
+        """
+        now = time.ticks_ms()
+        elapsed = max(time.ticks_diff(now, self._window_start), 1)
+        rate = (self.received - self._window_received) * 1000 / elapsed
+        self._window_start = now
+        self._window_received = self.received
+        return "%.1f msgs/s (%d lost, %d late, %d invalid, %d restarts)" % (
+            rate, self.lost, self.late, self.invalid, self.restarts)
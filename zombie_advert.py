@@ -0,0 +1,160 @@
+# Compact binary Zombie advertisement.
+#
+# Instead of a "!13" name, a zombie advertises one manufacturer-specific AD
+# structure after the flags:
+#
+#     02 01 06                 flags
+#     06 FF FF FF 5A nn ss     manufacturer data: company 0xFFFF (test id),
+#                              MAGIC, zombie number, sequence
+#
+# 10 bytes in total (9 without the sequence byte). Humans check these bytes
+# in the scan IRQ itself with match(), before anything is decoded into a
+# string, so other BLE traffic costs a length check and a byte compare, and
+# a zombie costs a push into the advert queue:
+#
+#     scanner = ZombieScanner(max_zombie_number=13)
+#     scanner.scan(0)
+#     ...
+#     scanner.queue.drain(handle)     # handle(zombie_number, rssi, ticks)
+#
+#     beacon = ZombieBeacon()
+#     beacon.advertise(13)
+#     beacon.bump()                   # new sequence number
+#
+# The sequence number tells a human the zombie is still re-advertising, it
+# is kept per zombie in ZombieScanner.seq.
+#
+# Uses the bluetooth module directly: Tufts_ble only advertises and matches
+# names.
+
+import bluetooth
+
+from advert_queue import AdvertQueue
+
+MAGIC = 0x5A
+COMPANY = 0xFFFF
+
+_IRQ_SCAN_RESULT = 5
+_IRQ_SCAN_DONE = 6
+
+# Everything up to and including MAGIC, except the manufacturer AD length
+_PREFIX = bytes((0x02, 0x01, 0x06, 0x00, 0xFF, COMPANY & 0xFF, COMPANY >> 8, MAGIC))
+
+
+def encode(zombie_number, seq=None):
+    """
+    Advertising data for zombie_number, with a sequence byte unless seq is None.
+    """
+    data = bytearray(_PREFIX)
+    data.append(zombie_number)
+    if seq is not None:
+        data.append(seq & 0xFF)
+    data[3] = len(data) - 4
+    return bytes(data)
+
+
+def match(adv_data):
+    """
+    Zombie number in adv_data, or 0 if it isn't a zombie advertisement.
+    Only indexes the buffer, so it doesn't allocate in the IRQ.
+    """
+    n = len(adv_data)
+    if n != 9 and n != 10:
+        return 0
+    p = _PREFIX
+    if (adv_data[7] != MAGIC or adv_data[3] != n - 4 or adv_data[4] != p[4] or adv_data[5] != p[5]
+            or adv_data[6] != p[6] or adv_data[0] != p[0] or adv_data[1] != p[1] or adv_data[2] != p[2]):
+        return 0
+    return adv_data[8]
+
+
+def sequence(adv_data):
+    """
+    Sequence byte of a matched advertisement, or -1 if it has none.
+    """
+    return adv_data[9] if len(adv_data) == 10 else -1
+
+
+class ZombieBeacon:
+
+    def __init__(self, interval_us=100000, sequence=True, ble=None):
+        """
+        :param interval_us: Advertising interval
+        :param sequence: Include a sequence byte, bumped with bump()
+        :param ble: bluetooth.BLE to use, a new one by default
+        """
+        self.ble = ble or bluetooth.BLE()
+        self.ble.active(True)
+        self.interval_us = interval_us
+        self.zombie_number = 0
+        self.seq = 0 if sequence else None
+
+    def advertise(self, zombie_number):
+        self.zombie_number = zombie_number
+        self.ble.gap_advertise(self.interval_us, adv_data=encode(zombie_number, self.seq))
+
+    def bump(self):
+        """
+        Re-advertises with the next sequence number.
+        """
+        if self.zombie_number and self.seq is not None:
+            self.seq = (self.seq + 1) & 0xFF
+            self.advertise(self.zombie_number)
+
+    def stop_advertising(self):
+        self.zombie_number = 0
+        self.ble.gap_advertise(None)
+
+
+class ZombieScanner:
+
+    def __init__(self, max_zombie_number=255, size=32, trace=None, interval_us=30000, window_us=30000,
+                 ble=None):
+        """
+        :param max_zombie_number: Higher zombie numbers are ignored
+        :param size: Advert queue size
+        :param trace: File to record the advertisements to, or None
+        :param interval_us: Scan interval
+        :param window_us: Scan window within each interval
+        :param ble: bluetooth.BLE to use, a new one by default
+        """
+        self.ble = ble or bluetooth.BLE()
+        self.ble.active(True)
+        self.ble.irq(self._irq)
+        self.max_zombie_number = max_zombie_number
+        self.interval_us = interval_us
+        self.window_us = window_us
+        self.queue = AdvertQueue(size)
+        self.seq = bytearray(max_zombie_number + 1)  # last sequence byte per zombie
+        self.scanning = False
+        self.foreign = 0  # advertisements rejected on their bytes
+        self._trace_file = None
+        if trace:
+            self._trace_file = open(trace, 'w')
+            self.queue.record(self._trace_file, prefix='!')  # "ms,!13,rssi", the names the old game advertised
+
+    def _irq(self, event, data):
+        if event == _IRQ_SCAN_RESULT:
+            adv_data = data[4]
+            zombie = match(adv_data)
+            if zombie and zombie <= self.max_zombie_number:
+                if len(adv_data) == 10:
+                    self.seq[zombie] = adv_data[9]
+                self.queue.push(zombie, data[3])
+            else:
+                self.foreign += 1
+        elif event == _IRQ_SCAN_DONE:
+            self.scanning = False
+
+    def scan(self, duration=0):
+        """
+        :param duration: Scan time in ms, 0 to scan until stop_scan()
+        """
+        self.scanning = True
+        self.ble.gap_scan(duration, self.interval_us, self.window_us)
+
+    def stop_scan(self):
+        self.ble.gap_scan(None)
+        self.scanning = False
+        if self._trace_file is not None:
+            self._trace_file.flush()